@@ -0,0 +1,94 @@
+"""
+并行工具调用基准：脚本化假模型 + 假工具（rag_lookup / ocr / image_analysis）。
+
+同一段对话跑两遍：
+- parallel    AgentExecutor，同一轮的工具调用并发执行
+- sequential  同样的调用逐个 await（对照）
+第二轮用户提问重复了第一轮的部分调用，检查会话内缓存命中；另有一个超时工具检查超时处理。
+用法（在仓库根目录）：
+    python -m benchmark.agents
+"""
+import asyncio
+import json
+import time
+
+from src.agents.executor import AgentExecutor, Tool, parse_tool_calls
+from src.agents.fakes import ScriptedModel, make_fake_tools, tool_call
+
+IMAGES = ["data/test/1.png", "data/test/health-case.png"]
+
+
+def make_script():
+    first_turn = "".join(
+        [tool_call("ocr", image=i) for i in IMAGES]
+        + [tool_call("image_analysis", image=i, question="肺部是否异常") for i in IMAGES]
+        + [tool_call("rag_lookup", query="双肺纹理增粗 临床意义")]
+    )
+    second_turn = "".join(
+        [tool_call("rag_lookup", query="双肺纹理增粗 临床意义"), tool_call("rag_lookup", query="慢性支气管炎 治疗"),
+         tool_call("slow_pacs_query", patient_id="P001")]
+    )
+
+    def answer(messages):
+        tool_messages = [m for m in messages if m["role"] == "tool"]
+        return f"综合 {len(tool_messages)} 条工具结果：未见明显实变影，建议结合临床。"
+
+    return [first_turn, answer, second_turn, answer]
+
+
+async def slow_pacs_query(patient_id):
+    await asyncio.sleep(5)
+    return {"patient_id": patient_id}
+
+
+async def run_sequential(script, tools):
+    """对照：同样的工具调用按顺序逐个执行（不做缓存）"""
+    by_name = {t.name: t for t in tools}
+    start = time.perf_counter()
+    for output in script:
+        if callable(output):
+            continue
+        for call in parse_tool_calls(output):
+            tool = by_name[call.name]
+            try:
+                await asyncio.wait_for(tool(**call.arguments), timeout=tool.timeout_s)
+            except asyncio.TimeoutError:
+                pass
+    return time.perf_counter() - start
+
+
+async def main_async():
+    script = make_script()
+    slow = Tool("slow_pacs_query", slow_pacs_query, "查询 PACS（模拟慢服务）", timeout_s=0.2)
+
+    tools = make_fake_tools() + [slow]
+    model = ScriptedModel(script, latency_s=0.01)
+    executor = AgentExecutor(model, tools)
+    memo = {}
+    messages = [{"role": "user", "content": "请结合两张图片分析病情"}]
+    start = time.perf_counter()
+    first = await executor.run(messages, memo=memo)
+    messages.append({"role": "user", "content": "还有哪些治疗建议？"})
+    second = await executor.run(messages, memo=memo)
+    parallel_s = time.perf_counter() - start
+    calls = {t.name: getattr(t.fn, "calls", None) for t in tools}
+
+    sequential_s = await run_sequential(script, make_fake_tools() + [slow])
+    return {
+        "parallel_wall_s": round(parallel_s, 3),
+        "sequential_tools_s": round(sequential_s, 3),
+        "turn1": first.summary(),
+        "turn2": second.summary(),
+        "tool_executions": calls,
+        "answers": [first.answer, second.answer],
+    }
+
+
+def main():
+    results = asyncio.run(main_async())
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
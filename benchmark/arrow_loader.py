@@ -0,0 +1,96 @@
+"""
+本地 Arrow 加载基准：在多分片本地数据上测量冷/热启动耗时与按 id 查找延迟。
+
+对比 notebook 中的 load_dataset("arrow", data_files=...) 与内存映射的 ArrowShardDataset。
+每次启动在独立子进程中完成，耗时包含打开数据与第一次按 id 取样本（含图片解码）。
+用法（在仓库根目录）：
+    python -m benchmark.arrow_loader --rows 20000 --shards 8
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+
+from datasets import load_from_disk
+
+from benchmark.export_mllm import make_arrow_dataset
+
+
+def _startup_child(kind, data_dir, cache_dir, lookup_ids, queue):
+    start = time.perf_counter()
+    if kind == "load_dataset":
+        from datasets import load_dataset
+        data_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(".arrow")]
+        ds = load_dataset("arrow", data_files=data_files, split="train", cache_dir=cache_dir)
+        opened = time.perf_counter()
+        # 没有 id 索引，只能先扫一遍 id 列
+        id_to_row = {key: i for i, key in enumerate(ds["id"])}
+        sample = ds[id_to_row[lookup_ids[0]]]
+        sample["image"].load()
+    else:
+        from src.utils.arrow_loader import ArrowShardDataset
+        ds = ArrowShardDataset(data_dir, index_dir=os.path.join(cache_dir, "arrow_index"))
+        opened = time.perf_counter()
+        ds[lookup_ids[0]]["image"].load()
+    first_sample = time.perf_counter()
+
+    lookups = []
+    for key in lookup_ids[1:]:
+        t0 = time.perf_counter()
+        if kind == "load_dataset":
+            ds[id_to_row[key]]["caption"]
+        else:
+            ds[key]["caption"]
+        lookups.append(time.perf_counter() - t0)
+    lookups.sort()
+    queue.put({
+        "open_s": round(opened - start, 4),
+        "startup_s": round(first_sample - start, 4),
+        "lookup_p50_us": round(lookups[len(lookups) // 2] * 1e6, 1),
+        "lookup_p99_us": round(lookups[int(len(lookups) * 0.99)] * 1e6, 1),
+    })
+
+
+def measure_startup(kind, data_dir, cache_dir, lookup_ids):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_startup_child, args=(kind, data_dir, cache_dir, lookup_ids, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, "arrow")
+        make_arrow_dataset(data_dir, args.rows, size=(64, 64))
+        # 按 shards 重新切分成多个 .arrow 文件
+        shard_dir = os.path.join(tmp, "shards")
+        load_from_disk(data_dir).save_to_disk(shard_dir, num_shards=args.shards)
+
+        rng = random.Random(0)
+        lookup_ids = [f"sample_{rng.randrange(args.rows):07d}" for _ in range(args.lookups)]
+        cache_dir = os.path.join(tmp, "hf_cache")
+
+        results = {"rows": args.rows, "shards": args.shards}
+        for kind in ("load_dataset", "arrow_shard"):
+            results[kind] = {
+                "cold": measure_startup(kind, shard_dir, cache_dir, lookup_ids),
+                "warm": measure_startup(kind, shard_dir, cache_dir, lookup_ids),
+            }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
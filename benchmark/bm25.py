@@ -0,0 +1,136 @@
+"""
+BM25 / 混合检索基准：在合成中文医学语料上测量建索引耗时、索引体积与 top-k 查询延迟。
+
+- BM25 在 --n 条片段上测 p50/p99 延迟（目标 1M 片段下 < 10ms）
+- 混合检索（BM25 + IVF + RRF）在 --hybrid-n 条片段上测延迟，并统计含精确词项的查询
+  在纯向量、纯 BM25、融合三种方式下的命中率
+用法（在仓库根目录）：
+    python -m benchmark.bm25 --n 1000000 --hybrid-n 50000
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmark.rag_index import MEDICAL_TERMS
+from src.rag.bm25 import BM25Builder
+from src.rag.embedding import HashingEmbedder
+from src.rag.hybrid import HybridRetriever
+from src.rag.index import IVFIndex
+
+# 常用汉字区间中的前 3000 个字，按近似 Zipf 分布抽样作为填充文本
+FILLER_CHARS = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+LAB_VALUES = ["5.6", "7.2", "120", "3.4", "0.8", "mmol", "g/l"]
+
+
+def synthetic_corpus(n, seed=0):
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(FILLER_CHARS))))
+    for i in range(n):
+        parts = []
+        for _ in range(rng.randint(3, 8)):
+            parts.append("".join(rng.choices(FILLER_CHARS, cum_weights=cum_weights, k=rng.randint(4, 12))))
+            if rng.random() < 0.5:
+                parts.append(rng.choice(MEDICAL_TERMS))
+            if rng.random() < 0.1:
+                parts.append(rng.choice(LAB_VALUES))
+        # 每个片段带一个唯一的“药品编号”，用于检验精确词项召回
+        parts.append(f"药品编号 rx{i}")
+        yield "，".join(parts) + "。"
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2] * 1e3, 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e3, 3),
+    }
+
+
+def time_queries(search, queries, k):
+    search(queries[0], k)
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        search(q, k)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def dir_size_mb(path):
+    return round(sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 1024 ** 2, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--hybrid-n", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    results = {"n": args.n, "k": args.k}
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1. 大语料 BM25
+        builder = BM25Builder()
+        start = time.perf_counter()
+        for doc_id, text in enumerate(synthetic_corpus(args.n)):
+            builder.add(doc_id, text)
+        collect_s = time.perf_counter() - start
+        start = time.perf_counter()
+        bm25 = builder.build(os.path.join(tmp, "bm25"))
+        build_s = time.perf_counter() - start
+        del builder
+
+        queries = [
+            rng.choice(MEDICAL_TERMS) + rng.choice(["伴", "及", ""]) + rng.choice(MEDICAL_TERMS)
+            + rng.choice(["", " " + rng.choice(LAB_VALUES)])
+            for _ in range(args.queries)
+        ]
+        results["bm25"] = {
+            "collect_s": round(collect_s, 1),
+            "build_s": round(build_s, 1),
+            "postings": bm25.meta["postings"],
+            "vocab": len(bm25.vocab),
+            "index_mb": dir_size_mb(os.path.join(tmp, "bm25")),
+            "latency": time_queries(bm25.search, queries, args.k),
+        }
+        del bm25
+
+        # 2. 小语料混合检索
+        texts = list(synthetic_corpus(args.hybrid_n, seed=2))
+        builder = BM25Builder()
+        for doc_id, text in enumerate(texts):
+            builder.add(doc_id, text)
+        small_bm25 = builder.build(os.path.join(tmp, "bm25_small"))
+        embedder = HashingEmbedder(dim=256)
+        ivf = IVFIndex.build(os.path.join(tmp, "ivf"), embedder.embed(texts), dtype="int8")
+        hybrid = HybridRetriever(small_bm25, ivf, embedder, nprobe=16)
+
+        targets = [rng.randrange(args.hybrid_n) for _ in range(min(args.queries, 200))]
+        exact_queries = [f"{rng.choice(MEDICAL_TERMS)} 药品编号 rx{t}" for t in targets]
+
+        def hit_rate(search):
+            return round(sum(t in set(search(q, args.k)[1].ravel().tolist())
+                             for q, t in zip(exact_queries, targets)) / len(targets), 3)
+
+        results["hybrid"] = {
+            "n": args.hybrid_n,
+            "latency": time_queries(hybrid.search, queries, args.k),
+            "exact_term_hit_rate": {
+                "vector": hit_rate(lambda q, k: ivf.search(embedder.embed([q]), k, nprobe=16)),
+                "bm25": hit_rate(small_bm25.search),
+                "hybrid": hit_rate(hybrid.search),
+            },
+        }
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+DOCX 图片提取基准：在合成的多图 DOCX 上对比旧版两遍遍历 + 主线程 PIL 重存，与单次流式提取。
+
+用法（在仓库根目录）：
+    python -m benchmark.docx_images --images 400
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+
+from temp.ocr.get_word_images import extract_all_images_in_order
+
+
+def _image_bytes(fmt, seed, size=(800, 600)):
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    # 加一些噪点块，避免压缩后体积过小失真
+    for _ in range(20):
+        x, y = rng.randrange(size[0] - 40), rng.randrange(size[1] - 40)
+        img.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (x, y, x + 40, y + 40))
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    buf.seek(0)
+    return buf
+
+
+def make_docx(path, n_images, dup_ratio=0.1, transcode_ratio=0.1, table_ratio=0.1, seed=0):
+    """
+    生成含 n_images 张图片的合成 DOCX：
+    PNG/JPEG 为主，transcode_ratio 比例为 BMP（需要转码），dup_ratio 比例为重复图片，
+    table_ratio 比例放在表格中，另在页眉放一张图片。
+    """
+    rng = random.Random(seed)
+    doc = Document()
+    header_par = doc.sections[0].header.paragraphs[0]
+    header_par.add_run().add_picture(_image_bytes("PNG", -1, (200, 60)), width=Inches(1.0))
+
+    produced = []
+    for i in range(n_images):
+        if produced and rng.random() < dup_ratio:
+            fmt, seed_i = rng.choice(produced)
+        else:
+            r = rng.random()
+            fmt = "BMP" if r < transcode_ratio else ("JPEG" if r < 0.5 else "PNG")
+            seed_i = i
+            produced.append((fmt, seed_i))
+        stream = _image_bytes(fmt, seed_i)
+        doc.add_paragraph(f"第 {i} 段")
+        if rng.random() < table_ratio:
+            cell = doc.add_table(rows=1, cols=1).cell(0, 0)
+            cell.paragraphs[0].add_run().add_picture(stream, width=Inches(2.0))
+        else:
+            doc.add_picture(stream, width=Inches(2.0))
+    doc.save(path)
+    return path
+
+
+def legacy_extract(doc_path, output_dir):
+    """旧版实现：遍历 doc.paragraphs 的 w:drawing，主线程逐张 PIL 解码重存，再对 w:pict 做第二遍 xpath"""
+    os.makedirs(output_dir, exist_ok=True)
+    doc = Document(doc_path)
+    count = 0
+    for paragraph in doc.paragraphs:
+        for run in paragraph.runs:
+            for draw_node in run._r.xpath(".//w:drawing"):
+                blip = draw_node.xpath(".//a:blip/@r:embed")[0]
+                image_part = doc.part.related_parts[blip]
+                ext = image_part.content_type.split("/")[-1].lower()
+                ext = "jpg" if ext == "jpeg" else ext
+                path = os.path.join(output_dir, f"image_{count:03d}.{ext}")
+                try:
+                    with Image.open(io.BytesIO(image_part.blob)) as img:
+                        img.save(path)
+                except Exception:
+                    with open(path, "wb") as f:
+                        f.write(image_part.blob)
+                count += 1
+    for pict_node in doc.element.body.xpath(".//w:pict"):
+        for blip_id in pict_node.xpath(".//v:imagedata/@r:id"):
+            if blip_id in doc.part.related_parts:
+                path = os.path.join(output_dir, f"image_{count:03d}.bin")
+                with open(path, "wb") as f:
+                    f.write(doc.part.related_parts[blip_id].blob)
+                count += 1
+    return count
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        doc_path, build_s = _timed(make_docx, os.path.join(tmp, "synthetic.docx"), args.images)
+        print(f"合成 DOCX: {args.images} 张图片, {os.path.getsize(doc_path) / 1024 ** 2:.1f}MB, 耗时 {build_s:.2f}s")
+
+        legacy_count, legacy_s = _timed(legacy_extract, doc_path, os.path.join(tmp, "legacy"))
+        infos, new_s = _timed(extract_all_images_in_order, doc_path, os.path.join(tmp, "streaming"),
+                              max_workers=args.workers)
+
+        results = {
+            "images_in_doc": args.images + 1,
+            "legacy": {"found": legacy_count, "elapsed_s": round(legacy_s, 3),
+                       "files": len(os.listdir(os.path.join(tmp, "legacy")))},
+            "streaming": {"found": len(infos), "elapsed_s": round(new_s, 3),
+                          "files": len(os.listdir(os.path.join(tmp, "streaming"))),
+                          "transcoded": sum(1 for i in infos if i.get("transcoded")),
+                          "duplicates": sum(1 for i in infos if "duplicate_of" in i)},
+            "speedup": round(legacy_s / max(new_s, 1e-9), 2),
+        }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
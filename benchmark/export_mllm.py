@@ -0,0 +1,168 @@
+"""
+mllm_data 导出基准：在合成 Arrow 数据集上对比 notebook 中逐行的 save_images_and_json 与分片并行导出。
+
+每种实现在独立子进程中运行，分别报告耗时与峰值 RSS。
+峰值 RSS 读自 /proc/<pid>/status 的 VmHWM，并在子进程开始时通过 /proc/self/clear_refs 清零：
+spawn 子进程的 ru_maxrss 会沿用父进程（已生成数据集、体积更大）的峰值，不能用来比较各实现。
+分片导出的工作进程由后台线程定时采样各自的 VmHWM，取最大值。
+用法（在仓库根目录）：
+    python -m benchmark.export_mllm --rows 2000 --num-proc 4
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import threading
+import time
+
+from datasets import Dataset, Features, Image as ImageFeature, Value, load_from_disk
+from PIL import Image
+
+from src.train.data_prep import export_mllm_dataset
+
+
+def make_arrow_dataset(path, rows, size=(224, 224), seed=0):
+    """生成 id / image / caption 结构的合成数据集并以 Arrow 格式落盘"""
+    rng = random.Random(seed)
+    features = Features({"id": Value("string"), "image": ImageFeature(), "caption": Value("string")})
+
+    def gen():
+        for i in range(rows):
+            img = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG" if i % 2 else "PNG")
+            caption = "".join(rng.choice("肺部纹理增粗心影未见明显异常") for _ in range(rng.randint(20, 400)))
+            yield {"id": f"sample_{i:07d}", "image": {"bytes": buf.getvalue(), "path": None}, "caption": caption}
+
+    Dataset.from_generator(gen, features=features).save_to_disk(path)
+    return path
+
+
+def notebook_save_images_and_json(ds, output_dir):
+    """notebooks/25M_process_data.ipynb 中的原实现：逐行解码保存，最后一次性写出全部 JSON"""
+    os.makedirs(output_dir, exist_ok=True)
+    all_data = []
+    for item in ds:
+        img_path = f"{output_dir}/{item['id']}.jpg"
+        image = item["image"]
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(img_path)
+        all_data.append({
+            "messages": [
+                {"content": "<image>图片中的诊断结果是怎样?", "role": "user"},
+                {"content": item["caption"], "role": "assistant"},
+            ],
+            "images": [img_path],
+        })
+    with open(f"{output_dir}/mllm_data.json", "w", encoding="utf-8") as f:
+        json.dump(all_data, f, ensure_ascii=False)
+
+
+def _reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def _vm_hwm_mb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:  # 进程已退出
+        pass
+    return None
+
+
+class ChildPeakSampler(threading.Thread):
+    """定时读取本进程所有子进程的 VmHWM，记录其中的最大值（没有子进程时为 None）"""
+
+    def __init__(self, interval=0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_mb = None
+        self._stop_event = threading.Event()
+
+    def _children(self):
+        pids = set()
+        for tid in os.listdir("/proc/self/task"):
+            try:
+                with open(f"/proc/self/task/{tid}/children") as f:
+                    pids.update(f.read().split())
+            except OSError:
+                pass
+        return pids
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for pid in self._children():
+                mb = _vm_hwm_mb(pid)
+                if mb is not None and (self.peak_mb is None or mb > self.peak_mb):
+                    self.peak_mb = mb
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.peak_mb
+
+
+def _child(kind, data_path, output_dir, num_proc, queue):
+    _reset_peak_rss()
+    ds = load_from_disk(data_path)
+    sampler = ChildPeakSampler()
+    sampler.start()
+    start = time.perf_counter()
+    if kind == "notebook":
+        notebook_save_images_and_json(ds, output_dir)
+    else:
+        export_mllm_dataset(ds, output_dir, num_proc=num_proc)
+    elapsed = time.perf_counter() - start
+    queue.put({"elapsed_s": round(elapsed, 3), "peak_rss_mb": _vm_hwm_mb(),
+               "peak_worker_rss_mb": sampler.stop()})
+
+
+def run_isolated(kind, data_path, output_dir, num_proc):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(kind, data_path, output_dir, num_proc, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--num-proc", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = make_arrow_dataset(os.path.join(tmp, "arrow"), args.rows)
+        results = {
+            "rows": args.rows,
+            "notebook": run_isolated("notebook", data_path, os.path.join(tmp, "notebook"), args.num_proc),
+            "sharded": run_isolated("sharded", data_path, os.path.join(tmp, "sharded"), args.num_proc),
+        }
+        # 模拟中断：删掉一半分片后重跑，只补齐缺失部分
+        shard_dir = os.path.join(tmp, "sharded", "shards")
+        shards = sorted(os.listdir(shard_dir))
+        for name in shards[::2]:
+            os.remove(os.path.join(shard_dir, name))
+        results["resume"] = run_isolated("sharded", data_path, os.path.join(tmp, "sharded"), args.num_proc)
+        with open(os.path.join(tmp, "sharded", "manifest.json"), encoding="utf-8") as f:
+            results["resume"]["complete"] = json.load(f)["complete"]
+
+    for kind in ("notebook", "sharded"):
+        results[kind]["rows_per_s"] = round(args.rows / max(results[kind]["elapsed_s"], 1e-9), 1)
+    results["speedup"] = round(results["notebook"]["elapsed_s"] / max(results["sharded"]["elapsed_s"], 1e-9), 2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
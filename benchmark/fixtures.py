@@ -0,0 +1,68 @@
+"""
+基准用的合成数据生成器。其余夹具沿用各单项基准中已有的实现，benchmark.suite 按需导入：
+
+- make_long_text       中英混排、句读齐全的长文本（TTS 切分）
+- make_context_jsons   有道 OCR 翻译结果格式的 JSON（resRegions[].context / tranContent）
+- make_arrow_shards    id / image / caption 结构、切成多个 .arrow 分片的数据集
+- benchmark.docx_images.make_docx                含 N 张图片的 DOCX（PNG/JPEG/BMP、重复、表格与页眉图片）
+- benchmark.export_mllm.make_arrow_dataset       单分片 Arrow 数据集
+- benchmark.ocr_translate.StandInOcrServer       有道 ocrtransapi 的本地 HTTP 替身（配合 make_images）
+- benchmark.bm25.synthetic_corpus / benchmark.rag_index.clustered_vectors  检索语料与向量
+- benchmark.reward.make_pairs                    奖励模型打分的候选对
+- src.llm.backends.build_tiny_gpt2               随机初始化的小 GPT-2 推理后端
+这里只放轻量依赖，重依赖（datasets / torch / docx）都在用到时才导入，避免抬高各阶段的峰值 RSS。
+"""
+import json
+import os
+import random
+
+from benchmark.rag_index import MEDICAL_TERMS
+
+ENGLISH_SENTENCES = ["Both lungs are clear.", "No pleural effusion is seen.", "Heart size is normal!",
+                     "Is there any rib fracture?", "Follow-up CT is recommended."]
+
+
+def make_long_text(n_chars, seed=0):
+    """按句拼接到约 n_chars 个字符；中文句号、英文标点与换行都会出现，覆盖 split_text 的全部分隔符"""
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < n_chars:
+        if rng.random() < 0.3:
+            sentence = rng.choice(ENGLISH_SENTENCES)
+        else:
+            sentence = "，".join(rng.choice(MEDICAL_TERMS) for _ in range(rng.randint(2, 10))) + "。"
+        if rng.random() < 0.1:
+            sentence += "\n"
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)
+
+
+def make_context_jsons(json_dir, n, regions=(3, 20), seed=0):
+    """写出 n 个 OCR 翻译结果 JSON；少量区域 context 为空，模拟真实返回"""
+    rng = random.Random(seed)
+    os.makedirs(json_dir, exist_ok=True)
+    paths = []
+    for i in range(n):
+        res_regions = []
+        for _ in range(rng.randint(*regions)):
+            context = "" if rng.random() < 0.05 else make_long_text(rng.randint(20, 300), seed=rng.randrange(1 << 30))
+            res_regions.append({"boundingBox": "0,0,100,0,100,20,0,20", "context": context,
+                                "tranContent": context, "lang": "zh-CHS"})
+        path = os.path.join(json_dir, f"image_{i:05d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"errorCode": "0", "resRegions": res_regions}, f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+def make_arrow_shards(path, rows, shards=4, size=(64, 64), seed=0):
+    """生成合成数据集后按 shards 重新切分成多个 .arrow 文件，返回分片目录"""
+    from datasets import load_from_disk
+
+    from benchmark.export_mllm import make_arrow_dataset
+
+    staging = path + ".staging"
+    make_arrow_dataset(staging, rows, size=size, seed=seed)
+    load_from_disk(staging).save_to_disk(path, num_shards=shards)
+    return path
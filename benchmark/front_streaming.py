@@ -0,0 +1,80 @@
+"""
+流式对话服务基准：假 token 后端 + 多个并发会话，部分会话中途断开。
+
+统计每会话首 token 延迟（TTFT）与完整回复耗时、取消与拒绝数，
+并检查后端同时生成的请求数从未超过 max_concurrent。
+用法（在仓库根目录）：
+    python -m benchmark.front_streaming --sessions 24 --max-concurrent 2 --max-queue 16
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from contextlib import aclosing
+
+from src.front.streaming import FakeTokenBackend, QueueFullError, StreamingChatService
+
+
+async def client(service, session_id, message, cancel_after, timings):
+    start = time.perf_counter()
+    tokens = 0
+    try:
+        async with aclosing(service.stream(session_id, message)) as stream:
+            async for _ in stream:
+                tokens += 1
+                if cancel_after is not None and tokens >= cancel_after:
+                    break  # 模拟客户端断开
+    except QueueFullError:
+        return
+    timings.append(time.perf_counter() - start)
+
+
+async def run(args):
+    backend = FakeTokenBackend(first_token_s=args.first_token_ms / 1000, token_interval_s=args.token_ms / 1000,
+                               max_tokens=args.tokens)
+    service = StreamingChatService(backend, max_concurrent=args.max_concurrent, max_queue=args.max_queue)
+    rng = random.Random(0)
+    timings = []
+    tasks = [
+        client(service, f"session-{i}", f"问题 {i}", rng.randint(2, 5) if i % args.cancel_every == 0 else None,
+               timings)
+        for i in range(args.sessions)
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    wall_s = time.perf_counter() - start
+    await asyncio.sleep(args.token_ms / 1000 * 2)  # 等被取消的后端线程退出
+
+    timings.sort()
+    summary = service.stats.summary()
+    summary.pop("ttft_ms_by_session")
+    return {
+        **summary,
+        "reply_p50_ms": round(timings[len(timings) // 2] * 1e3, 1) if timings else 0.0,
+        "wall_s": round(wall_s, 3),
+        "backend_peak_active": backend.peak_active,
+        "backend_cancelled": backend.cancelled,
+        "max_concurrent": args.max_concurrent,
+        "oversubscribed": backend.peak_active > args.max_concurrent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=24)
+    parser.add_argument("--max-concurrent", type=int, default=2)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--cancel-every", type=int, default=4, help="每隔几个会话有一个中途断开")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
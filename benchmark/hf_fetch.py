@@ -0,0 +1,235 @@
+"""
+清单下载器基准：在本地替身 Hub 上对比 HubFetcher 单线程与并发下载，并检查共享文件库的复用、离线模式与校验。
+
+替身 Hub 实现 /api/{models|datasets}/<repo>/revision/<rev>?blobs=true 与 .../resolve/<commit>/<path>，
+每个请求固定延迟、按带宽限速；大文件按 LFS 返回 sha256，小文件返回 git blob id；可指定若干文件返回损坏内容。
+用法（在仓库根目录）：
+    python -m benchmark.hf_fetch --latency 0.05 --bandwidth-mb 40
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.utils.load_hf import ArtifactStore, FetchError, HubFetcher, git_blob_hasher, load_manifest
+
+LFS_THRESHOLD = 10 * 1024
+
+
+class StandInHubServer:
+    """
+    repos: {(kind, repo_id): {path: bytes}}；commit 为文件内容的哈希。
+    corrupt: 这些 (repo_id, path) 的下载内容会被改掉一个字节（列表接口给出的仍是正确哈希）。
+    """
+
+    def __init__(self, repos, latency=0.05, bandwidth_mb=40.0, corrupt=()):
+        self.repos = repos
+        self.latency = latency
+        self.bandwidth = bandwidth_mb * 1024 ** 2
+        self.corrupt = set(corrupt)
+        self.counters = {"api": 0, "files": 0, "bytes": 0}
+        self._lock = threading.Lock()
+        self.commits = {key: hashlib.sha1(json.dumps(sorted((p, hashlib.sha256(d).hexdigest())
+                                                            for p, d in files.items())).encode()).hexdigest()
+                        for key, files in repos.items()}
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def _info(self, key):
+        siblings = []
+        for path, data in sorted(self.repos[key].items()):
+            blob = git_blob_hasher(len(data))
+            blob.update(data)
+            sibling = {"rfilename": path, "size": len(data), "blobId": blob.hexdigest()}
+            if len(data) >= LFS_THRESHOLD:
+                sibling["lfs"] = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+            siblings.append(sibling)
+        return {"id": key[1], "sha": self.commits[key], "siblings": siblings}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, payload, content_type="application/octet-stream"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+                if path.startswith("/api/"):
+                    server._count("api")
+                    section, rest = path[len("/api/"):].split("/", 1)
+                    repo_id, _, _ = rest.partition("/revision/")
+                    key = (section.rstrip("s"), repo_id)
+                    if key not in server.repos:
+                        return self._send(404, b'{"error": "Repository not found"}', "application/json")
+                    return self._send(200, json.dumps(server._info(key)).encode(), "application/json")
+
+                if path.startswith("/datasets/"):
+                    kind, path = "dataset", path[len("/datasets/"):]
+                else:
+                    kind, path = "model", path[1:]
+                repo_id, _, rest = path.partition("/resolve/")
+                _, _, file_path = rest.partition("/")
+                data = server.repos.get((kind, repo_id), {}).get(file_path)
+                if data is None:
+                    return self._send(404, b"")
+                if (repo_id, file_path) in server.corrupt:
+                    data = data[:-1] + bytes([data[-1] ^ 0xFF])
+                server._count("files")
+                server._count("bytes", len(data))
+                time.sleep(len(data) / server.bandwidth)
+                self._send(200, data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def make_repos(seed=0, shard_mb=2.0):
+    """3 个模型（共用同一份分词器）+ 2 个数据集（其中一个文件与另一个数据集相同）"""
+    rng = random.Random(seed)
+    blob = lambda n: rng.randbytes(n)  # noqa: E731
+    tokenizer = {"tokenizer.json": blob(600 * 1024), "vocab.txt": blob(200 * 1024), "special_tokens_map.json": b"{}"}
+    repos = {}
+    for i, name in enumerate(["med-llm/gpt2-medical", "med-llm/gpt2-medical-sft", "med-llm/reward-model"]):
+        files = {"config.json": json.dumps({"model": name, "n_layer": 12 + i}).encode(), "README.md": b"# model\n"}
+        files |= tokenizer
+        files |= {f"model-{k:05d}-of-00004.safetensors": blob(int(shard_mb * 1024 ** 2)) for k in range(4)}
+        repos[("model", name)] = files
+    shared = blob(int(shard_mb * 1024 ** 2))
+    repos[("dataset", "med-llm/radiology-reports")] = {
+        "data/train-00000.parquet": blob(int(shard_mb * 1024 ** 2)), "data/test-00000.parquet": shared,
+        "README.md": b"# data\n"}
+    repos[("dataset", "med-llm/radiology-reports-v2")] = {
+        "data/train-00000.parquet": blob(int(shard_mb * 1024 ** 2)), "data/test-00000.parquet": shared,
+        "README.md": b"# data v2\n"}
+    return repos
+
+
+def manifest_for(repos):
+    return {
+        "models": [{"repo_id": r, "ignore_patterns": ["*.md"]} for k, r in repos if k == "model"],
+        "datasets": [{"repo_id": r} for k, r in repos if k == "dataset"],
+    }
+
+
+def verify_snapshots(report, repos, entries):
+    """逐文件比对快照内容与替身 Hub 上的原始内容"""
+    bad = 0
+    for entry in entries:
+        root = report["snapshots"][entry.key]
+        for path, data in repos[(entry.kind, entry.repo_id)].items():
+            if not entry.wants(path):
+                continue
+            with open(os.path.join(root, *path.split("/")), "rb") as f:
+                bad += f.read() != data
+    return bad
+
+
+def run(label, fetcher, entries, server=None):
+    before = dict(server.counters) if server else None
+    try:
+        report = fetcher.fetch(entries)
+    except FetchError as e:
+        report = e.report
+    out = {k: report[k] for k in ("elapsed_s", "downloaded_files", "downloaded_bytes", "reused_files",
+                                  "checksum_errors", "api_requests", "file_requests")}
+    out |= {"failed": report["failed"], "store_objects": report["store"]["objects"]}
+    if server:
+        out["server_bytes"] = server.counters["bytes"] - before["bytes"]
+    print(f"📦 {label}: {json.dumps(out, ensure_ascii=False)}")
+    return report, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="替身 Hub 每个请求的固定延迟（秒）")
+    parser.add_argument("--bandwidth-mb", type=float, default=40.0, help="每个连接的带宽（MB/s）")
+    parser.add_argument("--shard-mb", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    repos = make_repos(shard_mb=args.shard_mb)
+    entries = load_manifest(manifest_for(repos))
+    unique_objects = len({hashlib.sha256(d).hexdigest(): len(d) for (k, r), files in repos.items()
+                        for p, d in files.items() if not (k == "model" and p.endswith(".md"))})
+    total_bytes = sum(len(d) for e in entries for p, d in repos[(e.kind, e.repo_id)].items() if e.wants(p))
+    results = {"repos": len(entries), "manifest_bytes": total_bytes, "unique_objects": unique_objects}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with StandInHubServer(repos, args.latency, args.bandwidth_mb) as server:
+            kwargs = {"endpoint": server.url, "token": "", "offline": False, "max_retries": 1}
+            with ArtifactStore(os.path.join(tmp, "store-serial")) as store:
+                _, results["serial"] = run("单线程", HubFetcher(store, os.path.join(tmp, "serial"),
+                                                              max_workers=1, **kwargs), entries, server)
+
+            store_dir = os.path.join(tmp, "store")
+            with ArtifactStore(store_dir) as store:
+                report, results["concurrent"] = run("并发", HubFetcher(store, os.path.join(tmp, "project-a"),
+                                                                    max_workers=args.workers, **kwargs), entries, server)
+                results["concurrent"]["mismatched_files"] = verify_snapshots(report, repos, entries)
+                # 另一个项目共用同一文件库：只请求文件列表，不再下载
+                report, results["second_project"] = run(
+                    "第二个项目（共享文件库）", HubFetcher(store, os.path.join(tmp, "project-b"),
+                                                  max_workers=args.workers, **kwargs), entries, server)
+                results["second_project"]["mismatched_files"] = verify_snapshots(report, repos, entries)
+
+        # 替身 Hub 已关闭：离线模式完全从文件库组装
+        with ArtifactStore(store_dir) as store:
+            report, results["offline"] = run("离线", HubFetcher(store, os.path.join(tmp, "project-c"),
+                                                               endpoint="http://127.0.0.1:9", offline=True), entries)
+            results["offline"]["mismatched_files"] = verify_snapshots(report, repos, entries)
+
+        # 损坏文件：校验失败、不入库、整体报错而不是静默跳过
+        bad = ("med-llm/reward-model", "model-00002-of-00004.safetensors")
+        corrupt_repos = {("model", "med-llm/reward-model"): repos[("model", "med-llm/reward-model")]}
+        with StandInHubServer(corrupt_repos, args.latency, args.bandwidth_mb, corrupt=[bad]) as server, \
+                ArtifactStore(os.path.join(tmp, "store-corrupt")) as store:
+            fetcher = HubFetcher(store, os.path.join(tmp, "corrupt"), endpoint=server.url, token="", offline=False,
+                                 max_retries=1)
+            try:
+                fetcher.fetch(load_manifest({"models": ["med-llm/reward-model"]}))
+                results["corrupt"] = {"raised": False}
+            except FetchError as e:
+                results["corrupt"] = {"raised": True, "failed": e.report["failed"],
+                                      "checksum_errors": e.report["checksum_errors"],
+                                      "store_objects": e.report["store"]["objects"]}
+
+    results["speedup"] = round(results["serial"]["elapsed_s"] / results["concurrent"]["elapsed_s"], 2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
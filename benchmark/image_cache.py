@@ -0,0 +1,79 @@
+"""
+图像预处理缓存微基准：对 data/test 中的图片反复提问，比较每次查询的预处理耗时。
+
+- no_cache     每次 Image.open + image_processor（与 image_text_qa 相同）
+- memory_hit   ImageCache 内存层命中
+- disk_hit     新进程/新实例，内存为空，从磁盘层读取
+图像处理器使用 Qwen3-VL 的参数（patch 16、merge 2、temporal patch 2），不需要下载模型。
+用法（在仓库根目录）：
+    python -m benchmark.image_cache --questions 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from src.llm.image_cache import HFImagePreprocessor, ImageCache
+
+TEST_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "test")
+
+
+def make_preprocessor():
+    from transformers import Qwen2VLImageProcessor
+
+    return HFImagePreprocessor(Qwen2VLImageProcessor(patch_size=16, merge_size=2, temporal_patch_size=2))
+
+
+def per_query_ms(fn, images, questions):
+    samples = []
+    for _ in range(questions):
+        for path in images:
+            start = time.perf_counter()
+            fn(path)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {"mean_ms": round(sum(samples) / len(samples) * 1e3, 3),
+            "p50_ms": round(samples[len(samples) // 2] * 1e3, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=20, help="每张图片提问次数")
+    args = parser.parse_args()
+
+    images = sorted(os.path.join(TEST_DIR, f) for f in os.listdir(TEST_DIR) if f.lower().endswith((".png", ".jpg")))
+    preprocess = make_preprocessor()
+    results = {"images": [os.path.basename(p) for p in images], "questions_per_image": args.questions}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results["no_cache"] = per_query_ms(lambda p: preprocess(Image.open(p)), images, args.questions)
+
+        cache = ImageCache(tmp)
+        get = lambda p: cache.get_or_compute(p, preprocess, namespace=preprocess.namespace)  # noqa: E731
+        reference = {p: get(p) for p in images}  # 首次提问：未命中并写入两层缓存
+        results["memory_hit"] = per_query_ms(get, images, args.questions)
+        results["memory_cache"] = cache.stats()
+
+        cold = ImageCache(tmp, memory_bytes=0)
+        results["disk_hit"] = per_query_ms(
+            lambda p: cold.get_or_compute(p, preprocess, namespace=preprocess.namespace), images, args.questions)
+        results["disk_cache"] = cold.stats()
+
+        fresh = {p: preprocess(Image.open(p)) for p in images}
+        results["identical"] = all(np.array_equal(reference[p][k], fresh[p][k]) for p in images for k in fresh[p])
+
+    base = results["no_cache"]["mean_ms"]
+    results["saved_ms_per_query"] = {
+        "memory": round(base - results["memory_hit"]["mean_ms"], 3),
+        "disk": round(base - results["disk_hit"]["mean_ms"], 3),
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+放射影像入库基准：合成胸片（8 位 PNG、16 位 PNG、JPEG 混合），对比
+
+- pil_per_image  notebook 写法：每张 Image.open -> convert("RGB") -> resize -> np.asarray，每个 epoch 重复一遍
+- ingest         ImageTensorStore.build：进程池解码 / 窗宽归一化 / 缩放，写入内存映射 uint8 仓库
+- store_read     从仓库按随机 batch 读取 uint8，以及再转为标准化 float 张量（训练时每个 epoch 的实际开销）
+另外统计 16 位图在两种做法下的饱和像素比例（convert("RGB") 会把 16 位值截断到 255）。
+用法（在仓库根目录）：
+    python -m benchmark.image_ingest --images 300 --src-size 1024 --size 512
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from src.utils.image_ingest import ImageTensorStore, IngestConfig
+
+
+def synthetic_xray(rng, size, bits=8):
+    """胸片样的合成图：纵向渐变 + 两个椭圆“肺野” + 噪声"""
+    h, w = size
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    img = 0.35 + 0.25 * (yy / h)
+    for cx in (0.32, 0.68):
+        lung = ((xx / w - cx) / 0.16) ** 2 + ((yy / h - 0.5) / 0.3) ** 2 < 1
+        img[lung] -= 0.2
+    img += rng.normal(0, 0.03, size).astype(np.float32)
+    img = np.clip(img, 0, 1)
+    if bits == 16:
+        return (img * 4095).astype(np.uint16)  # 12 位有效位，常见于 DR 设备
+    return (img * 255).astype(np.uint8)
+
+
+def make_images(image_dir, n, src_size, seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(image_dir, exist_ok=True)
+    paths = []
+    for i in range(n):
+        kind = ("png8", "png16", "jpeg")[i % 3]
+        size = (src_size + int(rng.integers(0, src_size // 4)), src_size)  # 竖版、尺寸不一
+        if kind == "png16":
+            path = os.path.join(image_dir, f"CXR{i}_16.png")
+            Image.fromarray(synthetic_xray(rng, size, 16)).save(path)
+        elif kind == "jpeg":
+            path = os.path.join(image_dir, f"CXR{i}.jpg")
+            Image.fromarray(synthetic_xray(rng, size)).convert("RGB").save(path, quality=90)
+        else:
+            path = os.path.join(image_dir, f"CXR{i}.png")
+            Image.fromarray(synthetic_xray(rng, size)).save(path)
+        paths.append(path)
+    return paths
+
+
+def pil_per_image(paths, size):
+    """notebook 写法的逐张处理，返回 (N, 3, H, W) uint8"""
+    out = np.empty((len(paths), 3, *size), dtype=np.uint8)
+    for i, path in enumerate(paths):
+        img = Image.open(path).convert("RGB").resize((size[1], size[0]))
+        out[i] = np.asarray(img).transpose(2, 0, 1)
+    return out
+
+
+def saturated_fraction(arrays):
+    return round(float(np.mean(np.stack([a[0] for a in arrays]) == 255)), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--src-size", type=int, default=1024)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=3)
+    args = parser.parse_args()
+
+    size = (args.size, args.size)
+    results = {"images": args.images, "src_size": args.src_size, "size": args.size, "cpu_count": os.cpu_count()}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_images(os.path.join(tmp, "images"), args.images, args.src_size)
+        results["source_mb"] = round(sum(os.path.getsize(p) for p in paths) / 1024 ** 2, 1)
+
+        start = time.perf_counter()
+        baseline = pil_per_image(paths, size)
+        elapsed = time.perf_counter() - start
+        results["pil_per_image"] = {"images_per_s": round(len(paths) / elapsed, 1), "elapsed_s": round(elapsed, 2)}
+
+        config = IngestConfig(size=size, channels=3, keep_aspect=False)
+        for workers in sorted({1, args.workers}):
+            store_dir = os.path.join(tmp, f"store-{workers}")
+            start = time.perf_counter()
+            store = ImageTensorStore.build(paths, store_dir, config, num_workers=workers)
+            elapsed = time.perf_counter() - start
+            results[f"ingest_workers_{workers}"] = {"images_per_s": round(len(paths) / elapsed, 1),
+                                                    "elapsed_s": round(elapsed, 2), "failed": store.meta["failed"]}
+        start = time.perf_counter()
+        ImageTensorStore.build(paths, store_dir, config, num_workers=args.workers)
+        results["rebuild_unchanged_s"] = round(time.perf_counter() - start, 3)
+
+        rng = np.random.default_rng(0)
+        for label, convert in (("store_read_uint8", lambda b: b), ("store_read_model_input", store.to_model_input)):
+            # 预热一批：to_model_input 首次调用时才导入 torch，导入耗时不计入读取吞吐
+            convert(store.batch(range(min(args.batch_size, len(store)))))
+            start = time.perf_counter()
+            for _ in range(args.epochs):
+                order = rng.permutation(len(store))
+                for first in range(0, len(order), args.batch_size):
+                    batch = convert(store.batch(order[first:first + args.batch_size]))
+            elapsed = time.perf_counter() - start
+            results[label] = {"images_per_s": round(args.epochs * len(store) / elapsed, 1),
+                              "batch_dtype": str(batch.dtype)}
+        results["read_speedup_vs_pil"] = round(results["store_read_model_input"]["images_per_s"]
+                                               / results["pil_per_image"]["images_per_s"], 1)
+        results["store_mb"] = round(os.path.getsize(os.path.join(store_dir, "images.u8")) / 1024 ** 2, 1)
+
+        sixteen = [i for i, p in enumerate(paths) if p.endswith("_16.png")]
+        results["png16_saturated_fraction"] = {"pil_per_image": saturated_fraction(baseline[sixteen]),
+                                               "ingest": saturated_fraction(store.batch(sixteen))}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
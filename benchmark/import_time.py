@@ -0,0 +1,95 @@
+"""
+入口模块导入耗时检查：每个模块起一个新解释器执行 python -X importtime -c "import <模块>"，
+解析 stderr 得到该模块带来的累计导入耗时（扣除解释器启动自带的模块）与被导入的模块列表。
+任一模块超出预算，或在导入时就加载了应推迟的依赖（gradio / datasets / transformers / torch / huggingface_hub，
+以及只应在首次读取配置时才用到的 dotenv），退出码为 1。
+
+用法（在仓库根目录）：
+    python -m benchmark.import_time
+    python -m benchmark.import_time --modules env temp.ocr.trans_imgs --budget-ms 300 --repeats 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "config.settings",
+    "env",
+    "temp.ocr.trans_imgs",
+    "temp.ocr.text_to_mp3",
+    "temp.spiders.spider",
+    "src.utils.load_hf",
+    "src.front.app",
+]
+DEFERRED_MODULES = ("gradio", "datasets", "transformers", "torch", "huggingface_hub", "dotenv")
+# 单独给配置模块一个更紧的预算：它被所有入口导入
+BUDGETS_MS = {"config.settings": 30.0}
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 [(模块名, 缩进层级, 自身 us, 累计 us)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def _importtime(code):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return parse_importtime(proc.stderr)
+
+
+def measure(module, startup, repeats=3):
+    """取 repeats 次中最快的一次；只统计解释器启动之外新增的顶层导入"""
+    best, imported = None, set()
+    for _ in range(repeats):
+        rows = _importtime(f"import {module}")
+        total_us = sum(cum for name, depth, _, cum in rows if depth == 0 and name not in startup)
+        imported = {name for name, *_ in rows if name not in startup}
+        best = total_us if best is None else min(best, total_us)
+    deferred = {m.split(".")[0] for m in imported} & set(DEFERRED_MODULES)
+    return {"module": module, "import_ms": round(best / 1000, 1), "modules_loaded": len(imported),
+            "deferred_loaded": sorted(deferred)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="单个入口模块的导入耗时上限")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    startup = {name for name, *_ in _importtime("pass")}
+    results, failures = [], []
+    print(f"⏱️ 导入耗时检查（python -X importtime，{args.repeats} 次取最快）")
+    for module in args.modules:
+        try:
+            r = measure(module, startup, args.repeats)
+        except RuntimeError as e:
+            failures.append(f"{module}: 导入失败 {e}")
+            print(f"   ❌ {module}: 导入失败 {e}")
+            continue
+        budget = BUDGETS_MS.get(module, args.budget_ms)
+        ok = r["import_ms"] <= budget and not r["deferred_loaded"]
+        early = f", 提前加载: {', '.join(r['deferred_loaded'])}" if r["deferred_loaded"] else ""
+        print(f"   {'✅' if ok else '❌'} {module:<24} {r['import_ms']:>7.1f} ms  (预算 {budget:.0f} ms, "
+              f"新增 {r['modules_loaded']} 个模块{early})")
+        if r["import_ms"] > budget:
+            failures.append(f"{module}: {r['import_ms']} ms 超出预算 {budget} ms")
+        if r["deferred_loaded"]:
+            failures.append(f"{module}: 导入时加载了 {', '.join(r['deferred_loaded'])}")
+        results.append(r | {"budget_ms": budget, "ok": ok})
+
+    print(json.dumps({"results": results, "failures": failures}, ensure_ascii=False, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+前缀/会话 KV 缓存基准：随机初始化的小 GPT-2（CPU），[MEDICAL_ASSISTANT] 系统提示词下的多轮对话。
+
+逐轮记录首 token 延迟（TTFT）：
+- no_cache  每轮重新编码系统提示词 + 全部历史（与 multi_turn_image_text_dialogue 相同）
+- cached    会话 KV 续写，新会话复用系统提示词 KV，每轮只 prefill 新增的 token
+同时校验两种方式生成的回复一致。
+用法（在仓库根目录）：
+    python -m benchmark.kv_cache --turns 12 --repeats 3
+"""
+import argparse
+import json
+import random
+
+from src.llm.backends import build_tiny_gpt2
+from src.llm.kv_cache import CachedChat, PrefixKVCache
+from src.llm.prompts import load_system_prompts
+
+QUESTIONS = ["这张胸片有什么异常？", "双肺纹理增粗意味着什么？", "需要做哪些进一步检查？",
+             "患者有高血压病史，用药上要注意什么？", "请总结一下诊断意见。", "心影大小是否正常？"]
+
+
+def run_conversation(chat, session_id, questions, max_new_tokens, use_cache):
+    rows, replies = [], []
+    for turn, question in enumerate(questions, start=1):
+        reply, stats = chat.chat(session_id, question, max_new_tokens=max_new_tokens, use_cache=use_cache)
+        replies.append(reply)
+        rows.append({"turn": turn, "prompt_tokens": stats["prompt_tokens"],
+                     "prefill_tokens": stats["prefill_tokens"], "ttft_ms": stats["ttft_s"] * 1e3})
+    chat.end_session(session_id)
+    return rows, replies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--cache-mb", type=float, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    questions = [rng.choice(QUESTIONS) for _ in range(args.turns)]
+    system_prompt = load_system_prompts()["MEDICAL_ASSISTANT"]
+    backend = build_tiny_gpt2(n_positions=4096)
+    cache = PrefixKVCache(max_bytes=int(args.cache_mb * 1024 ** 2))
+    chat = CachedChat(backend, cache, system_prompt=system_prompt)
+
+    run_conversation(chat, "warmup", questions[:2], args.max_new_tokens, True)
+    ttft = {"no_cache": [[] for _ in questions], "cached": [[] for _ in questions]}
+    table, same = [], True
+    for repeat in range(args.repeats):
+        base_rows, base_replies = run_conversation(chat, f"plain-{repeat}", questions, args.max_new_tokens, False)
+        rows, replies = run_conversation(chat, f"cached-{repeat}", questions, args.max_new_tokens, True)
+        same = same and base_replies == replies
+        for i, (b, c) in enumerate(zip(base_rows, rows)):
+            ttft["no_cache"][i].append(b["ttft_ms"])
+            ttft["cached"][i].append(c["ttft_ms"])
+        table = [{"turn": b["turn"], "prompt_tokens": b["prompt_tokens"], "prefill_tokens_cached": c["prefill_tokens"]}
+                 for b, c in zip(base_rows, rows)]
+
+    for i, row in enumerate(table):
+        row["ttft_ms_no_cache"] = round(sorted(ttft["no_cache"][i])[len(ttft["no_cache"][i]) // 2], 2)
+        row["ttft_ms_cached"] = round(sorted(ttft["cached"][i])[len(ttft["cached"][i]) // 2], 2)
+
+    results = {"turns": table, "replies_identical": same, "cache": cache.stats()}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
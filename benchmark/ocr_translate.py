@@ -0,0 +1,161 @@
+"""
+图片翻译并发 runner 基准：在本地替身 HTTP 服务上对比串行循环与有界并发 runner。
+
+用法（在仓库根目录）：
+    python -m benchmark.ocr_translate --images 40 --latency 0.2
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from config.settings import reload_settings
+from temp.ocr import trans_imgs
+
+
+def _tiny_jpeg():
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), (200, 200, 200)).save(buf, format="JPEG")
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+
+def use_standin_credentials():
+    """替身服务不校验签名，未配置有道密钥时填入占位值，让签名流程照常执行"""
+    os.environ.setdefault("YOUDAO_APP_KEY", "standin-app-key")
+    os.environ.setdefault("YOUDAO_APP_SECRET", "standin-app-secret")
+    reload_settings()
+
+
+class StandInOcrServer:
+    """
+    有道 ocrtransapi 的本地替身：固定延迟，超过 qps_limit 时返回 411 限流错误码。
+    """
+
+    def __init__(self, latency=0.2, qps_limit=8):
+        self.latency = latency
+        self.qps_limit = qps_limit
+        self.requests = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._render = _tiny_jpeg()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/ocrtransapi"
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.qps_limit:
+                self.throttled += 1
+                return False
+            self._recent.append(now)
+            return True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if server._admit():
+                    time.sleep(server.latency)
+                    body = {
+                        "errorCode": "0",
+                        "render_image": server._render,
+                        "resRegions": [{"context": "hello", "tranContent": "你好"}],
+                    }
+                else:
+                    body = {"errorCode": "411", "msg": "access frequency limited"}
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def make_images(image_dir, n, size=(640, 480)):
+    os.makedirs(image_dir, exist_ok=True)
+    names = []
+    for i in range(n):
+        name = f"image_{i:03d}.png"
+        Image.new("RGB", size, (i % 255, 100, 150)).save(os.path.join(image_dir, name))
+        names.append(name)
+    return names
+
+
+def run_serial(files, image_dir, api_url, delay):
+    """原 main() 的串行循环：逐张请求，每次固定 sleep"""
+    from temp.ocr.concurrency import RunStats
+    stats = RunStats()
+    for f in files:
+        start = time.perf_counter()
+        res = trans_imgs.translate_image(os.path.join(image_dir, f), api_url=api_url)
+        ok = trans_imgs.handle_result(f, res)
+        stats.record(time.perf_counter() - start, ok)
+        time.sleep(delay)
+    return stats.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="替身服务每个请求的处理延迟（秒）")
+    parser.add_argument("--qps-limit", type=int, default=8, help="替身服务每秒允许的请求数")
+    parser.add_argument("--serial-delay", type=float, default=1.0, help="串行基线每次请求后的 sleep")
+    parser.add_argument("--workers", type=int, default=trans_imgs.MAX_WORKERS)
+    parser.add_argument("--rate", type=float, default=trans_imgs.RATE_LIMIT_QPS)
+    args = parser.parse_args()
+    use_standin_credentials()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_dir = os.path.join(tmp, "images")
+        files = make_images(image_dir, args.images)
+        trans_imgs.OUTPUT_DIR = os.path.join(tmp, "out")
+        trans_imgs.init_dirs()
+
+        results = {}
+        with StandInOcrServer(args.latency, args.qps_limit) as server:
+            results["serial"] = run_serial(files, image_dir, server.url, args.serial_delay).report("串行基线")
+            results["concurrent"] = trans_imgs.run_concurrent(
+                files, image_dir=image_dir, max_workers=args.workers, rate=args.rate, api_url=server.url
+            ).report("并发 runner")
+            results["server"] = {"requests": server.requests, "throttled": server.throttled}
+
+    speedup = results["serial"]["elapsed_s"] / max(results["concurrent"]["elapsed_s"], 1e-9)
+    results["speedup"] = round(speedup, 2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
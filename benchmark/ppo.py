@@ -0,0 +1,187 @@
+"""
+PPO 基准：notebooks/rlhf/for_ppo.ipynb 的小 GPT-2 配置（CPU），比较 steps/s。
+
+- vectorized  src.train.ppo.PPOTrainer：actor-critic 共享一次前向，KL/GAE/mask 全部张量运算
+- naive       notebook 写法：actor / critic / ref 分别前向，KL 奖励与 GAE 按 token 逐步 Python 循环
+另外单独比较优势计算（GAE）本身在较长回复上的耗时，并校验两种实现数值一致。
+用法（在仓库根目录）：
+    python -m benchmark.ppo --steps 5 --batch-size 8 --max-new-tokens 16
+"""
+import argparse
+import copy
+import json
+import time
+
+import torch
+
+from src.llm.backends import build_tiny_gpt2
+from src.train.ppo import (ActorCritic, PPOConfig, PPOTrainer, compute_gae, compute_rewards, masked_mean,
+                           response_mask_from_tokens)
+
+
+def naive_gae(rewards, attention_mask, values, gamma, lam):
+    """notebook 中的 get_GAE：按时间步倒序循环"""
+    lastgae = 0
+    advantages_reversed = []
+    response_len = rewards.shape[-1]
+    values = values * attention_mask
+    rewards = rewards * attention_mask
+    for t in reversed(range(response_len)):
+        nextvalues = values[:, t + 1] if t < response_len - 1 else 0.0
+        delta = rewards[:, t] + gamma * nextvalues - values[:, t]
+        lastgae = delta + gamma * lam * lastgae
+        advantages_reversed.append(lastgae)
+    return torch.stack(advantages_reversed[::-1]).transpose(0, 1)
+
+
+def naive_rewards(scores, logprobs, ref_logprobs, mask, kl_ctl):
+    """逐样本、逐 token 计算 KL 奖励，得分加在最后一个有效 token 上"""
+    rewards = torch.zeros_like(logprobs)
+    for b in range(logprobs.shape[0]):
+        last = 0
+        for t in range(logprobs.shape[1]):
+            if mask[b, t] > 0:
+                rewards[b, t] = -kl_ctl * (logprobs[b, t] - ref_logprobs[b, t])
+                last = t
+        rewards[b, last] += scores[b]
+    return rewards
+
+
+class RewardModel(torch.nn.Module):
+    """notebook 中的 GPTRewardModel：取最后一个有效 token 的隐藏状态过线性头"""
+
+    def __init__(self, gpt_model, hidden_size):
+        super().__init__()
+        self.gpt_model = gpt_model
+        self.reward_head = torch.nn.Linear(hidden_size, 1)
+
+    @torch.no_grad()
+    def forward(self, input_ids, attention_mask):
+        hidden = self.gpt_model(input_ids=input_ids, attention_mask=attention_mask,
+                                output_hidden_states=True).hidden_states[-1]
+        last = attention_mask.sum(dim=1).long() - 1
+        return self.reward_head(hidden[torch.arange(len(input_ids)), last]).squeeze(-1)
+
+
+def naive_step(actor, value_head, ref, reward_model, optimizer, prompt_ids, prompt_mask, config, tokenizer):
+    """notebook 风格：各模型分别前向，奖励与 GAE 逐 token 循环，训练时 logits 与 values 也分两次前向"""
+    start = time.perf_counter()
+    with torch.no_grad():
+        sequences = actor.generate(input_ids=prompt_ids, attention_mask=prompt_mask,
+                                   max_new_tokens=config.max_new_tokens, do_sample=True,
+                                   pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id)
+        p = prompt_ids.shape[1]
+        response = sequences[:, p:]
+        mask = response_mask_from_tokens(response, tokenizer.eos_token_id).float()
+        attention_mask = torch.cat([prompt_mask, mask.long()], dim=1)
+
+        def logprobs_of(model):
+            logits = model(input_ids=sequences, attention_mask=attention_mask).logits[:, p - 1:-1]
+            return torch.gather(torch.log_softmax(logits, -1), 2, response.unsqueeze(-1)).squeeze(-1)
+
+        def values_of():
+            hidden = actor(input_ids=sequences, attention_mask=attention_mask,
+                           output_hidden_states=True).hidden_states[-1]
+            return value_head(hidden).squeeze(-1)[:, p - 1:-1]
+
+        old_logprobs = logprobs_of(actor)
+        ref_logprobs = logprobs_of(ref)
+        old_values = values_of()
+        scores = reward_model(sequences, attention_mask)
+        rewards = naive_rewards(scores, old_logprobs, ref_logprobs, mask, config.kl_ctl)
+        advantages = naive_gae(rewards, mask, old_values, config.gamma, config.lam)
+        returns = advantages + old_values * mask
+
+    for _ in range(config.ppo_epochs):
+        for idx in torch.randperm(len(sequences)).split(config.mini_batch_size):
+            seq, am, m = sequences[idx], attention_mask[idx], mask[idx]
+            logits = actor(input_ids=seq, attention_mask=am).logits[:, p - 1:-1]
+            logprobs = torch.gather(torch.log_softmax(logits, -1), 2, seq[:, p:].unsqueeze(-1)).squeeze(-1)
+            hidden = actor(input_ids=seq, attention_mask=am, output_hidden_states=True).hidden_states[-1]
+            values = value_head(hidden).squeeze(-1)[:, p - 1:-1]
+            ratio = torch.exp(logprobs - old_logprobs[idx])
+            adv = advantages[idx]
+            pg = masked_mean(torch.max(-adv * ratio, -adv * torch.clamp(ratio, 0.8, 1.2)), m)
+            v_old = old_values[idx]
+            v_clip = torch.clamp(values, v_old - config.cliprange_value, v_old + config.cliprange_value)
+            vf = 0.5 * masked_mean(torch.max((v_clip - returns[idx]) ** 2, (values - returns[idx]) ** 2), m)
+            loss = pg + config.vf_coef * vf
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    return time.perf_counter() - start
+
+
+def advantage_microbench(batch, length, config, repeats=5):
+    torch.manual_seed(0)
+    logprobs, ref_logprobs, values = torch.randn(batch, length), torch.randn(batch, length), torch.randn(batch, length)
+    mask = (torch.arange(length).unsqueeze(0) < torch.randint(length // 2, length + 1, (batch, 1))).float()
+    scores = torch.randn(batch)
+
+    def vectorized():
+        rewards, _ = compute_rewards(scores, logprobs, ref_logprobs, mask, config.kl_ctl)
+        return compute_gae(rewards, values, mask, config.gamma, config.lam)[0]
+
+    def naive():
+        rewards = naive_rewards(scores, logprobs, ref_logprobs, mask, config.kl_ctl)
+        return naive_gae(rewards, mask, values, config.gamma, config.lam)
+
+    result = {"batch": batch, "response_len": length,
+              "max_abs_diff": float((vectorized() - naive()).abs().max())}
+    for name, fn in (("vectorized", vectorized), ("naive", naive)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        result[f"{name}_ms"] = round((time.perf_counter() - start) / repeats * 1e3, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--prompt-len", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    config = PPOConfig(max_new_tokens=args.max_new_tokens)
+    torch.manual_seed(1)
+    prompt_ids = torch.randint(0, 256, (args.batch_size, args.prompt_len))
+    prompt_mask = torch.ones_like(prompt_ids)
+    results = {"batch_size": args.batch_size, "max_new_tokens": args.max_new_tokens}
+
+    # vectorized
+    backend = build_tiny_gpt2()
+    tokenizer = backend.tokenizer
+    hidden = backend.model.config.n_embd
+    actor_critic = ActorCritic(backend.model, hidden)
+    ref = copy.deepcopy(backend.model)
+    reward_model = RewardModel(build_tiny_gpt2(seed=2).model, hidden)
+    trainer = PPOTrainer(actor_critic, ref, reward_model, torch.optim.Adam(actor_critic.parameters(), lr=1e-4),
+                         config, pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id)
+    trainer.step(prompt_ids, prompt_mask)
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        trainer.step(prompt_ids, prompt_mask)
+    results["vectorized_steps_per_s"] = round(args.steps / (time.perf_counter() - start), 3)
+
+    # naive
+    backend = build_tiny_gpt2()
+    actor = backend.model
+    value_head = torch.nn.Linear(hidden, 1)
+    ref = copy.deepcopy(actor).eval()
+    optimizer = torch.optim.Adam(list(actor.parameters()) + list(value_head.parameters()), lr=1e-4)
+    naive_step(actor, value_head, ref, reward_model, optimizer, prompt_ids, prompt_mask, config, tokenizer)
+    elapsed = sum(naive_step(actor, value_head, ref, reward_model, optimizer, prompt_ids, prompt_mask, config,
+                             tokenizer) for _ in range(args.steps))
+    results["naive_steps_per_s"] = round(args.steps / elapsed, 3)
+    results["speedup"] = round(results["vectorized_steps_per_s"] / results["naive_steps_per_s"], 2)
+
+    results["advantages"] = [advantage_microbench(args.batch_size, args.max_new_tokens, config),
+                             advantage_microbench(64, 256, config, repeats=2)]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
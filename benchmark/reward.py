@@ -0,0 +1,137 @@
+"""
+奖励模型打分基准：小 GPT-2 配置（CPU），合成长度不一、约三成重复的 (prompt, response) 候选对。
+
+- notebook  GPTRewardModel 写法：整模型前向 + output_hidden_states，逐条打分
+- batched   同样写法但按输入顺序凑 batch（右填充）
+- scorer    src.train.reward.RewardScorer：只跑主干、按长度排序分批、去重 + 得分缓存（冷启动 / 再跑一遍）
+- jsonl     score_jsonl 流式处理候选对文件，比较不同线程数
+并校验 scorer 与 notebook 写法的得分一致。
+用法（在仓库根目录）：
+    python -m benchmark.reward --pairs 2000 --batch-size 32
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import torch
+
+from benchmark.rag_index import MEDICAL_TERMS
+from src.llm.backends import build_tiny_gpt2
+from src.train.reward import RewardModel, RewardScorer, ScoreCache
+
+
+def make_pairs(n, duplicate_ratio=0.3, seed=0):
+    rng = random.Random(seed)
+    unique = []
+    pairs = []
+    for _ in range(n):
+        if unique and rng.random() < duplicate_ratio:
+            pairs.append(rng.choice(unique))
+            continue
+        prompt = "，".join(rng.choice(MEDICAL_TERMS) for _ in range(rng.randint(1, 6))) + "？"
+        words = max(1, int(rng.lognormvariate(1.8, 0.8)))
+        response = "，".join(rng.choice(MEDICAL_TERMS) for _ in range(words)) + "。"
+        unique.append((prompt, response))
+        pairs.append((prompt, response))
+    return pairs
+
+
+class NotebookRewardModel(torch.nn.Module):
+    """notebook 中的 GPTRewardModel：整模型前向取 hidden_states[-1]，右填充下按 sum - 1 取最后一个 token"""
+
+    def __init__(self, gpt_model, reward_head):
+        super().__init__()
+        self.gpt_model = gpt_model
+        self.reward_head = reward_head
+
+    @torch.no_grad()
+    def forward(self, input_ids, attention_mask):
+        hidden = self.gpt_model(input_ids=input_ids, attention_mask=attention_mask,
+                                output_hidden_states=True).hidden_states[-1]
+        last = attention_mask.sum(dim=1).long() - 1
+        return self.reward_head(hidden[torch.arange(len(input_ids)), last]).squeeze(-1)
+
+
+def pad_right(sequences, pad_token_id):
+    width = max(len(s) for s in sequences)
+    input_ids = torch.full((len(sequences), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+    for row, seq in enumerate(sequences):
+        input_ids[row, :len(seq)] = torch.tensor(seq)
+        attention_mask[row, :len(seq)] = 1
+    return input_ids, attention_mask
+
+
+def notebook_scores(model, scorer, pairs, batch_size):
+    scores = []
+    for start in range(0, len(pairs), batch_size):
+        sequences = [scorer.encode(p, r) for p, r in pairs[start:start + batch_size]]
+        scores += model(*pad_right(sequences, scorer.pad_token_id)).tolist()
+    return scores
+
+
+def timed(fn, n):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    return result, {"s": round(elapsed, 3), "pairs_per_s": round(n / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--notebook-pairs", type=int, default=300, help="逐条打分的对照只跑前若干条")
+    args = parser.parse_args()
+
+    pairs = make_pairs(args.pairs)
+    backend = build_tiny_gpt2(n_positions=2048)
+    torch.manual_seed(0)
+    head = torch.nn.Linear(backend.model.config.n_embd, 1)
+    notebook = NotebookRewardModel(backend.model, head).eval()
+    results = {"pairs": len(pairs), "unique_pairs": len(set(pairs)), "batch_size": args.batch_size}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scorer = RewardScorer(RewardModel(backend.model, head), backend.tokenizer, batch_size=args.batch_size)
+        subset = pairs[:args.notebook_pairs]
+        _, results["notebook_one_by_one"] = timed(lambda: notebook_scores(notebook, scorer, subset, 1), len(subset))
+        reference, results["notebook_batched"] = timed(
+            lambda: notebook_scores(notebook, scorer, pairs, args.batch_size), len(pairs))
+
+        cache = ScoreCache(os.path.join(tmp, "scores.sqlite"))
+        scorer = RewardScorer(RewardModel(backend.model, head), backend.tokenizer, batch_size=args.batch_size,
+                              cache=cache, model_tag="bench-head-seed0")
+        scores, results["scorer_cold"] = timed(lambda: scorer.score(pairs), len(pairs))
+        _, results["scorer_warm"] = timed(lambda: scorer.score(pairs), len(pairs))
+        results["scorer_stats"] = scorer.stats()
+        results["max_abs_diff"] = max(abs(a - b) for a, b in zip(scores, reference))
+
+        # 冷缓存下的 JSONL 流式打分；SQLite 缓存跨实例命中
+        input_path = os.path.join(tmp, "candidates.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for i, (prompt, response) in enumerate(pairs):
+                f.write(json.dumps({"id": i, "prompt": prompt, "response": response}, ensure_ascii=False) + "\n")
+        results["jsonl"] = {}
+        for workers in (1, 2, 4):
+            scorer = RewardScorer(RewardModel(backend.model, head), backend.tokenizer, batch_size=args.batch_size)
+            output_path = os.path.join(tmp, f"scored-{workers}.jsonl")
+            _, results["jsonl"][f"workers_{workers}"] = timed(
+                lambda: scorer.score_jsonl(input_path, output_path, num_workers=workers), len(pairs))
+        with open(output_path, "r", encoding="utf-8") as f:
+            streamed = [json.loads(line)["score"] for line in f]
+        results["jsonl"]["max_abs_diff"] = max(abs(a - b) for a, b in zip(streamed, reference))
+
+        reopened = RewardScorer(RewardModel(backend.model, head), backend.tokenizer, batch_size=args.batch_size,
+                                cache=ScoreCache(os.path.join(tmp, "scores.sqlite")), model_tag="bench-head-seed0")
+        _, results["sqlite_reopen"] = timed(lambda: reopened.score(pairs), len(pairs))
+        results["sqlite_reopen"]["cache_hits"] = reopened.stats()["cache_hits"]
+        cache.close()
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+SFT 数据加载基准：合成 mllm_data（清单 + JSONL 分片，回复长度长尾分布），比较三种组 batch 方式。
+
+- naive   随机 batch，填充到批内最长（现有做法）
+- bucket  按长度分桶后填充
+- pack    多个样本装进一条 max_seq_len 序列，块对角注意力
+统计填充效率（有效 token / 张量总位置）、纯加载 samples/s，以及小 GPT-2 前向 + 反向的训练 samples/s；
+并校验装箱序列的 logits 与各样本单独前向一致。
+用法（在仓库根目录）：
+    python -m benchmark.sft_loader --samples 20000 --train-batches 20
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from benchmark.rag_index import MEDICAL_TERMS
+from src.llm.backends import build_tiny_gpt2
+from src.train.data_prep import build_record, shard_name, write_manifest
+from src.train.sft_data import PackedDataset, TokenStore, make_loader, packed_attention_mask, padding_efficiency
+
+
+def write_synthetic_mllm_data(output_dir, n, shard_size=5000, seed=0):
+    """写出与 export_mllm_dataset 相同布局的数据；回复长度近似对数正态（少数很长的报告）"""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(output_dir, "shards"), exist_ok=True)
+    for first in range(0, n, shard_size):
+        last = min(n, first + shard_size) - 1
+        with open(os.path.join(output_dir, "shards", shard_name(first, last)), "w", encoding="utf-8") as f:
+            for i in range(first, last + 1):
+                words = max(1, int(rng.lognormvariate(2.2, 0.9)))
+                caption = "，".join(rng.choice(MEDICAL_TERMS) for _ in range(words)) + "。"
+                f.write(json.dumps(build_record(f"{output_dir}/images/{i}.jpg", caption), ensure_ascii=False) + "\n")
+    return write_manifest(output_dir, n)
+
+
+def loader_pass(loader):
+    start = time.perf_counter()
+    samples, real, total = 0, 0, 0
+    for batch in loader:
+        samples += batch.get("num_samples", len(batch["input_ids"]))
+        eff = padding_efficiency(batch)
+        real += eff * batch["input_ids"].numel()
+        total += batch["input_ids"].numel()
+    elapsed = time.perf_counter() - start
+    return {"samples_per_s": round(samples / elapsed, 1), "padding_efficiency": round(real / total, 3),
+            "batches": len(loader), "tokens_per_batch": round(total / len(loader), 1)}
+
+
+def train_pass(loader, model, optimizer, max_batches):
+    model.train()
+    samples = 0
+    start = time.perf_counter()
+    for i, batch in enumerate(loader):
+        if i >= max_batches:
+            break
+        kwargs = {"input_ids": batch["input_ids"], "labels": batch["labels"], "attention_mask": batch["attention_mask"]}
+        if "position_ids" in batch:
+            kwargs["position_ids"] = batch["position_ids"]
+        loss = model(**kwargs).loss
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        samples += batch.get("num_samples", len(batch["input_ids"]))
+    return round(samples / (time.perf_counter() - start), 1)
+
+
+@torch.no_grad()
+def check_packing(store, model, max_seq_len):
+    model.eval()
+    dataset = PackedDataset(store, max_seq_len, shuffle=False)
+    item = dataset[len(dataset) // 2]
+    segment_ids = torch.from_numpy(item["segment_ids"])[None]
+    position_ids = torch.from_numpy(item["position_ids"])[None]
+    logits = model(input_ids=torch.from_numpy(item["input_ids"])[None], position_ids=position_ids,
+                   attention_mask=packed_attention_mask(position_ids)).logits[0]
+    diff = 0.0
+    for seg, sample_idx in enumerate(dataset.bins[len(dataset) // 2], start=1):
+        ids = torch.from_numpy(np.asarray(store[sample_idx]["input_ids"], dtype=np.int64))[None]
+        alone = model(input_ids=ids).logits[0]
+        diff = max(diff, float((logits[segment_ids[0] == seg] - alone).abs().max()))
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-seq-len", type=int, default=1024)
+    parser.add_argument("--train-batches", type=int, default=20)
+    args = parser.parse_args()
+
+    backend = build_tiny_gpt2(n_positions=2048)
+    results = {"samples": args.samples}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir, store_dir = os.path.join(tmp, "mllm_data"), os.path.join(tmp, "tokens")
+        write_synthetic_mllm_data(data_dir, args.samples)
+
+        start = time.perf_counter()
+        store = TokenStore.build(data_dir, store_dir, backend.tokenizer, max_len=args.max_seq_len)
+        results["store_build_s"] = round(time.perf_counter() - start, 2)
+        start = time.perf_counter()
+        store = TokenStore.build(data_dir, store_dir, backend.tokenizer, max_len=args.max_seq_len)
+        results["store_reopen_s"] = round(time.perf_counter() - start, 4)
+        results["length"] = {"mean": round(float(store.lengths.mean()), 1), "p50": int(np.median(store.lengths)),
+                             "max": int(store.lengths.max())}
+
+        # pack 模式每批的序列数按 naive 的平均 token 数折算，保持每步计算量相近
+        naive_tokens = loader_pass(make_loader(store, "naive", args.batch_size))["tokens_per_batch"]
+        pack_rows = max(1, round(naive_tokens / args.max_seq_len))
+        for mode in ("naive", "bucket", "pack"):
+            batch_size = pack_rows if mode == "pack" else args.batch_size
+            loader = make_loader(store, mode, batch_size, max_seq_len=args.max_seq_len)
+            stats = loader_pass(loader)
+            model = build_tiny_gpt2(n_positions=2048).model
+            optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
+            stats["train_samples_per_s"] = train_pass(loader, model, optimizer, args.train_batches)
+            results[mode] = stats
+
+        results["packed_logits_max_diff"] = check_packing(store, backend.model, args.max_seq_len)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
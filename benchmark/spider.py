@@ -0,0 +1,305 @@
+"""
+B 站投稿列表爬虫基准：在本地模拟 API 上对比原 fetch_user_videos 的串行翻页与 CrawlerEngine。
+
+模拟服务实现 /x/web-interface/nav 与 /x/space/wbi/arc/search：校验 WBI 签名（错误返回 -352）、
+超过 qps_limit 返回 -412，可中途轮换密钥。比较墙钟时间、请求数、限流次数；
+另外中途停止一次 CrawlerEngine，再用断点续跑，检查结果无重复、无遗漏；
+最后模拟 UP 主发布新视频、播放量变化，对比完整重抓与增量抓取（CrawlerEngine.sync）的请求数与耗时。
+用法（在仓库根目录）：
+    python -m benchmark.spider --mids 6 --qps-limit 20 --legacy-sleep 0.5
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from temp.spiders.engine import CrawlCheckpoint, CrawlerEngine, JsonlSink
+from temp.spiders.store import VideoStore
+from temp.spiders.wbi import mixin_key, sign_params
+
+
+class MockBilibiliServer:
+    """
+    B 站接口的本地替身。videos: {mid: 投稿数}；投稿按发布时间倒序分页。
+    - 固定 latency 秒处理延迟；1 秒滑动窗口内超过 qps_limit 个请求返回 -412
+    - w_rid 与当前密钥计算结果不一致时返回 -352；rotate_keys() 模拟每日轮换
+    - publish() 模拟发布新视频，bump_plays() 模拟播放量增长
+    """
+
+    def __init__(self, videos, latency=0.02, qps_limit=20, seed=0):
+        self.latency = latency
+        self.qps_limit = qps_limit
+        self.counters = {"nav": 0, "search": 0, "throttled": 0, "bad_sign": 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._key_version = 0
+        self._rng = random.Random(seed)
+        now = int(time.time())
+        # 每 3 小时一个投稿，400 个投稿约跨 50 天，覆盖刷新计划的各个档位
+        self.videos = {mid: [self._video(mid, f"x{i:05d}", now - i * 3 * 3600) for i in range(n)]
+                       for mid, n in videos.items()}
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def _video(self, mid, suffix, created):
+        return {"bvid": f"BV{mid}{suffix}", "title": f"视频 {suffix}", "description": "", "created": created,
+                "length": f"{self._rng.randint(1, 30)}:{self._rng.randint(0, 59):02d}",
+                "play": self._rng.randint(0, 10 ** 6)}
+
+    def publish(self, mid, n):
+        """发布 n 个新视频（排在列表最前）"""
+        now = int(time.time())
+        with self._lock:
+            start = len(self.videos[mid])
+            fresh = [self._video(mid, f"n{start + i:05d}", now + n - i) for i in range(n)]
+            self.videos[mid] = fresh + self.videos[mid]
+
+    def bump_plays(self):
+        with self._lock:
+            for videos in self.videos.values():
+                for v in videos:
+                    v["play"] += self._rng.randint(1, 1000)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def keys(self):
+        return f"{self._key_version:032x}", f"{self._key_version + 7:032x}"
+
+    def rotate_keys(self):
+        with self._lock:
+            self._key_version += 1
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.qps_limit:
+                self.counters["throttled"] += 1
+                return False
+            self._recent.append(now)
+            return True
+
+    def _search(self, query):
+        params = {k: v[0] for k, v in urllib.parse.parse_qs(query, keep_blank_values=True).items()}
+        w_rid = params.pop("w_rid", None)
+        wts = params.pop("wts", None)
+        expected = sign_params(params, mixin_key("".join(self.keys())), wts=int(wts or 0))["w_rid"]
+        if w_rid != expected:
+            self.counters["bad_sign"] += 1
+            return {"code": -352, "message": "风控校验失败"}
+        if not self._admit():
+            return {"code": -412, "message": "请求过于频繁，请稍后再试"}
+        time.sleep(self.latency)
+        videos = self.videos.get(int(params["mid"]), [])
+        ps, pn = int(params["ps"]), int(params["pn"])
+        return {"code": 0, "message": "0", "data": {"list": {"vlist": videos[(pn - 1) * ps:pn * ps]},
+                                                    "page": {"pn": pn, "ps": ps, "count": len(videos)}}}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                if path == "/x/web-interface/nav":
+                    server.counters["nav"] += 1
+                    img, sub = server.keys()
+                    body = {"code": 0, "data": {"wbi_img": {"img_url": f"https://i0.hdslb.com/bfs/wbi/{img}.png",
+                                                            "sub_url": f"https://i0.hdslb.com/bfs/wbi/{sub}.png"}}}
+                elif path == "/x/space/wbi/arc/search":
+                    server.counters["search"] += 1
+                    body = server._search(query)
+                else:
+                    self.send_error(404)
+                    return
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def legacy_crawl(api_base, mids, sleep_s, page_size=30):
+    """原 fetch_user_videos 的写法：每个 MID 串行翻页，每页重建 mixin key 签名，固定 sleep，全部留在内存"""
+    sess = requests.Session()
+    nav = sess.get(f"{api_base}/x/web-interface/nav").json()["data"]["wbi_img"]
+    img_key, sub_key = (u.split("/")[-1].split(".")[0] for u in (nav["img_url"], nav["sub_url"]))
+    all_videos, requests_made = [], 0
+    for mid in mids:
+        page = 1
+        while True:
+            params = {"mid": mid, "ps": page_size, "tid": 0, "pn": page, "keyword": "", "order": "pubdate",
+                      "order_avoided": "true"}
+            data = sess.get(f"{api_base}/x/space/wbi/arc/search",
+                            params=sign_params(params, mixin_key(img_key + sub_key))).json()
+            requests_made += 1
+            if data["code"] != 0:
+                break
+            vlist = data["data"]["list"]["vlist"]
+            if not vlist:
+                break
+            all_videos.extend(vlist)
+            page += 1
+            time.sleep(sleep_s)
+    return all_videos, requests_made
+
+
+class StopAfter(JsonlSink):
+    """写满 n 页后设置 stop_event，模拟中途中断"""
+
+    def __init__(self, path, n, stop_event):
+        super().__init__(path)
+        self.n = n
+        self.stop_event = stop_event
+        self.pages = 0
+
+    def write(self, rows):
+        self.pages += 1
+        if self.pages >= self.n:
+            self.stop_event.set()
+        return super().write(rows)
+
+
+def read_bvids(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["bvid"] for line in f if line.strip()]
+
+
+def incremental(server, mids, engine_kwargs, tmp, new_per_mid):
+    """
+    首次 sync 建库后发布新视频、播放量增长，然后比较：
+    完整重抓 / 增量只抓新投稿 / 增量 + 2 小时后的刷新 / 增量 + 1.5 天后的刷新
+    """
+    def run(label, fn):
+        start = time.perf_counter()
+        before = server.counters["search"]
+        summary = fn()
+        out[label] = {"wall_s": round(time.perf_counter() - start, 3),
+                      "requests": server.counters["search"] - before,
+                      **{k: summary[k] for k in ("new_pages", "refresh_pages", "inserted", "refreshed") if k in summary}}
+
+    def play_matches(store):
+        server_play = {v["bvid"]: v["play"] for videos in server.videos.values() for v in videos}
+        return sum(v["play"] == server_play[v["bvid"]] for v in store.videos())
+
+    out = {}
+    t0 = time.time()
+    with VideoStore(os.path.join(tmp, "videos.sqlite3")) as store:
+        run("initial_sync", lambda: CrawlerEngine(api_base=server.url, **engine_kwargs).sync(mids, store, now=t0))
+        for mid in mids:
+            server.publish(mid, new_per_mid)
+        server.bump_plays()
+        total = sum(len(v) for v in server.videos.values())
+
+        def full():
+            with JsonlSink(os.path.join(tmp, "full_recrawl.jsonl")) as sink:
+                return CrawlerEngine(api_base=server.url, **engine_kwargs).crawl(mids, sink)
+
+        run("full_recrawl", full)
+        engine = CrawlerEngine(api_base=server.url, **engine_kwargs)
+        run("incremental_new_only", lambda: engine.sync(mids, store, refresh=False, now=t0 + 600))
+        out["incremental_new_only"]["play_up_to_date"] = play_matches(store)
+        run("incremental_refresh_2h", lambda: engine.sync(mids, store, now=t0 + 2 * 3600))
+        out["incremental_refresh_2h"]["play_up_to_date"] = play_matches(store)
+        run("incremental_refresh_1.5d", lambda: engine.sync(mids, store, now=t0 + 1.5 * 86400))
+        out["incremental_refresh_1.5d"]["play_up_to_date"] = play_matches(store)
+        out["store_videos"], out["server_videos"] = store.count(), total
+        out["complete"] = store.count() == total and len(store.known(
+            v["bvid"] for videos in server.videos.values() for v in videos)) == total
+    full_run, inc = out["full_recrawl"], out["incremental_new_only"]
+    out["request_reduction"] = round(full_run["requests"] / max(1, inc["requests"]), 1)
+    out["speedup"] = round(full_run["wall_s"] / inc["wall_s"], 1)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mids", type=int, default=6)
+    parser.add_argument("--min-videos", type=int, default=100)
+    parser.add_argument("--max-videos", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--qps-limit", type=int, default=20)
+    parser.add_argument("--legacy-sleep", type=float, default=0.5, help="原脚本每页 sleep 2s，这里按比例缩短")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0)
+    parser.add_argument("--max-rate", type=float, default=40.0)
+    parser.add_argument("--new-per-mid", type=int, default=5, help="增量测试中每位 UP 主新发布的视频数")
+    parser.add_argument("--skip-legacy", action="store_true", help="跳过原串行抓取（耗时最长）")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    videos = {100000 + i: rng.randint(args.min_videos, args.max_videos) for i in range(args.mids)}
+    mids, total = list(videos), sum(videos.values())
+    results = {"mids": len(mids), "videos": total}
+    engine_kwargs = {"max_workers": args.workers, "rate": args.rate, "max_rate": args.max_rate, "cooldown_s": 1.0}
+
+    with tempfile.TemporaryDirectory() as tmp, MockBilibiliServer(videos, args.latency, args.qps_limit) as server:
+        if not args.skip_legacy:
+            start = time.perf_counter()
+            legacy_videos, legacy_requests = legacy_crawl(server.url, mids, args.legacy_sleep)
+            results["legacy"] = {"wall_s": round(time.perf_counter() - start, 2), "requests": legacy_requests,
+                                 "videos": len(legacy_videos)}
+
+        # 完整抓取；中途轮换一次密钥，检查 -352 后自动刷新
+        path = os.path.join(tmp, "full.jsonl")
+        engine = CrawlerEngine(api_base=server.url, **engine_kwargs)
+        threading.Timer(0.5, server.rotate_keys).start()
+        throttled_before = server.counters["throttled"]
+        with JsonlSink(path) as sink:
+            summary = engine.crawl(mids, sink)
+        bvids = read_bvids(path)
+        summary.update(server_throttled=server.counters["throttled"] - throttled_before,
+                       unique_videos=len(set(bvids)), duplicate_rows=len(bvids) - len(set(bvids)))
+        results["engine"] = summary
+        if "legacy" in results:
+            results["speedup"] = round(results["legacy"]["wall_s"] / summary["elapsed_s"], 2)
+
+        # 中断 + 断点续跑
+        path = os.path.join(tmp, "resume.jsonl")
+        checkpoint_path = path + ".checkpoint.json"
+        stop = threading.Event()
+        with StopAfter(path, 10, stop) as sink:
+            first = CrawlerEngine(api_base=server.url, **engine_kwargs).crawl(
+                mids, sink, CrawlCheckpoint(checkpoint_path), stop_event=stop)
+        with JsonlSink(path) as sink:
+            second = CrawlerEngine(api_base=server.url, **engine_kwargs).crawl(
+                mids, sink, CrawlCheckpoint(checkpoint_path))
+        bvids = read_bvids(path)
+        results["resume"] = {"first_run_videos": first["videos"], "first_run_unfinished": len(first["unfinished"]),
+                             "second_run_videos": second["videos"], "second_run_requests": second["requests"],
+                             "unique_videos": len(set(bvids)), "duplicate_rows": len(bvids) - len(set(bvids)),
+                             "complete": len(set(bvids)) == total}
+        results["incremental"] = incremental(server, mids, engine_kwargs, tmp, args.new_per_mid)
+        results["server"] = dict(server.counters)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""
+全流程基准套件：在合成数据上逐阶段测量吞吐、延迟分位数与峰值 RSS，并可与基线结果比较、标记性能回退。
+
+阶段：docx_images / ocr_http / ocr_postprocess / tts_split / export_mllm / arrow_lookup /
+      bm25_search / ivf_search / llm_generate / reward_score
+每个阶段在独立的 spawn 子进程中运行（峰值 RSS 互不干扰）：先准备数据（不计时），再 warmup 次预热、
+repeats 次计时，结果写成 JSON。compare 按阈值比较吞吐、p50 延迟与峰值 RSS，出现回退时退出码为 1。
+用法（在仓库根目录）：
+    python -m benchmark.suite run --output results/benchmarks/baseline.json
+    python -m benchmark.suite run --stages tts_split,bm25_search --baseline results/benchmarks/baseline.json
+    python -m benchmark.suite compare results/benchmarks/baseline.json results/benchmarks/latest.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+STAGES = {}
+
+
+def stage(name, unit):
+    """
+    注册一个阶段。被装饰的函数 setup(workdir, scale) 负责准备数据（不计时），
+    返回 (run, items)：run() 执行一次被测操作，items 为每次处理的条数（用于计算吞吐）。
+    """
+
+    def register(setup):
+        STAGES[name] = {"setup": setup, "unit": unit, "doc": (setup.__doc__ or "").strip()}
+        return setup
+
+    return register
+
+
+def _fresh_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+@stage("docx_images", unit="images")
+def docx_images(workdir, scale):
+    """get_word_images.extract_all_images_in_order：流式提取 + 去重 + BMP 转码"""
+    from benchmark.docx_images import make_docx
+    from temp.ocr.get_word_images import extract_all_images_in_order
+
+    n = max(10, int(100 * scale))
+    doc_path = make_docx(os.path.join(workdir, "report.docx"), n)
+    out = os.path.join(workdir, "images")
+    return lambda: extract_all_images_in_order(doc_path, _fresh_dir(out), max_workers=2), n
+
+
+@stage("ocr_http", unit="images")
+def ocr_http(workdir, scale):
+    """trans_imgs.run_concurrent 对本地替身 OCR 服务（固定 20ms 延迟）"""
+    from benchmark.ocr_translate import StandInOcrServer, make_images, use_standin_credentials
+    from temp.ocr import trans_imgs
+
+    use_standin_credentials()
+    n = max(8, int(40 * scale))
+    image_dir = os.path.join(workdir, "images")
+    files = make_images(image_dir, n, size=(320, 240))
+    server = StandInOcrServer(latency=0.02, qps_limit=10_000).__enter__()
+    trans_imgs.OUTPUT_DIR = os.path.join(workdir, "out")
+    trans_imgs.init_dirs()
+    return lambda: trans_imgs.run_concurrent(files, image_dir=image_dir, rate=1000, api_url=server.url), n
+
+
+@stage("ocr_postprocess", unit="docs")
+def ocr_postprocess(workdir, scale):
+    """OCR 结果 JSON -> 原文（pipeline.parse_document）-> 分片（chunk_context_text）"""
+    from benchmark.fixtures import make_context_jsons
+    from src.rag.chunking import chunk_context_text
+    from src.rag.pipeline import parse_document
+
+    paths = make_context_jsons(os.path.join(workdir, "json"), max(20, int(300 * scale)))
+
+    def run():
+        for path in paths:
+            chunk_context_text(parse_document(path), os.path.basename(path))
+
+    return run, len(paths)
+
+
+@stage("tts_split", unit="chars")
+def tts_split(workdir, scale):
+    """text_to_mp3.split_text 按句切分长文本"""
+    from benchmark.fixtures import make_long_text
+    from temp.ocr.text_to_mp3 import split_text
+
+    text = make_long_text(max(10_000, int(500_000 * scale)))
+    return lambda: split_text(text), len(text)
+
+
+@stage("export_mllm", unit="rows")
+def export_mllm(workdir, scale):
+    """data_prep.export_mllm_dataset 分片并行导出图片 + JSONL"""
+    from datasets import load_from_disk
+
+    from benchmark.export_mllm import make_arrow_dataset
+    from src.train.data_prep import export_mllm_dataset
+
+    rows = max(100, int(1000 * scale))
+    ds = load_from_disk(make_arrow_dataset(os.path.join(workdir, "arrow"), rows, size=(64, 64)))
+    out = os.path.join(workdir, "mllm_data")
+    return lambda: export_mllm_dataset(ds, _fresh_dir(out), num_proc=2, batch_size=250), rows
+
+
+@stage("arrow_lookup", unit="lookups")
+def arrow_lookup(workdir, scale):
+    """ArrowShardDataset 按 id 随机查找并读取 caption"""
+    from benchmark.fixtures import make_arrow_shards
+    from src.utils.arrow_loader import ArrowShardDataset
+
+    rows = max(500, int(5000 * scale))
+    ds = ArrowShardDataset(make_arrow_shards(os.path.join(workdir, "shards"), rows, shards=4),
+                           index_dir=os.path.join(workdir, "arrow_index"))
+    rng = random.Random(0)
+    ids = [f"sample_{rng.randrange(rows):07d}" for _ in range(1000)]
+
+    def run():
+        for key in ids:
+            ds[key]["caption"]
+
+    return run, len(ids)
+
+
+@stage("bm25_search", unit="queries")
+def bm25_search(workdir, scale):
+    """BM25Index.search 单条查询"""
+    from benchmark.bm25 import synthetic_corpus
+    from benchmark.fixtures import MEDICAL_TERMS
+    from src.rag.bm25 import BM25Builder
+
+    builder = BM25Builder()
+    for doc_id, text in enumerate(synthetic_corpus(max(1000, int(50_000 * scale)))):
+        builder.add(doc_id, text)
+    index = builder.build(os.path.join(workdir, "bm25"))
+    rng = random.Random(1)
+    queries = [rng.choice(MEDICAL_TERMS) + rng.choice(MEDICAL_TERMS) for _ in range(200)]
+
+    def run():
+        for query in queries:
+            index.search(query, 10)
+
+    return run, len(queries)
+
+
+@stage("ivf_search", unit="queries")
+def ivf_search(workdir, scale):
+    """IVFIndex.search 批量查询（float16，nprobe=8）"""
+    from benchmark.rag_index import clustered_vectors
+    from src.rag.index import IVFIndex
+
+    vectors = clustered_vectors(max(5000, int(100_000 * scale)) + 256, 128)
+    index = IVFIndex.build(os.path.join(workdir, "ivf"), vectors[256:])
+    queries = vectors[:256]
+    return lambda: index.search(queries, k=10, nprobe=8), len(queries)
+
+
+@stage("llm_generate", unit="requests")
+def llm_generate(workdir, scale):
+    """InferenceEngine 动态批处理，小 GPT-2 在 CPU 上生成 32 个 token"""
+    from src.llm.backends import build_tiny_gpt2
+    from src.llm.engine import InferenceEngine
+
+    engine = InferenceEngine(build_tiny_gpt2(), max_batch_size=8, max_wait_ms=5)
+    engine.start()
+    rng = random.Random(2)
+    prompts = ["肺部" * rng.randint(2, 30) for _ in range(max(8, int(32 * scale)))]
+    return lambda: engine.generate(prompts, max_new_tokens=32), len(prompts)
+
+
+@stage("reward_score", unit="pairs")
+def reward_score(workdir, scale):
+    """RewardScorer 冷缓存打分（每次新建缓存），小 GPT-2"""
+    import torch
+
+    from benchmark.reward import make_pairs
+    from src.llm.backends import build_tiny_gpt2
+    from src.train.reward import RewardModel, RewardScorer, ScoreCache
+
+    backend = build_tiny_gpt2(n_positions=2048)
+    torch.manual_seed(0)
+    model = RewardModel(backend.model, torch.nn.Linear(backend.model.config.n_embd, 1))
+    pairs = make_pairs(max(50, int(500 * scale)))
+    scorer = RewardScorer(model, backend.tokenizer)
+
+    def run():
+        scorer.cache = ScoreCache()
+        scorer.score(pairs)
+
+    return run, len(pairs)
+
+
+def percentile(samples, q):
+    # 不从 src.llm.engine 导入：那会在每个子进程里先加载 torch，抬高所有阶段的峰值 RSS
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+def _peak_rss_mb(who):
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    kb = resource.getrusage(who).ru_maxrss
+    return round(kb / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_stage(name, scale, warmup, repeats, queue):
+    try:
+        with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            run, items = STAGES[name]["setup"](workdir, scale)
+            setup_s = time.perf_counter() - start
+            for _ in range(warmup):
+                run()
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                samples.append(time.perf_counter() - start)
+        p50 = percentile(samples, 0.50)
+        queue.put({
+            "unit": STAGES[name]["unit"],
+            "items": items,
+            "repeats": repeats,
+            "setup_s": round(setup_s, 3),
+            "latency_ms": {
+                "mean": round(sum(samples) / len(samples) * 1e3, 3),
+                "min": round(min(samples) * 1e3, 3),
+                "p50": round(p50 * 1e3, 3),
+                "p90": round(percentile(samples, 0.90) * 1e3, 3),
+                "p99": round(percentile(samples, 0.99) * 1e3, 3),
+            },
+            "throughput_per_s": round(items / p50, 2) if p50 else 0.0,
+            "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+            "peak_child_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+        })
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(name, scale, warmup, repeats, timeout_s=1800):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_stage, args=(name, scale, warmup, repeats, queue))
+    proc.start()
+    try:
+        result = queue.get(timeout=timeout_s)
+    except Exception:
+        result = {"error": f"超时或子进程异常退出（exitcode={proc.exitcode}）"}
+    proc.join(timeout=10)
+    if proc.is_alive():
+        proc.kill()
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "git_commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def run_suite(names, scale=1.0, warmup=1, repeats=5):
+    results = {"meta": dict(environment(), scale=scale, warmup=warmup, repeats=repeats), "stages": {}}
+    for name in names:
+        print(f"⏱️  {name} ...", flush=True)
+        result = run_isolated(name, scale, warmup, repeats)
+        results["stages"][name] = result
+        if "error" in result:
+            print(f"   ❌ {result['error']}")
+        else:
+            print(f"   {result['throughput_per_s']} {result['unit']}/s  p50 {result['latency_ms']['p50']}ms  "
+                  f"p99 {result['latency_ms']['p99']}ms  峰值 RSS {result['peak_rss_mb']}MB")
+    return results
+
+
+# 指标名 -> (取值函数, 数值变大是否更好)
+METRICS = {
+    "throughput_per_s": (lambda r: r["throughput_per_s"], True),
+    "p50_ms": (lambda r: r["latency_ms"]["p50"], False),
+    "peak_rss_mb": (lambda r: r["peak_rss_mb"], False),
+}
+
+
+def compare(baseline, current, threshold=0.10, rss_threshold=0.20):
+    """
+    逐阶段比较，变化超过阈值（相对值）即标记：regression / improvement，其余为 ok。
+    基线缺失的阶段记为 new，当前缺失或出错的记为 missing / error。返回 (行列表, 是否有回退)。
+    """
+    rows = []
+    for name in sorted(set(baseline["stages"]) | set(current["stages"])):
+        base, cur = baseline["stages"].get(name), current["stages"].get(name)
+        if cur is None or base is None:
+            rows.append({"stage": name, "status": "missing" if cur is None else "new"})
+            continue
+        if "error" in cur or "error" in base:
+            rows.append({"stage": name, "status": "error", "error": cur.get("error") or base.get("error")})
+            continue
+        for metric, (get, higher_is_better) in METRICS.items():
+            before, after = get(base), get(cur)
+            change = (after - before) / before if before else 0.0
+            limit = rss_threshold if metric == "peak_rss_mb" else threshold
+            worse = -change if higher_is_better else change
+            status = "regression" if worse > limit else ("improvement" if -worse > limit else "ok")
+            rows.append({"stage": name, "metric": metric, "baseline": before, "current": after,
+                         "change": round(change, 4), "status": status})
+    return rows, any(row["status"] in ("regression", "error") for row in rows)
+
+
+def print_comparison(rows):
+    icons = {"ok": "  ", "regression": "⚠️", "improvement": "✅", "new": "🆕", "missing": "❔", "error": "❌"}
+    print("📊 与基线比较")
+    for row in rows:
+        icon = icons[row["status"]]
+        if "metric" not in row:
+            print(f"{icon} {row['stage']:<16} {row['status']} {row.get('error', '')}")
+            continue
+        print(f"{icon} {row['stage']:<16} {row['metric']:<17} {row['baseline']:>12} -> {row['current']:<12} "
+              f"{row['change']:+.1%}")
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    run_p = sub.add_parser("run")
+    run_p.add_argument("--stages", default="all", help="逗号分隔的阶段名，默认全部")
+    run_p.add_argument("--scale", type=float, default=1.0, help="数据规模倍数")
+    run_p.add_argument("--warmup", type=int, default=1)
+    run_p.add_argument("--repeats", type=int, default=5)
+    run_p.add_argument("--output", default="results/benchmarks/latest.json")
+    run_p.add_argument("--baseline", help="与该基线 JSON 比较")
+    cmp_p = sub.add_parser("compare")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    for p in (run_p, cmp_p):
+        p.add_argument("--threshold", type=float, default=0.10, help="吞吐 / 延迟相对变化阈值")
+        p.add_argument("--rss-threshold", type=float, default=0.20, help="峰值 RSS 相对变化阈值")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, spec in STAGES.items():
+            print(f"{name:<16} [{spec['unit']}] {spec['doc']}")
+        return 0
+
+    if args.command == "run":
+        names = list(STAGES) if args.stages == "all" else [s.strip() for s in args.stages.split(",") if s.strip()]
+        unknown = [n for n in names if n not in STAGES]
+        if unknown:
+            parser.error(f"未知阶段: {', '.join(unknown)}")
+        current = run_suite(names, args.scale, args.warmup, args.repeats)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已写入 {args.output}")
+        if not args.baseline:
+            return 0
+        baseline = _load(args.baseline)
+    else:
+        baseline, current = _load(args.baseline), _load(args.current)
+
+    if baseline["meta"].get("scale") != current["meta"].get("scale"):
+        print(f"⚠️  数据规模不同（基线 scale={baseline['meta'].get('scale')}，当前 {current['meta'].get('scale')}），"
+              f"比较结果仅供参考")
+    rows, regressed = compare(baseline, current, args.threshold, args.rss_threshold)
+    print_comparison(rows)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+统一配置：环境变量 + .env，首次调用 get_settings() 时解析一次并缓存，导入本模块没有任何副作用。
+
+- 进程环境变量优先于 .env（与 load_dotenv(override=False) 一致），但不会把 .env 写回 os.environ
+- 字段类型取自 Settings 的注解，按类型把字符串转换为 int / float / bool
+- 密钥不再写在脚本里：有道智云、B 站 SESSDATA、Hugging Face Token 都从这里读取，缺失时
+  require() 抛出带变量名的 ValueError；__repr__ 会遮蔽密钥，打印配置不会泄露
+- lazy_module() 把 gradio / datasets / transformers 等重型依赖推迟到第一次访问属性时再导入
+
+用法：
+    from config.settings import get_settings
+
+    settings = get_settings()
+    app_key = settings.require("youdao_app_key")
+"""
+import dataclasses
+import importlib
+import os
+import threading
+from functools import lru_cache
+
+DEFAULT_ENV_FILE = ".env"
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off", ""}
+
+
+def _env(name, secret=False):
+    return {"env": name, "secret": secret}
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    app_root: str = dataclasses.field(default_factory=os.getcwd, metadata=_env("MED_LLM_APP_ROOT"))
+    llm_api_key: str = dataclasses.field(default="", metadata=_env("LLM_API_KEY", secret=True))
+
+    # 有道智云（图片翻译 temp/ocr/trans_imgs.py、语音合成 temp/ocr/text_to_mp3.py）
+    youdao_app_key: str = dataclasses.field(default="", metadata=_env("YOUDAO_APP_KEY", secret=True))
+    youdao_app_secret: str = dataclasses.field(default="", metadata=_env("YOUDAO_APP_SECRET", secret=True))
+
+    # B 站爬虫（temp/spiders/spider.py）
+    bilibili_sessdata: str = dataclasses.field(default="", metadata=_env("BILIBILI_SESSDATA", secret=True))
+    bilibili_target_mid: int = dataclasses.field(default=349950942, metadata=_env("BILIBILI_TARGET_MID"))
+
+    # Hugging Face（src/utils/load_hf.py）
+    hf_token: str = dataclasses.field(default="", metadata=_env("HUGGING_FACE_TOKEN", secret=True))
+    hf_use_mirror: bool = dataclasses.field(default=True, metadata=_env("HF_USE_MIRROR"))
+    hf_mirror_endpoint: str = dataclasses.field(default="https://hf-mirror.com", metadata=_env("HF_MIRROR_ENDPOINT"))
+    hf_offline: bool = dataclasses.field(default=False, metadata=_env("HF_HUB_OFFLINE"))
+    # 跨项目共享的内容寻址模型 / 数据集文件库
+    hf_store_dir: str = dataclasses.field(default="~/.cache/med-llm/hf-store", metadata=_env("MED_LLM_HF_STORE"))
+
+    def require(self, name):
+        """返回字段值；为空时抛 ValueError 并指出对应的环境变量名"""
+        value = getattr(self, name)
+        if value in ("", None):
+            raise ValueError(f"缺少必要环境变量配置: {_FIELDS[name].metadata['env']}")
+        return value
+
+    @property
+    def hf_endpoint(self):
+        return self.hf_mirror_endpoint if self.hf_use_mirror else "https://huggingface.co"
+
+    def youdao_credentials(self):
+        """(app_key, app_secret)，任一缺失时抛 ValueError"""
+        return self.require("youdao_app_key").strip(), self.require("youdao_app_secret").strip()
+
+    def __repr__(self):
+        parts = []
+        for f in dataclasses.fields(self):
+            value = getattr(self, f.name)
+            if f.metadata.get("secret") and value:
+                value = f"{value[:4]}***"
+            parts.append(f"{f.name}={value!r}")
+        return f"Settings({', '.join(parts)})"
+
+
+_FIELDS = {f.name: f for f in dataclasses.fields(Settings)}
+
+
+def _convert(raw, type_, env_name):
+    if type_ in (bool, "bool"):
+        value = raw.strip().lower()
+        if value in _TRUE:
+            return True
+        if value in _FALSE:
+            return False
+        raise ValueError(f"环境变量 {env_name} 应为布尔值，实际为 {raw!r}")
+    if type_ in (int, "int", float, "float"):
+        convert = int if type_ in (int, "int") else float
+        try:
+            return convert(raw)
+        except ValueError:
+            raise ValueError(f"环境变量 {env_name} 应为 {convert.__name__}，实际为 {raw!r}") from None
+    return raw
+
+
+def read_env_file(path):
+    """读取 .env 为字典；文件不存在时返回空字典（python-dotenv 只在此处导入）"""
+    if not path or not os.path.exists(path):
+        return {}
+    from dotenv import dotenv_values
+
+    return {k: v for k, v in dotenv_values(path).items() if v is not None}
+
+
+def _build(values):
+    kwargs = {}
+    for f in dataclasses.fields(Settings):
+        env_name = f.metadata["env"]
+        if env_name in values:
+            kwargs[f.name] = _convert(values[env_name], f.type, env_name)
+    return Settings(**kwargs)
+
+
+def load_settings(env_file=DEFAULT_ENV_FILE, environ=None):
+    """不带缓存地构造 Settings；environ 默认为 os.environ（测试或脚本中可传入字典）"""
+    values = read_env_file(env_file)
+    values.update(os.environ if environ is None else environ)
+    return _build(values)
+
+
+@lru_cache(maxsize=None)
+def _env_file_values(env_file):
+    return read_env_file(env_file)
+
+
+@lru_cache(maxsize=None)
+def get_settings(env_file=DEFAULT_ENV_FILE):
+    """进程内共享的配置，首次调用时解析；修改环境变量或 .env 后调用 reload_settings()"""
+    return _build({**_env_file_values(env_file), **os.environ})
+
+
+def get_env(key, default=None, env_file=DEFAULT_ENV_FILE):
+    """按环境变量名取未在 Settings 中声明的值：进程环境优先，其次 .env（.env 只解析一次）"""
+    return os.environ.get(key, _env_file_values(env_file).get(key, default))
+
+
+def reload_settings():
+    _env_file_values.cache_clear()
+    get_settings.cache_clear()
+
+
+class _LazyModule:
+    """第一次访问属性时才 import 的模块代理（线程安全），import 失败的异常在访问处抛出"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+@lru_cache(maxsize=None)
+def lazy_module(name):
+    """返回模块的惰性代理，如 gr = lazy_module("gradio")；同名模块共享同一个代理"""
+    return _LazyModule(name)
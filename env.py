@@ -1,24 +1,23 @@
-import os
-from dotenv import load_dotenv, dotenv_values
-import gradio as gr
+"""
+兼容旧入口：配置已移到 config/settings.py。导入本模块不再加载 gradio、不再打印 .env 内容。
+"""
+from config.settings import get_env, get_settings, lazy_module
 
-print(gr.__version__)
-
-load_dotenv(".env", override=False)  # take environment variables from ..env.
-print(f"setting environment variables: {dotenv_values('.env')}")
+gr = lazy_module("gradio")
 
 
 def get_app_root():
-    return os.getcwd()
+    return get_settings().app_root
 
 
 def get_env_value(key):
-    value = os.environ.get(key)
+    value = get_env(key)
     if value is None:
         raise ValueError(f"缺少必要环境变量配置: {key}")
     return value
 
 
 if __name__ == '__main__':
+    print(f"gradio {gr.__version__}")
     print("app root is: " + get_app_root())
-    print(f"your API key is: {get_env_value('LLM_API_KEY')}")
+    print(get_settings())
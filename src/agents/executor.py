@@ -0,0 +1,200 @@
+import asyncio
+import inspect
+import itertools
+import json
+import re
+import time
+from dataclasses import dataclass, field
+
+# Qwen 系列的工具调用格式：<tool_call>{"name": ..., "arguments": {...}}</tool_call>
+TOOL_CALL_PATTERN = re.compile(r"<tool_call>\s*(\{.*?\})\s*</tool_call>", re.DOTALL)
+
+
+@dataclass
+class Tool:
+    name: str
+    fn: object
+    description: str = ""
+    timeout_s: float = 10.0
+    cacheable: bool = True
+
+    async def __call__(self, **arguments):
+        if inspect.iscoroutinefunction(self.fn):
+            return await self.fn(**arguments)
+        # 同步工具（OCR、图像分析等阻塞调用）放到线程池执行，不阻塞事件循环
+        return await asyncio.to_thread(self.fn, **arguments)
+
+
+@dataclass
+class ToolCall:
+    call_id: str
+    name: str
+    arguments: dict
+
+    def cache_key(self):
+        return self.name, json.dumps(self.arguments, sort_keys=True, ensure_ascii=False)
+
+
+@dataclass
+class ToolSpan:
+    call_id: str
+    name: str
+    arguments: dict
+    status: str  # ok / error / timeout / cached / unknown_tool
+    latency_s: float
+    result: object = None
+
+
+@dataclass
+class StepTrace:
+    step: int
+    model_s: float = 0.0
+    tools_s: float = 0.0
+    spans: list = field(default_factory=list)
+
+    @property
+    def wall_s(self):
+        return self.model_s + self.tools_s
+
+
+@dataclass
+class AgentResult:
+    answer: str
+    messages: list
+    trace: list
+
+    def summary(self):
+        spans = [s for step in self.trace for s in step.spans]
+        return {
+            "steps": len(self.trace),
+            "tool_calls": len(spans),
+            "by_status": {status: sum(s.status == status for s in spans) for status in {s.status for s in spans}},
+            "model_s": round(sum(s.model_s for s in self.trace), 4),
+            "tools_s": round(sum(s.tools_s for s in self.trace), 4),
+            "tool_latency_sum_s": round(sum(s.latency_s for s in spans), 4),
+            "steps_detail": [
+                {"step": s.step, "model_ms": round(s.model_s * 1e3, 1), "tools_ms": round(s.tools_s * 1e3, 1),
+                 "calls": [(c.name, c.status, round(c.latency_s * 1e3, 1)) for c in s.spans]}
+                for s in self.trace
+            ],
+        }
+
+
+def parse_tool_calls(text, id_prefix="call"):
+    """解析模型输出中的全部工具调用，无法解析的 JSON 片段跳过"""
+    calls = []
+    counter = itertools.count()
+    for match in TOOL_CALL_PATTERN.finditer(text):
+        try:
+            payload = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(payload, dict) or "name" not in payload:
+            continue
+        arguments = payload.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except json.JSONDecodeError:
+                arguments = {"input": arguments}
+        calls.append(ToolCall(f"{id_prefix}-{next(counter)}", payload["name"], arguments))
+    return calls
+
+
+def strip_tool_calls(text):
+    return TOOL_CALL_PATTERN.sub("", text).strip()
+
+
+class AgentExecutor:
+    """
+    工具调用循环：模型输出 -> 解析工具调用 -> 并发执行 -> 结果作为 tool 消息追加 -> 再次调用模型，
+    直到模型不再调用工具或达到 max_steps。
+
+    - 同一轮输出中的多个工具调用视为相互独立，用 asyncio 并发执行；需要先后依赖的调用由模型分轮发出
+    - 每个工具有自己的超时（Tool.timeout_s），超时或异常以错误结果返回给模型，不中断整个循环
+    - 同一会话内参数相同的可缓存调用只执行一次（memo 在 run() 之间可复用，按会话传入）
+    - trace 记录每一步模型耗时、工具并发阶段耗时与每个调用的状态和延迟
+
+    model 需提供 generate(messages) -> str（同步或 async 均可）。
+    """
+
+    def __init__(self, model, tools, max_steps=8):
+        self.model = model
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_steps = max_steps
+
+    async def _generate(self, messages):
+        if inspect.iscoroutinefunction(self.model.generate):
+            return await self.model.generate(messages)
+        return await asyncio.to_thread(self.model.generate, messages)
+
+    async def _execute(self, call, memo):
+        start = time.perf_counter()
+        tool = self.tools.get(call.name)
+        if tool is None:
+            return ToolSpan(call.call_id, call.name, call.arguments, "unknown_tool", 0.0,
+                            {"error": f"unknown tool: {call.name}"})
+
+        key = call.cache_key()
+        if tool.cacheable and key in memo:
+            # 已完成或同一轮中正在执行的相同调用，共享同一个 Future；等待同样受工具超时约束
+            try:
+                result, status = await asyncio.wait_for(asyncio.shield(memo[key]), timeout=tool.timeout_s)
+            except asyncio.TimeoutError:
+                result, status = {"error": f"timeout after {tool.timeout_s}s"}, "timeout"
+            return ToolSpan(call.call_id, call.name, call.arguments,
+                            "cached" if status == "ok" else status, time.perf_counter() - start, result)
+
+        future = asyncio.get_running_loop().create_future()
+        if tool.cacheable:
+            memo[key] = future
+        # 调用方在执行中被取消（CancelledError 不是 Exception）时也要结束共享 Future 并移出 memo，
+        # 否则之后相同参数的调用会一直等待它
+        outcome = ({"error": "cancelled"}, "cancelled")
+        try:
+            result = await asyncio.wait_for(tool(**call.arguments), timeout=tool.timeout_s)
+            outcome = (result, "ok")
+        except asyncio.TimeoutError:
+            outcome = ({"error": f"timeout after {tool.timeout_s}s"}, "timeout")
+        except Exception as e:
+            outcome = ({"error": f"{type(e).__name__}: {e}"}, "error")
+        finally:
+            if not future.done():
+                future.set_result(outcome)
+            if outcome[1] != "ok" and memo.get(key) is future:
+                del memo[key]  # 失败的结果不缓存，下次允许重试
+        return ToolSpan(call.call_id, call.name, call.arguments, outcome[1], time.perf_counter() - start, outcome[0])
+
+    async def run(self, messages, memo=None):
+        """
+        :param messages: 对话消息列表（会被原地追加 assistant / tool 消息）
+        :param memo: 会话级调用缓存 {(name, args_json): Future}，同一会话多次 run() 传入同一个字典
+        """
+        memo = {} if memo is None else memo
+        trace = []
+        answer = ""
+        for step in range(1, self.max_steps + 1):
+            record = StepTrace(step)
+            trace.append(record)
+
+            start = time.perf_counter()
+            output = await self._generate(messages)
+            record.model_s = time.perf_counter() - start
+            messages.append({"role": "assistant", "content": output})
+
+            calls = parse_tool_calls(output, id_prefix=f"step{step}")
+            if not calls:
+                answer = strip_tool_calls(output)
+                break
+
+            start = time.perf_counter()
+            record.spans = await asyncio.gather(*(self._execute(call, memo) for call in calls))
+            record.tools_s = time.perf_counter() - start
+            for span in record.spans:
+                messages.append({
+                    "role": "tool",
+                    "name": span.name,
+                    "tool_call_id": span.call_id,
+                    "content": json.dumps(span.result, ensure_ascii=False, default=str),
+                })
+        return AgentResult(answer, messages, trace)
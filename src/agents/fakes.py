@@ -0,0 +1,59 @@
+import asyncio
+import json
+import time
+
+from src.agents.executor import Tool
+
+
+def tool_call(name, **arguments):
+    return f"<tool_call>{json.dumps({'name': name, 'arguments': arguments}, ensure_ascii=False)}</tool_call>"
+
+
+class ScriptedModel:
+    """
+    按脚本逐轮返回预先写好的输出，用于在没有真实模型时驱动 AgentExecutor。
+    script 中的元素可以是字符串，也可以是 callable(messages) -> str（用来根据工具结果作答）。
+    """
+
+    def __init__(self, script, latency_s=0.0):
+        self.script = list(script)
+        self.latency_s = latency_s
+        self.calls = 0
+
+    async def generate(self, messages):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        turn = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        return turn(messages) if callable(turn) else turn
+
+
+def make_fake_tools(latency_s=None, timeout_s=1.0):
+    """
+    假工具：rag_lookup / ocr / image_analysis，分别用 asyncio.sleep 或 time.sleep 模拟 IO 与阻塞调用。
+    latency_s 可按工具名覆盖默认延迟；每个工具的 calls 计数挂在函数属性上，便于检查缓存是否生效。
+    """
+    latency_s = {"rag_lookup": 0.05, "ocr": 0.08, "image_analysis": 0.1, **(latency_s or {})}
+
+    async def rag_lookup(query, k=3):
+        rag_lookup.calls += 1
+        await asyncio.sleep(latency_s["rag_lookup"])
+        return [f"[{i}] {query} 相关文献片段" for i in range(k)]
+
+    def ocr(image):
+        ocr.calls += 1
+        time.sleep(latency_s["ocr"])
+        return {"image": image, "text": "检查所见：双肺纹理增粗"}
+
+    async def image_analysis(image, question=""):
+        image_analysis.calls += 1
+        await asyncio.sleep(latency_s["image_analysis"])
+        return {"image": image, "finding": "未见明显实变影", "question": question}
+
+    for fn in (rag_lookup, ocr, image_analysis):
+        fn.calls = 0
+    return [
+        Tool("rag_lookup", rag_lookup, "检索医学知识库", timeout_s=timeout_s),
+        Tool("ocr", ocr, "识别图片中的文字", timeout_s=timeout_s),
+        Tool("image_analysis", image_analysis, "分析医学影像", timeout_s=timeout_s),
+    ]
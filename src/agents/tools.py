@@ -0,0 +1,21 @@
+from src.agents.executor import Tool
+
+
+def make_rag_tool(retriever, registry, k=5, timeout_s=5.0):
+    """
+    知识库检索工具：retriever 为 src.rag 中的 HybridRetriever 或 BM25Index（search(query, k) -> (scores, ids)），
+    registry 为 DocumentRegistry，按分片 rowid 取回原文。
+    """
+
+    def rag_lookup(query, top_k=k):
+        scores, ids = retriever.search(query, top_k)
+        ids = ids[0] if getattr(ids, "ndim", 1) == 2 else ids
+        scores = scores[0] if getattr(scores, "ndim", 1) == 2 else scores
+        results = []
+        for rowid, score in zip(ids, scores):
+            chunks = registry.get_chunks([rowid]) if int(rowid) >= 0 else []
+            if chunks:
+                results.append({"source": chunks[0].source, "text": chunks[0].text, "score": round(float(score), 4)})
+        return results
+
+    return Tool("rag_lookup", rag_lookup, "检索医学知识库，返回最相关的文本片段", timeout_s=timeout_s)
@@ -0,0 +1,62 @@
+"""
+Gradio 流式对话前端。
+
+    python -m src.front.app --backend fake                 # 假后端，调试界面与并发
+    python -m src.front.app --backend tiny                 # 随机初始化的小 GPT-2（CPU）
+"""
+import argparse
+
+from src.front.streaming import CachedChatBackend, FakeTokenBackend, QueueFullError, StreamingChatService
+
+
+def build_backend(name, max_new_tokens=128):
+    if name == "fake":
+        return FakeTokenBackend()
+    if name == "tiny":
+        from src.llm.backends import build_tiny_gpt2
+        from src.llm.kv_cache import CachedChat
+        from src.llm.prompts import load_system_prompts
+
+        chat = CachedChat(build_tiny_gpt2(n_positions=4096),
+                          system_prompt=load_system_prompts()["MEDICAL_ASSISTANT"])
+        return CachedChatBackend(chat, max_new_tokens=max_new_tokens)
+    raise ValueError(f"未知后端: {name}")
+
+
+def build_app(service, title="医学助手"):
+    import gradio as gr
+
+    async def respond(message, history, request: gr.Request):
+        session_id = request.session_hash if request is not None else "anonymous"
+        reply = ""
+        try:
+            async for piece in service.stream(session_id, message):
+                reply += piece
+                yield reply
+        except QueueFullError:
+            raise gr.Error("当前排队人数过多，请稍后再试")
+
+    with gr.Blocks(title=title) as demo:
+        gr.ChatInterface(fn=respond, title=title)
+        stats = gr.JSON(label="会话统计（首 token 延迟等）")
+        gr.Button("刷新统计").click(lambda: service.stats.summary(), outputs=stats)
+    # Gradio 自身的队列只做入口缓冲，真正的并发上限与排队上限由 service 控制
+    demo.queue(default_concurrency_limit=service.max_concurrent + service.max_queue)
+    return demo
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["fake", "tiny"], default="fake")
+    parser.add_argument("--max-concurrent", type=int, default=1)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    args = parser.parse_args()
+
+    service = StreamingChatService(build_backend(args.backend), args.max_concurrent, args.max_queue)
+    build_app(service).launch(server_name=args.host, server_port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import asyncio
+import collections
+import threading
+import time
+from abc import ABC, abstractmethod
+
+_DONE = object()
+
+
+class QueueFullError(RuntimeError):
+    """等待队列已满，请求被拒绝（前端提示稍后重试）"""
+
+
+class TokenStreamBackend(ABC):
+    """
+    流式生成后端：stream() 是在工作线程中运行的同步生成器，逐个产出文本增量。
+    每产出一个增量前应检查 cancel_event，被置位时尽快返回，释放模型。
+    """
+
+    @abstractmethod
+    def stream(self, session_id, message, cancel_event):
+        raise NotImplementedError
+
+
+class FakeTokenBackend(TokenStreamBackend):
+    """
+    假的 token 生成器：首 token 前等待 first_token_s，之后每 token_interval_s 产出一个词。
+    记录同时在生成的请求数峰值（用于验证并发上限）与未生成完就被停止的请求数。
+    """
+
+    def __init__(self, first_token_s=0.05, token_interval_s=0.01, max_tokens=32):
+        self.first_token_s = first_token_s
+        self.token_interval_s = token_interval_s
+        self.max_tokens = max_tokens
+        self.active = 0
+        self.peak_active = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+
+    def stream(self, session_id, message, cancel_event):
+        with self._lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        completed = False
+        try:
+            time.sleep(self.first_token_s)
+            words = f"关于「{message}」：这是会话 {session_id} 的模拟回复，".split() + ["token"] * self.max_tokens
+            for i, word in enumerate(words[:self.max_tokens]):
+                if cancel_event.is_set():
+                    return
+                if i:
+                    time.sleep(self.token_interval_s)
+                yield word + " "
+            completed = True
+        finally:
+            with self._lock:
+                self.active -= 1
+                if not completed:
+                    self.cancelled += 1
+
+
+class CachedChatBackend(TokenStreamBackend):
+    """把 src.llm.kv_cache.CachedChat 接到流式接口上（会话 KV 复用 + 逐 token 产出）"""
+
+    def __init__(self, chat, max_new_tokens=256):
+        self.chat = chat
+        self.max_new_tokens = max_new_tokens
+        self._lock = threading.Lock()
+
+    def stream(self, session_id, message, cancel_event):
+        # CachedChat 内的模型与会话状态不是线程安全的，同一时刻只让一个请求使用
+        with self._lock:
+            generator = self.chat.stream(session_id, message, max_new_tokens=self.max_new_tokens)
+            try:
+                for piece in generator:
+                    if cancel_event.is_set():
+                        return
+                    yield piece
+            finally:
+                generator.close()
+
+
+class SessionStats:
+    """按会话记录首 token 延迟（TTFT）、完成数、取消数、后端出错数与被拒绝数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ttft = {}
+        self.completed = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def record_ttft(self, session_id, seconds):
+        with self._lock:
+            self.ttft.setdefault(session_id, []).append(seconds)
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(s for values in self.ttft.values() for s in values)
+            per_session = {sid: round(sum(v) / len(v) * 1e3, 1) for sid, v in self.ttft.items()}
+            return {
+                "sessions": len(self.ttft),
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "ttft_p50_ms": round(samples[len(samples) // 2] * 1e3, 1) if samples else 0.0,
+                "ttft_p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e3, 1)
+                if samples else 0.0,
+                "ttft_ms_by_session": per_session,
+            }
+
+
+class StreamingChatService:
+    """
+    异步流式对话服务：
+    - stream() 是异步生成器，后端每产出一个增量就立即转发，不等 generate 结束
+    - 最多 max_concurrent 个请求同时占用模型，其余按到达顺序（FIFO）排队等待；等待数超过 max_queue 直接拒绝
+    - 消费方关闭生成器（客户端断开、Gradio 取消任务）时置位取消标志，后端线程在下一个 token 前退出，
+      模型槽位在后端线程真正结束后才释放，避免超订
+    """
+
+    def __init__(self, backend, max_concurrent=1, max_queue=16):
+        self.backend = backend
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.stats = SessionStats()
+        # 槽位在后端线程中释放，因此用线程锁保护；等待者是各自事件循环上的 Future，按 FIFO 逐个唤醒
+        self._free = max_concurrent
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    def _produce(self, session_id, message, cancel_event, loop, outbox):
+        try:
+            for piece in self.backend.stream(session_id, message, cancel_event):
+                loop.call_soon_threadsafe(outbox.put_nowait, piece)
+                if cancel_event.is_set():
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(outbox.put_nowait, e)
+        finally:
+            self._release_slot()
+            loop.call_soon_threadsafe(outbox.put_nowait, _DONE)
+
+    async def _acquire_slot(self):
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.stats.count("rejected")
+                raise QueueFullError(f"排队请求已达上限 {self.max_queue}")
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+        try:
+            await future
+        except BaseException:
+            # 等待中被取消：还在队列里就直接出队；已被分到槽位则转交给下一个等待者
+            with self._lock:
+                queued = future in self._waiters
+                if queued:
+                    self._waiters.remove(future)
+            if not queued and future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+
+    def _release_slot(self):
+        """可在任意线程调用：有等待者时把槽位直接交给队首，否则归还"""
+        with self._lock:
+            if not self._waiters:
+                self._free += 1
+                return
+            future = self._waiters.popleft()
+        future.get_loop().call_soon_threadsafe(self._grant, future)
+
+    def _grant(self, future):
+        # 在等待者的事件循环中执行；出队后、唤醒前它可能已被取消，此时继续往后交
+        if future.done():
+            self._release_slot()
+        else:
+            future.set_result(None)
+
+    async def stream(self, session_id, message):
+        start = time.perf_counter()
+        await self._acquire_slot()
+
+        loop = asyncio.get_running_loop()
+        outbox = asyncio.Queue()
+        cancel_event = threading.Event()
+        worker = threading.Thread(target=self._produce, args=(session_id, message, cancel_event, loop, outbox),
+                                  daemon=True)
+        worker.start()
+
+        first = True
+        finished = failed = False
+        try:
+            while True:
+                item = await outbox.get()
+                if item is _DONE:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    failed = True
+                    raise item
+                if first:
+                    self.stats.record_ttft(session_id, time.perf_counter() - start)
+                    first = False
+                yield item
+        finally:
+            if finished:
+                self.stats.count("completed")
+            elif failed:
+                cancel_event.set()
+                self.stats.count("errors")
+            else:
+                cancel_event.set()
+                self.stats.count("cancelled")
@@ -0,0 +1,185 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+import torch
+
+
+class InferenceBackend(ABC):
+    """
+    推理后端接口：把一批请求编码为左填充的张量、执行 generate、解码新生成的 token。
+    左填充保证每行的 prompt 都结束在同一列，引擎按 input_ids 的长度切掉 prompt，
+    不再依赖 response.split("assistant\\n") 这类字符串切分。
+    """
+
+    eos_token_id: int
+    pad_token_id: int
+
+    @abstractmethod
+    def encode(self, requests):
+        """返回 generate 所需的输入字典，至少包含 input_ids 与 attention_mask"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def generate(self, inputs, max_new_tokens):
+        """返回完整序列 (batch, prompt_len + new_len)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, token_ids):
+        raise NotImplementedError
+
+
+class ByteTokenizer:
+    """
+    UTF-8 字节级分词器：无需下载词表，供随机初始化的小模型在 CPU 上测试使用。
+    id 0-255 对应字节，256 为 eos，257 为 pad。
+    """
+
+    eos_token_id = 256
+    pad_token_id = 257
+    vocab_size = 258
+
+    def encode(self, text):
+        return list(text.encode("utf-8"))
+
+    def decode(self, token_ids):
+        return bytes(t for t in token_ids if t < 256).decode("utf-8", errors="ignore")
+
+    def pad_left(self, sequences):
+        width = max(len(s) for s in sequences)
+        input_ids = torch.full((len(sequences), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, seq in enumerate(sequences):
+            if seq:
+                input_ids[row, width - len(seq):] = torch.tensor(seq, dtype=torch.long)
+                attention_mask[row, width - len(seq):] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+class CausalLMBackend(InferenceBackend):
+    """纯文本因果语言模型后端（GPT-2 等），贪心解码"""
+
+    def __init__(self, model, tokenizer, device="cpu"):
+        self.model = model.to(device).eval()
+        self.tokenizer = tokenizer
+        self.device = device
+        self.eos_token_id = tokenizer.eos_token_id
+        self.pad_token_id = tokenizer.pad_token_id
+
+    def encode(self, requests):
+        prompts = [(r.system_prompt or "") + r.prompt for r in requests]
+        batch = self.tokenizer.pad_left([self.tokenizer.encode(p) for p in prompts])
+        return {k: v.to(self.device) for k, v in batch.items()}
+
+    @torch.inference_mode()
+    def generate(self, inputs, max_new_tokens):
+        return self.model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            eos_token_id=self.eos_token_id,
+            pad_token_id=self.pad_token_id,
+        )
+
+    def decode(self, token_ids):
+        return self.tokenizer.decode(token_ids)
+
+
+def build_tiny_gpt2(hidden_size=128, intermediate_size=256, num_hidden_layers=2, num_attention_heads=4,
+                    n_positions=1024, seed=1, device="cpu"):
+    """
+    随机初始化的小 GPT-2（超参数同 notebooks/rlhf/for_ppo.ipynb），配字节级分词器，
+    用于在 CPU 上测试与基准，不需要下载任何权重。
+    """
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(seed)
+    tokenizer = ByteTokenizer()
+    config = GPT2Config(
+        vocab_size=tokenizer.vocab_size,
+        n_embd=hidden_size,
+        n_inner=intermediate_size,
+        n_layer=num_hidden_layers,
+        n_head=num_attention_heads,
+        n_positions=n_positions,
+        bos_token_id=tokenizer.eos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    return CausalLMBackend(GPT2LMHeadModel(config), tokenizer, device=device)
+
+
+class Qwen3VLBackend(InferenceBackend):
+    """
+    Qwen3-VL 图文后端（与 notebooks/test_qwen3vl.ipynb 相同的加载方式）。
+    一批请求一起套聊天模板，processor 左填充后一次 generate。
+    传入 image_cache（src.llm.image_cache.ImageCache）时，图像预处理结果按内容哈希复用，
+    文本侧按缓存的 image_grid_thw 展开图像占位 token。
+    """
+
+    def __init__(self, model_path, device_map="auto", dtype="auto", image_cache=None):
+        from transformers import AutoProcessor, Qwen3VLForConditionalGeneration
+
+        from src.llm.image_cache import HFImagePreprocessor
+
+        self.processor = AutoProcessor.from_pretrained(model_path, trust_remote_code=True, use_fast=False)
+        self.processor.tokenizer.padding_side = "left"
+        self.model = Qwen3VLForConditionalGeneration.from_pretrained(model_path, dtype=dtype, device_map=device_map)
+        self.model.eval()
+        tokenizer = self.processor.tokenizer
+        self.eos_token_id = tokenizer.eos_token_id
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        self.image_cache = image_cache
+        self.preprocess = HFImagePreprocessor(self.processor.image_processor)
+
+    @staticmethod
+    def build_messages(request):
+        messages = []
+        if request.system_prompt:
+            messages.append({"role": "system", "content": [{"type": "text", "text": request.system_prompt}]})
+        content = [{"type": "image", "image": image} for image in request.images]
+        content.append({"type": "text", "text": request.prompt})
+        messages.append({"role": "user", "content": content})
+        return messages
+
+    def encode(self, requests):
+        from src.llm.image_cache import open_image
+
+        texts, images = [], []
+        for request in requests:
+            texts.append(self.processor.apply_chat_template(
+                self.build_messages(request), tokenize=False, add_generation_prompt=True))
+            images.extend(request.images)
+        if self.image_cache is not None and images:
+            return self._encode_cached(texts, images)
+        inputs = self.processor(text=texts, images=[open_image(i) for i in images] or None, padding=True,
+                                return_tensors="pt")
+        return inputs.to(self.model.device)
+
+    def _encode_cached(self, texts, images):
+        """图像走缓存；每个图像占位符展开为 grid_thw.prod() // merge_size² 个 token（同 processor）"""
+        features = [self.image_cache.get_or_compute(i, self.preprocess, namespace=self.preprocess.namespace)
+                    for i in images]
+        merge_length = self.processor.image_processor.merge_size ** 2
+        image_token = self.processor.image_token
+        counts = iter(int(f["image_grid_thw"][0].prod()) // merge_length for f in features)
+        expanded = []
+        for text in texts:
+            pieces = text.split(image_token)
+            expanded.append(pieces[0] + "".join(image_token * next(counts) + p for p in pieces[1:]))
+
+        inputs = self.processor.tokenizer(expanded, padding=True, return_tensors="pt")
+        if hasattr(self.processor, "create_mm_token_type_ids"):
+            inputs["mm_token_type_ids"] = torch.tensor(
+                self.processor.create_mm_token_type_ids(inputs["input_ids"].tolist()), dtype=torch.long)
+        inputs["pixel_values"] = torch.from_numpy(np.concatenate([f["pixel_values"] for f in features]))
+        inputs["image_grid_thw"] = torch.from_numpy(np.concatenate([f["image_grid_thw"] for f in features]))
+        return inputs.to(self.model.device)
+
+    @torch.inference_mode()
+    def generate(self, inputs, max_new_tokens):
+        return self.model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                   pad_token_id=self.pad_token_id)
+
+    def decode(self, token_ids):
+        return self.processor.tokenizer.decode(token_ids, skip_special_tokens=True).strip()
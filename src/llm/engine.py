@@ -0,0 +1,207 @@
+import itertools
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+_STOP = object()
+_request_ids = itertools.count()
+
+
+@dataclass
+class GenerationRequest:
+    prompt: str
+    images: list = field(default_factory=list)
+    max_new_tokens: int = 128
+    system_prompt: str = None
+    request_id: int = field(default_factory=lambda: next(_request_ids))
+
+
+@dataclass
+class GenerationResult:
+    request_id: int
+    text: str
+    token_ids: list
+    prompt_tokens: int
+    latency_s: float
+    batch_size: int
+
+    @property
+    def completion_tokens(self):
+        return len(self.token_ids)
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class BatchStats:
+    """按批大小统计：批数、生成 token 数、生成耗时，以及请求端到端延迟（含排队）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batches = defaultdict(int)
+        self._tokens = defaultdict(int)
+        self._busy_s = defaultdict(float)
+        self._latencies = defaultdict(list)
+
+    def record(self, batch_size, tokens, elapsed, latencies):
+        with self._lock:
+            self._batches[batch_size] += 1
+            self._tokens[batch_size] += tokens
+            self._busy_s[batch_size] += elapsed
+            self._latencies[batch_size].extend(latencies)
+
+    def summary(self):
+        with self._lock:
+            return {
+                size: {
+                    "batches": self._batches[size],
+                    "tokens": self._tokens[size],
+                    "tokens_per_s": round(self._tokens[size] / self._busy_s[size], 1) if self._busy_s[size] else 0.0,
+                    "p50_ms": round(percentile(self._latencies[size], 0.50) * 1e3, 1),
+                    "p99_ms": round(percentile(self._latencies[size], 0.99) * 1e3, 1),
+                }
+                for size in sorted(self._batches)
+            }
+
+    def report(self, title="推理引擎"):
+        print(f"📊 {title}")
+        for size, s in self.summary().items():
+            print(f"   batch={size:<3} 批数 {s['batches']:<5} token {s['tokens']:<7} "
+                  f"{s['tokens_per_s']} tok/s  p50 {s['p50_ms']}ms  p99 {s['p99_ms']}ms")
+
+
+class InferenceEngine:
+    """
+    动态批处理推理引擎：请求进入队列，后台线程取到第一个请求后最多再等 max_wait_ms，
+    凑满 max_batch_size 个就一起左填充、一次 generate。
+    生成结果按 prompt 长度（input_ids 列数）切片，遇到 eos 截断。
+
+    用法：
+        with InferenceEngine(build_tiny_gpt2(), max_batch_size=8) as engine:
+            future = engine.submit(GenerationRequest("你好", max_new_tokens=16))
+            print(future.result().text)
+    """
+
+    def __init__(self, backend, max_batch_size=8, max_wait_ms=5.0):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.stats = BatchStats()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        """停止信号之前入队的请求照常处理完；之后仍留在队列里的请求以 RuntimeError 结束，不会一直挂起"""
+        if self._worker is not None:
+            self._queue.put(_STOP)
+            self._worker.join()
+            self._worker = None
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP and item[1].set_running_or_notify_cancel():
+                    item[1].set_exception(RuntimeError("推理引擎已停止"))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit(self, request):
+        future = Future()
+        self._queue.put((request, future, time.perf_counter()))
+        return future
+
+    def generate(self, prompts, max_new_tokens=128, **kwargs):
+        """便捷接口：提交一组 prompt 并按顺序返回文本"""
+        futures = [self.submit(GenerationRequest(p, max_new_tokens=max_new_tokens, **kwargs)) for p in prompts]
+        return [f.result().text for f in futures]
+
+    def _collect(self):
+        """
+        阻塞取一个请求，再在截止时间内尽量凑满一批；收到停止信号时返回 (batch, True)。
+        取出时把 future 置为运行中，调用方已取消的请求直接丢弃（之后 cancel() 不再生效，结果总能写回）。
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.max_batch_size:
+            if deadline is None:
+                item = self._queue.get()
+            else:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                return batch, True
+            if not item[1].set_running_or_notify_cancel():
+                continue
+            batch.append(item)
+            if deadline is None:
+                deadline = time.perf_counter() + self.max_wait_s
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch):
+        requests = [request for request, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            inputs = self.backend.encode(requests)
+            max_new_tokens = max(r.max_new_tokens for r in requests)
+            output = self.backend.generate(inputs, max_new_tokens)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        prompt_len = inputs["input_ids"].shape[1]
+        prompt_tokens = inputs["attention_mask"].sum(dim=1).tolist()
+        new_tokens = output[:, prompt_len:].tolist()
+        finished = time.perf_counter()
+
+        results = []
+        for row, (request, future, enqueued) in enumerate(batch):
+            token_ids = new_tokens[row][:request.max_new_tokens]
+            if self.backend.eos_token_id in token_ids:
+                token_ids = token_ids[:token_ids.index(self.backend.eos_token_id)]
+            try:
+                text = self.backend.decode(token_ids)
+            except Exception as e:  # 单条解码失败只影响该请求
+                future.set_exception(e)
+                continue
+            results.append((future, GenerationResult(
+                request_id=request.request_id,
+                text=text,
+                token_ids=token_ids,
+                prompt_tokens=int(prompt_tokens[row]),
+                latency_s=finished - enqueued,
+                batch_size=len(batch),
+            )))
+
+        self.stats.record(len(batch), sum(r.completion_tokens for _, r in results), finished - start,
+                          [r.latency_s for _, r in results])
+        for future, result in results:
+            future.set_result(result)
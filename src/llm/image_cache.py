@@ -0,0 +1,204 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def image_digest(image):
+    """图片内容哈希：路径/字节按文件字节计算，PIL 图片按像素、尺寸与模式计算"""
+    h = hashlib.sha256()
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+    elif isinstance(image, (bytes, bytearray, memoryview)):
+        h.update(image)
+    else:
+        h.update(f"{image.mode}:{image.size}".encode())
+        h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def open_image(image):
+    from PIL import Image
+
+    if isinstance(image, (str, os.PathLike)):
+        return Image.open(image)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(image))
+    return image
+
+
+def _nbytes(arrays):
+    return sum(a.nbytes for a in arrays.values())
+
+
+class HFImagePreprocessor:
+    """
+    包装 transformers 图像处理器（如 Qwen3-VL processor.image_processor），单张图片 -> numpy 数组字典。
+    namespace 由处理器类名与影响输出的参数组成，参数变化后旧缓存自然失效。
+    """
+
+    SIGNATURE_KEYS = ("patch_size", "merge_size", "temporal_patch_size", "min_pixels", "max_pixels",
+                      "image_mean", "image_std", "size")
+
+    def __init__(self, image_processor):
+        self.image_processor = image_processor
+        params = {k: getattr(image_processor, k, None) for k in self.SIGNATURE_KEYS}
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:12]
+        self.namespace = f"{type(image_processor).__name__}-{digest}"
+
+    def __call__(self, image):
+        outputs = self.image_processor(images=[image.convert("RGB")], return_tensors="np")
+        return {k: np.asarray(v) for k, v in outputs.items()}
+
+
+class ImageCache:
+    """
+    按内容哈希缓存图像预处理结果（pixel_values 等），也可缓存视觉编码器输出。
+    - 内存层：OrderedDict LRU，按字节预算淘汰
+    - 磁盘层（可选）：cache_dir/objects/xx/<key>.npz，按修改时间 LRU 淘汰，命中时刷新修改时间
+    同一张图片换一个问题再问时，跳过解码、缩放与切 patch；跨请求、跨会话共享。
+
+    用法：
+        cache = ImageCache("results/cache/images")
+        preprocess = HFImagePreprocessor(processor.image_processor)
+        arrays = cache.get_or_compute("data/test/1.png", preprocess, namespace=preprocess.namespace)
+    """
+
+    def __init__(self, cache_dir=None, memory_bytes=512 * 1024 ** 2, disk_bytes=4 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                         "memory_evictions": 0, "disk_evictions": 0}
+        self.timings = {"compute_s": 0.0, "disk_load_s": 0.0}
+        if cache_dir:
+            os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+            self._disk_used = sum(size for _, size, _ in self._disk_files())
+
+    def key(self, image, namespace):
+        return hashlib.sha256(f"{namespace}:{image_digest(image)}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "objects", key[:2], f"{key}.npz")
+
+    def _disk_files(self):
+        root = os.path.join(self.cache_dir, "objects")
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if name.endswith(".npz"):
+                    path = os.path.join(dirpath, name)
+                    stat = os.stat(path)
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _remember(self, key, arrays):
+        size = _nbytes(arrays)
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= _nbytes(old)
+            self._memory[key] = arrays
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= _nbytes(evicted)
+                self.counters["memory_evictions"] += 1
+
+    def _load_disk(self, key):
+        path = self._path(key)
+        start = time.perf_counter()
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        os.utime(path)
+        self.timings["disk_load_s"] += time.perf_counter() - start
+        return arrays
+
+    def _store_disk(self, key, arrays):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_used += os.path.getsize(path)
+            over = self._disk_used > self.disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        with self._lock:
+            for path, size, _ in files:
+                if self._disk_used <= self.disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self._disk_used -= size
+                self.counters["disk_evictions"] += 1
+
+    def get_or_compute(self, image, compute, namespace="pixels"):
+        """
+        :param image: 图片路径、字节或 PIL 图片
+        :param compute: 未命中时调用 compute(PIL 图片)，返回 {name: numpy 数组}
+        :param namespace: 区分不同预处理配置 / 视觉编码器的结果
+        """
+        key = self.key(image, namespace)
+        with self._lock:
+            arrays = self._memory.get(key)
+            if arrays is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return arrays
+
+        if self.cache_dir:
+            arrays = self._load_disk(key)
+            if arrays is not None:
+                with self._lock:
+                    self.counters["disk_hits"] += 1
+                self._remember(key, arrays)
+                return arrays
+
+        start = time.perf_counter()
+        arrays = {name: np.ascontiguousarray(value) for name, value in compute(open_image(image)).items()}
+        with self._lock:
+            self.counters["misses"] += 1
+            self.timings["compute_s"] += time.perf_counter() - start
+        self._remember(key, arrays)
+        if self.cache_dir:
+            self._store_disk(key, arrays)
+        return arrays
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_mb": round(self._memory_used / 1024 ** 2, 2),
+                "disk_mb": round(self._disk_used / 1024 ** 2, 2),
+                **{k: round(v, 4) for k, v in self.timings.items()},
+            }
+
+    def report(self, title="图像预处理缓存"):
+        s = self.stats()
+        print(f"🖼️ {title}：命中率 {s['hit_rate']:.1%}（内存 {s['memory_hits']}，磁盘 {s['disk_hits']}，"
+              f"未命中 {s['misses']}），内存 {s['memory_mb']}MB，磁盘 {s['disk_mb']}MB")
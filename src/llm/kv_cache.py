@@ -0,0 +1,201 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import torch
+
+
+def cache_nbytes(past_key_values):
+    """估算 DynamicCache 占用的字节数（各层 key/value 张量之和）"""
+    total = 0
+    for layer in past_key_values.layers:
+        for tensor in (layer.keys, layer.values):
+            if tensor is not None:
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+@dataclass
+class CacheEntry:
+    token_ids: tuple
+    past_key_values: object
+    nbytes: int
+
+
+class PrefixKVCache:
+    """
+    按内存预算做 LRU 淘汰的 KV 缓存，条目为 (token 序列, past_key_values)。
+    - 共享前缀（系统提示词）用 match() 做最长前缀匹配，返回副本，缓存中的条目不被修改
+    - 会话状态用 take()/put() 转移所有权：取出后直接在原张量上续写，避免复制整段历史
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key, token_ids, past_key_values):
+        entry = CacheEntry(tuple(token_ids), past_key_values, cache_nbytes(past_key_values))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            if entry.nbytes > self.max_bytes:
+                return False
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+        return True
+
+    def discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry.nbytes
+
+    def take(self, key):
+        """取出并移除条目（调用方获得所有权），未命中返回 None"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.nbytes -= entry.nbytes
+            self.hits += 1
+            return entry
+
+    def match(self, token_ids, prefix="prefix"):
+        """在键以 prefix 开头的条目中找 token 序列最长的前缀，返回其副本"""
+        token_ids = tuple(token_ids)
+        with self._lock:
+            best_key, best = None, None
+            for key, entry in self._entries.items():
+                if not (isinstance(key, tuple) and key[0] == prefix):
+                    continue
+                n = len(entry.token_ids)
+                if n <= len(token_ids) and (best is None or n > len(best.token_ids)) \
+                        and token_ids[:n] == entry.token_ids:
+                    best_key, best = key, entry
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return CacheEntry(best.token_ids, copy.deepcopy(best.past_key_values), best.nbytes)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "mb": round(self.nbytes / 1024 ** 2, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class CachedChat:
+    """
+    带前缀/会话 KV 复用的多轮对话（贪心解码）。
+    每轮只对新增的 token 做 prefill：会话命中时续写上轮的 KV；新会话复用系统提示词的 KV。
+    所以首 token 延迟只随本轮输入增长，而不是随整段对话增长。
+    backend 需提供 model、tokenizer（encode/decode）与 eos_token_id，如 build_tiny_gpt2()。
+    """
+
+    def __init__(self, backend, cache=None, system_prompt="", user_prefix="\n用户：", assistant_prefix="\n助手："):
+        self.backend = backend
+        self.model = backend.model
+        self.tokenizer = backend.tokenizer
+        self.cache = cache if cache is not None else PrefixKVCache()
+        self.system_ids = self.tokenizer.encode(system_prompt)
+        self.user_prefix = user_prefix
+        self.assistant_prefix = assistant_prefix
+        self._sessions = {}
+
+    @torch.inference_mode()
+    def _prefill(self, token_ids, past_key_values=None):
+        input_ids = torch.tensor([token_ids], dtype=torch.long, device=self.model.device)
+        out = self.model(input_ids=input_ids, past_key_values=past_key_values, use_cache=True)
+        return out.logits[0, -1], out.past_key_values
+
+    def _system_entry(self):
+        """取系统提示词的 KV 副本；不在缓存中时先算好放回去"""
+        entry = self.cache.match(self.system_ids)
+        if entry is None and self.system_ids:
+            _, past = self._prefill(self.system_ids)
+            self.cache.put(("prefix", hash(tuple(self.system_ids))), self.system_ids, copy.deepcopy(past))
+            entry = CacheEntry(tuple(self.system_ids), past, 0)
+        return entry
+
+    def history_ids(self, session_id):
+        return list(self._sessions.get(session_id, self.system_ids))
+
+    def stream(self, session_id, text, max_new_tokens=64, use_cache=True, stats=None):
+        """
+        进行一轮对话，逐 token 产出新增的回复文本。
+        调用方提前关闭生成器（如客户端断开）时，已生成的部分照常写入会话历史与缓存。
+        stats 字典（可选）中填入 ttft_s（首 token 延迟）、prefill_tokens（本轮实际 prefill 的 token 数）、
+        reused_tokens 与 completion_tokens。
+        """
+        stats = stats if stats is not None else {}
+        start = time.perf_counter()
+        token_ids = self.history_ids(session_id) + self.tokenizer.encode(
+            self.user_prefix + text + self.assistant_prefix)
+
+        entry = None
+        if use_cache:
+            entry = self.cache.take(("session", session_id)) or self._system_entry()
+            if entry is not None and tuple(token_ids[:len(entry.token_ids)]) != entry.token_ids:
+                entry = None
+        reused = len(entry.token_ids) if entry is not None else 0
+        past = entry.past_key_values if entry is not None else None
+
+        logits, past = self._prefill(token_ids[reused:], past)
+        next_id = int(logits.argmax())
+        stats.update(ttft_s=time.perf_counter() - start, prompt_tokens=len(token_ids),
+                     prefill_tokens=len(token_ids) - reused, reused_tokens=reused)
+
+        generated = []
+        cached_ids = list(token_ids)  # 与 past 中实际包含的 token 保持一致
+        emitted = ""
+        try:
+            while next_id != self.backend.eos_token_id and len(generated) < max_new_tokens:
+                generated.append(next_id)
+                # 字节级分词时单个 token 可能是半个汉字，按累计解码结果产出增量
+                decoded = self.tokenizer.decode(generated)
+                if len(decoded) > len(emitted):
+                    yield decoded[len(emitted):]
+                    emitted = decoded
+                if len(generated) == max_new_tokens:
+                    break
+                logits, past = self._prefill([next_id], past)
+                cached_ids.append(next_id)
+                next_id = int(logits.argmax())
+        finally:
+            self._sessions[session_id] = token_ids + generated
+            if use_cache:
+                self.cache.put(("session", session_id), cached_ids, past)
+            stats.update(total_s=time.perf_counter() - start, completion_tokens=len(generated))
+
+    def chat(self, session_id, text, max_new_tokens=64, use_cache=True):
+        """进行一轮对话，返回 (回复文本, 统计)，统计字段见 stream()"""
+        stats = {}
+        reply = "".join(self.stream(session_id, text, max_new_tokens, use_cache, stats))
+        return reply, stats
+
+    def end_session(self, session_id):
+        self._sessions.pop(session_id, None)
+        self.cache.discard(("session", session_id))
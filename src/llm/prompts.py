@@ -0,0 +1,13 @@
+import os
+import re
+
+SYSTEM_PROMPTS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "prompts", "system_prompts.txt")
+SECTION_PATTERN = re.compile(r"^\[([A-Z0-9_]+)\]\s*$", re.MULTILINE)
+
+
+def load_system_prompts(path=SYSTEM_PROMPTS_PATH):
+    """解析 system_prompts.txt：每段以 [NAME] 开头，返回 {NAME: prompt}"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    parts = SECTION_PATTERN.split(text)
+    return {name: body.strip() for name, body in zip(parts[1::2], parts[2::2])}
@@ -0,0 +1,167 @@
+import json
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# 中文（CJK 统一表意文字及扩展 A）与日文假名的连续串按字符 n-gram 切分；
+# 拉丁字母与数字按词切分，保留小数点，便于精确匹配药名、检验值（如 "5.6"、"mmol"）
+TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\u3040-\u30ff]+|[a-z0-9]+(?:\.[0-9]+)?")
+CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\u3040-\u30ff]")
+
+
+def tokenize(text, ngram=2):
+    """
+    CJK 感知分词：中文连续串切成重叠的字符 n-gram（长度不足 n 时保留整串），
+    其余按字母数字词切分并转小写。
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        piece = match.group()
+        if CJK_PATTERN.match(piece):
+            if len(piece) <= ngram:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + ngram] for i in range(len(piece) - ngram + 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+
+class BM25Builder:
+    """
+    收集文档并写出磁盘倒排索引。
+    倒排表按词连续存放：doc 序号 (uint32) + 预先计算好的 BM25 词项权重 (float16)，
+    查询时只需 idf × 权重 累加，每条倒排记录 6 字节。
+    """
+
+    def __init__(self, k1=1.2, b=0.75, ngram=2):
+        self.k1 = k1
+        self.b = b
+        self.ngram = ngram
+        self.vocab = {}
+        self._terms = array("I")
+        self._docs = array("I")
+        self._tfs = array("H")
+        self._doc_lens = array("I")
+        self._ids = array("q")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, doc_id, text):
+        doc_idx = len(self._ids)
+        self._ids.append(doc_id)
+        counts = Counter(tokenize(text, self.ngram))
+        self._doc_lens.append(sum(counts.values()))
+        vocab = self.vocab
+        for term, tf in counts.items():
+            term_id = vocab.get(term)
+            if term_id is None:
+                term_id = vocab[term] = len(vocab)
+            self._terms.append(term_id)
+            self._docs.append(doc_idx)
+            self._tfs.append(min(tf, 65535))
+
+    def build(self, path):
+        os.makedirs(path, exist_ok=True)
+        terms = np.frombuffer(self._terms, dtype=np.uint32)
+        docs = np.frombuffer(self._docs, dtype=np.uint32)
+        tfs = np.frombuffer(self._tfs, dtype=np.uint16).astype(np.float32)
+        doc_lens = np.frombuffer(self._doc_lens, dtype=np.uint32)
+        avgdl = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+        # 词项权重 tf·(k1+1) / (tf + k1·(1 - b + b·dl/avgdl))，与查询无关，建索引时算好
+        norm = self.k1 * (1 - self.b + self.b * doc_lens[docs] / max(avgdl, 1e-9))
+        impacts = (tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float16)
+
+        order = np.argsort(terms, kind="stable")
+        df = np.bincount(terms, minlength=len(self.vocab)).astype(np.int64)
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(df)
+        n_docs = len(self._ids)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        np.save(os.path.join(path, "postings_docs.npy"), docs[order])
+        np.save(os.path.join(path, "postings_impacts.npy"), impacts[order])
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "idf.npy"), idf)
+        np.save(os.path.join(path, "ids.npy"), np.frombuffer(self._ids, dtype=np.int64))
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"n_docs": n_docs, "avgdl": avgdl, "k1": self.k1, "b": self.b, "ngram": self.ngram,
+                       "postings": int(len(docs))}, f)
+        return BM25Index(path)
+
+
+def dense_topk(scores, k, block=1024):
+    """
+    稠密分数数组上的 top-k：先按块取最大值，第 k 大的块最大值是第 k 大分数的下界，
+    只在不低于该下界的少量位置上做 argpartition，避免对整个数组分区。
+    返回 top-k 下标（分数降序，只含分数 > 0 的位置）。
+    """
+    n_blocks = len(scores) // block
+    if n_blocks > k:
+        block_max = scores[:n_blocks * block].reshape(n_blocks, block).max(axis=1)
+        threshold = np.partition(block_max, n_blocks - k)[n_blocks - k]
+        candidates = np.flatnonzero(scores >= max(threshold, np.finfo(scores.dtype).tiny))
+    else:
+        candidates = np.flatnonzero(scores > 0)
+    if len(candidates) == 0:
+        return candidates
+    cand_scores = scores[candidates]
+    k = min(k, len(candidates))
+    top = np.argpartition(-cand_scores, k - 1)[:k]
+    return candidates[top[np.argsort(-cand_scores[top], kind="stable")]]
+
+
+class BM25Index:
+    """内存映射的 BM25 倒排索引，search 返回 (scores, ids)"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        self.ngram = self.meta["ngram"]
+        self.docs = np.load(os.path.join(path, "postings_docs.npy"), mmap_mode="r")
+        self.impacts = np.load(os.path.join(path, "postings_impacts.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.idf = np.load(os.path.join(path, "idf.npy"))
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return self.meta["n_docs"]
+
+    def search(self, query, k=10):
+        """
+        词项级累加：把各查询词的倒排记录拼接后一次 bincount 求和。
+        命中记录较少时在命中文档上稀疏累加；较多时（常见 bigram）直接累加到稠密数组，
+        再用分块下界筛选求 top-k。
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query, self.ngram) if t in self.vocab}
+        doc_parts, weight_parts = [], []
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            doc_parts.append(self.docs[start:end])
+            weight_parts.append(self.impacts[start:end].astype(np.float32) * self.idf[term_id])
+        if not doc_parts:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        docs = np.concatenate(doc_parts)
+        weights = np.concatenate(weight_parts)
+        n_docs = len(self)
+        if len(docs) * 16 < n_docs:
+            unique_docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+            k = min(k, len(unique_docs))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            doc_idx = unique_docs[top]
+        else:
+            scores = np.bincount(docs, weights=weights, minlength=n_docs)
+            top = doc_idx = dense_topk(scores, k)
+        return scores[top].astype(np.float32), np.asarray(self.ids[doc_idx])
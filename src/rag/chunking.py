@@ -0,0 +1,115 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field
+
+# 句末标点（中英文）与换行作为切分边界，分隔符保留在前一句末尾
+SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？；.!?;\n])")
+
+
+@dataclass
+class Chunk:
+    """检索的最小单元"""
+
+    chunk_id: str
+    text: str
+    source: str
+    metadata: dict = field(default_factory=dict)
+
+
+def split_sentences(text):
+    return [s for s in SENTENCE_BOUNDARY.split(text) if s.strip()]
+
+
+def chunk_text(text, max_chars=400, overlap=1):
+    """
+    按句子贪心拼接成不超过 max_chars 的片段；超长句子按字符硬切。
+    overlap 为相邻片段之间重叠的句子数，避免答案恰好落在边界上。
+    """
+    sentences = []
+    for sentence in split_sentences(text):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            sentences.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            sentences.append(sentence)
+
+    chunks = []
+    current = []
+    length = 0
+    for sentence in sentences:
+        if current and length + len(sentence) > max_chars:
+            chunks.append("".join(current))
+            current = current[-overlap:] if overlap else []
+            length = sum(len(s) for s in current)
+            # 重叠部分加上新句子仍超长时放弃重叠
+            if length + len(sentence) > max_chars:
+                current, length = [], 0
+        current.append(sentence)
+        length += len(sentence)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def chunk_context_file(path, max_chars=400, overlap=1):
+    """
+    切分 extract_contexts.py 写出的原文文本：各区域以空行分隔，先按区域再按句子切分。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return chunk_context_text(text, os.path.splitext(os.path.basename(path))[0], max_chars, overlap)
+
+
+def chunk_context_text(text, source, max_chars=400, overlap=1):
+    chunks = []
+    for region_idx, region in enumerate(r for r in text.split("\n\n") if r.strip()):
+        for piece_idx, piece in enumerate(chunk_text(region, max_chars, overlap)):
+            chunks.append(Chunk(
+                chunk_id=f"{source}#{region_idx}-{piece_idx}",
+                text=piece,
+                source=source,
+                metadata={"type": "context", "region": region_idx},
+            ))
+    return chunks
+
+
+def chunk_context_dir(text_dir, max_chars=400, overlap=1):
+    chunks = []
+    for name in sorted(os.listdir(text_dir)):
+        if name.endswith(".txt"):
+            chunks.extend(chunk_context_file(os.path.join(text_dir, name), max_chars, overlap))
+    return chunks
+
+
+def chunk_captions(records, max_chars=400, overlap=1, id_key="id", caption_key="caption"):
+    """
+    切分 MedTrinity 样本的 caption。records 可以是数据集行（含 id / caption），
+    也可以是 mllm_data 格式的对话样本（取 assistant 回复作为文本、图片路径作为来源）。
+    """
+    for row_idx, record in enumerate(records):
+        if "messages" in record:
+            text = next((m["content"] for m in record["messages"] if m["role"] == "assistant"), "")
+            source = record["images"][0] if record.get("images") else str(row_idx)
+        else:
+            text = record[caption_key]
+            source = str(record[id_key])
+        for piece_idx, piece in enumerate(chunk_text(text, max_chars, overlap)):
+            yield Chunk(
+                chunk_id=f"{source}#{piece_idx}",
+                text=piece,
+                source=source,
+                metadata={"type": "caption"},
+            )
+
+
+def save_chunks(chunks, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk.__dict__, ensure_ascii=False) + "\n")
+
+
+def load_chunks(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [Chunk(**json.loads(line)) for line in f if line.strip()]
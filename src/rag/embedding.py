@@ -0,0 +1,74 @@
+import hashlib
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class EmbeddingBackend(ABC):
+    """向量化后端接口：输入文本列表，输出 L2 归一化的 float32 矩阵 (n, dim)"""
+
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+def l2_normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder(EmbeddingBackend):
+    """
+    确定性的 CPU 哈希向量化：字符 n-gram 特征哈希到固定维度（带符号），无需模型权重。
+    对中文按字符 n-gram 天然可用；结果跨进程稳定，适合测试与基准。
+    """
+
+    def __init__(self, dim=256, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self._cache = {}
+
+    def _bucket(self, gram):
+        hit = self._cache.get(gram)
+        if hit is None:
+            digest = hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            hit = (value % self.dim, 1.0 if (value >> 63) & 1 else -1.0)
+            if len(self._cache) < 1_000_000:
+                self._cache[gram] = hit
+        return hit
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        lo, hi = self.ngram_range
+        for row, text in enumerate(texts):
+            text = text.lower()
+            for n in range(lo, hi + 1):
+                for i in range(len(text) - n + 1):
+                    gram = text[i:i + n]
+                    if gram.isspace():
+                        continue
+                    bucket, sign = self._bucket(gram)
+                    out[row, bucket] += sign
+        return l2_normalize(out)
+
+
+class SentenceTransformerEmbedder(EmbeddingBackend):
+    """sentence-transformers 模型后端（可选依赖，首次使用时才导入）"""
+
+    def __init__(self, model_name_or_path, device=None, batch_size=64):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name_or_path, device=device)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True)
+        return l2_normalize(vectors.astype(np.float32, copy=False))
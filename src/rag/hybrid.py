@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def reciprocal_rank_fusion(rankings, k=60, weights=None, limit=None):
+    """
+    倒数排名融合（RRF）：score(d) = Σ w_i / (k + rank_i(d))，rank 从 1 开始。
+    只依赖名次，不需要把 BM25 分数与余弦相似度归一到同一量纲。
+    :param rankings: 多路检索结果，每路为按相关度降序的 id 序列
+    :return: [(id, score)]，按融合分数降序
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            doc_id = int(doc_id)
+            if doc_id < 0:
+                continue
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ordered[:limit] if limit else ordered
+
+
+class HybridRetriever:
+    """
+    BM25 + 向量检索的混合召回：两路各取 candidates 个结果，再用 RRF 融合取前 k。
+    BM25 负责药名、检验值等精确词项，向量检索负责语义相近的表述。
+    """
+
+    def __init__(self, bm25_index, vector_index, embedder, candidates=50, rrf_k=60,
+                 bm25_weight=1.0, vector_weight=1.0, **vector_search_kwargs):
+        self.bm25_index = bm25_index
+        self.vector_index = vector_index
+        self.embedder = embedder
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.weights = [bm25_weight, vector_weight]
+        self.vector_search_kwargs = vector_search_kwargs
+
+    def search(self, query, k=10):
+        _, bm25_ids = self.bm25_index.search(query, self.candidates)
+        query_vector = self.embedder.embed([query])
+        _, vector_ids = self.vector_index.search(query_vector, self.candidates, **self.vector_search_kwargs)
+        fused = reciprocal_rank_fusion([bm25_ids, vector_ids[0]], k=self.rrf_k, weights=self.weights, limit=k)
+        ids = np.array([doc_id for doc_id, _ in fused], dtype=np.int64)
+        scores = np.array([score for _, score in fused], dtype=np.float32)
+        return scores, ids
@@ -0,0 +1,193 @@
+import json
+import os
+
+import numpy as np
+
+
+def _as_queries(queries):
+    queries = np.asarray(queries, dtype=np.float32)
+    return queries[None, :] if queries.ndim == 1 else queries
+
+
+def _topk(scores, k):
+    """按行取分数最高的 k 个下标（降序），使用 argpartition 避免全排序"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class BruteForceIndex:
+    """
+    精确检索：float32 矩阵内积（向量已归一化，即余弦相似度）。
+    作为召回率基准，也适合十万级以下的小语料。
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty((0,), dtype=np.int64)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, vectors, ids=None):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if ids is None:
+            ids = np.arange(len(self._ids), len(self._ids) + len(vectors), dtype=np.int64)
+        self._vectors = np.concatenate([self._vectors, vectors])
+        self._ids = np.concatenate([self._ids, np.asarray(ids, dtype=np.int64)])
+
+    @property
+    def ids(self):
+        return self._ids
+
+    def remove(self, ids):
+        """删除给定 id 的向量，返回删除的数量"""
+        keep = ~np.isin(self._ids, np.asarray(ids, dtype=np.int64))
+        removed = len(keep) - int(keep.sum())
+        if removed:
+            self._vectors = self._vectors[keep]
+            self._ids = self._ids[keep]
+        return removed
+
+    def search(self, queries, k=10):
+        """返回 (scores, ids)，形状均为 (查询数, k)"""
+        queries = _as_queries(queries)
+        scores = queries @ self._vectors.T
+        top = _topk(scores, k)
+        return np.take_along_axis(scores, top, axis=1), self._ids[top]
+
+    def save(self, path):
+        np.savez(path, vectors=self._vectors, ids=self._ids)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls(data["vectors"].shape[1])
+        index._vectors = data["vectors"]
+        index._ids = data["ids"]
+        return index
+
+
+def spherical_kmeans(vectors, nlist, iters=20, seed=0):
+    """余弦距离下的 k-means，返回归一化的聚类中心 (nlist, dim)"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """
+    倒排文件（IVF）近似检索，向量以 float16 或 int8 存放在内存映射文件中。
+
+    目录结构：
+    - meta.json        维度、聚类数、存储类型、向量数
+    - centroids.npy    聚类中心 (nlist, dim) float32
+    - offsets.npy      每个倒排列表在向量文件中的起止位置 (nlist + 1,)
+    - ids.npy          按倒排列表重排后的外部 id
+    - vectors.bin      按倒排列表连续存放的向量（float16 / int8）
+    - scales.npy       int8 存储时每个向量的反量化系数
+    查询时只扫描 nprobe 个最近聚类对应的连续区间，页面按需由操作系统换入。
+    """
+
+    DTYPES = {"float16": np.float16, "int8": np.int8}
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.dim = self.meta["dim"]
+        self.dtype = self.meta["dtype"]
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.vectors = np.memmap(os.path.join(path, "vectors.bin"), dtype=self.DTYPES[self.dtype], mode="r",
+                                 shape=(self.meta["count"], self.dim))
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if self.dtype == "int8" else None
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @classmethod
+    def build(cls, path, vectors, ids=None, nlist=None, dtype="float16", train_size=100_000, iters=20,
+              seed=0, batch_size=65536):
+        """训练聚类中心、分配倒排列表并写出内存映射文件，返回加载好的索引"""
+        if dtype not in cls.DTYPES:
+            raise ValueError(f"不支持的存储类型: {dtype}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        count, dim = vectors.shape
+        ids = np.arange(count, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        nlist = nlist or max(1, int(4 * np.sqrt(count)))
+        os.makedirs(path, exist_ok=True)
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(count, min(count, train_size), replace=False)]
+        centroids = spherical_kmeans(sample, min(nlist, len(sample)), iters=iters, seed=seed)
+        nlist = len(centroids)
+
+        assign = np.empty(count, dtype=np.int64)
+        for start in range(0, count, batch_size):
+            assign[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+
+        store = np.memmap(os.path.join(path, "vectors.bin"), dtype=cls.DTYPES[dtype], mode="w+", shape=(count, dim))
+        scales = np.empty(count, dtype=np.float32) if dtype == "int8" else None
+        for start in range(0, count, batch_size):
+            block = vectors[order[start:start + batch_size]]
+            if dtype == "int8":
+                scale = np.abs(block).max(axis=1) / 127.0
+                scale[scale == 0] = 1.0
+                store[start:start + len(block)] = np.round(block / scale[:, None]).astype(np.int8)
+                scales[start:start + len(block)] = scale
+            else:
+                store[start:start + len(block)] = block.astype(np.float16)
+        store.flush()
+        del store
+
+        np.save(os.path.join(path, "centroids.npy"), centroids)
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "ids.npy"), ids[order])
+        if scales is not None:
+            np.save(os.path.join(path, "scales.npy"), scales)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "nlist": nlist, "dtype": dtype, "count": count}, f)
+        return cls(path)
+
+    def search(self, queries, k=10, nprobe=8):
+        """返回 (scores, ids)，形状均为 (查询数, k)；候选不足 k 个时以 -inf / -1 填充"""
+        queries = _as_queries(queries)
+        probes = _topk(queries @ self.centroids.T, min(nprobe, len(self.centroids)))
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+        for qi, query in enumerate(queries):
+            ranges = [(self.offsets[c], self.offsets[c + 1]) for c in probes[qi]]
+            positions = np.concatenate([np.arange(s, e) for s, e in ranges]) if ranges else np.empty(0, np.int64)
+            if len(positions) == 0:
+                continue
+            parts = [self.vectors[s:e] for s, e in ranges if e > s]
+            block = np.concatenate(parts).astype(np.float32)
+            scores = block @ query
+            if self.scales is not None:
+                scales = np.concatenate([self.scales[s:e] for s, e in ranges if e > s])
+                scores *= scales
+            top = _topk(scores[None, :], k)[0]
+            all_scores[qi, :len(top)] = scores[top]
+            all_ids[qi, :len(top)] = self.ids[positions[top]]
+        return all_scores, all_ids
@@ -0,0 +1,208 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from src.rag.chunking import chunk_context_text
+from src.rag.status import DocStatus
+
+_STOP = object()
+
+
+def parse_document(path):
+    """
+    读取源文件为纯文本：
+    - .txt  extract_contexts.py / trans_imgs.py 写出的文本
+    - .json 有道 OCR 翻译结果，取 resRegions 中的原文 context
+    """
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        regions = data.get("resRegions")
+        if regions is None:
+            raise ValueError("格式不正确，缺少 resRegions 字段")
+        return "\n\n".join(r.get("context", "").strip() for r in regions if r.get("context", "").strip())
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class StageCounter:
+    """单个阶段的计数器：处理条数、失败数、忙碌时间与吞吐"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.failed = 0
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, elapsed, ok=True):
+        with self._lock:
+            self.items += 1
+            self.busy_s += elapsed
+            if not ok:
+                self.failed += 1
+
+    def snapshot(self, wall_s):
+        with self._lock:
+            return {
+                "items": self.items,
+                "failed": self.failed,
+                "busy_s": round(self.busy_s, 3),
+                "items_per_s": round(self.items / wall_s, 2) if wall_s > 0 else 0.0,
+            }
+
+
+class IngestionPipeline:
+    """
+    增量入库流水线：scan -> parse -> chunk -> embed -> write。
+
+    - 只处理登记表中 READY 的文档（新增或内容变化），其余保持不动
+    - 各阶段之间是有界队列，下游变慢时上游阻塞（背压），内存占用有上限
+    - 单个文档在任一阶段出错只会被标记为 FAILED，工作线程继续处理后续文档
+    - 每个文档的分片在写入阶段单事务替换；中途崩溃重启后 recover() 会把
+      PENDING/HANDLING/PROCESSING 的文档退回 READY 重新处理
+    """
+
+    def __init__(self, registry, embedder, parse_workers=2, embed_workers=1, queue_size=32,
+                 max_chars=400, overlap=1):
+        self.registry = registry
+        self.embedder = embedder
+        self.parse_workers = parse_workers
+        self.embed_workers = embed_workers
+        self.queue_size = queue_size
+        self.max_chars = max_chars
+        self.overlap = overlap
+        self.counters = {name: StageCounter(name) for name in ("parse", "chunk", "embed", "write")}
+        self._wall_s = 0.0
+        self._live = {}
+        self._live_lock = threading.Lock()
+
+    def _fail(self, doc_id, stage, exc):
+        print(f"❌ {stage} 失败: {doc_id}: {exc}")
+        try:
+            self.registry.set_status(doc_id, DocStatus.FAILED, error=f"{stage}: {exc}")
+        except Exception as e:
+            # 登记表本身出错时只能留给下次 recover() 处理，不能让工作线程退出
+            print(f"❌ 无法标记失败状态: {doc_id}: {e}")
+
+    def _stage_done(self, stage, outbox, downstream):
+        """工作线程退出时调用：本阶段最后一个线程向下游发送 downstream 个 _STOP"""
+        with self._live_lock:
+            self._live[stage] -= 1
+            last = self._live[stage] == 0
+        if last and outbox is not None:
+            for _ in range(downstream):
+                outbox.put(_STOP)
+
+    def _parse_and_chunk(self, inbox, outbox):
+        try:
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    break
+                doc_id, digest = item
+                stage, start = "parse", time.perf_counter()
+                try:
+                    self.registry.set_status(doc_id, DocStatus.HANDLING)
+                    text = parse_document(doc_id)
+                    self.counters["parse"].add(time.perf_counter() - start)
+                    stage, start = "chunk", time.perf_counter()
+                    chunks = chunk_context_text(text, doc_id, self.max_chars, self.overlap)
+                    self.counters["chunk"].add(time.perf_counter() - start)
+                except Exception as e:
+                    self.counters[stage].add(time.perf_counter() - start, ok=False)
+                    self._fail(doc_id, stage, e)
+                    continue
+                outbox.put((doc_id, digest, chunks))
+        finally:
+            self._stage_done("parse", outbox, self.embed_workers)
+
+    def _embed(self, inbox, outbox):
+        try:
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    break
+                doc_id, digest, chunks = item
+                start = time.perf_counter()
+                try:
+                    self.registry.set_status(doc_id, DocStatus.PROCESSING)
+                    vectors = self.embedder.embed([c.text for c in chunks]) if chunks else []
+                except Exception as e:
+                    self.counters["embed"].add(time.perf_counter() - start, ok=False)
+                    self._fail(doc_id, "embed", e)
+                    continue
+                self.counters["embed"].add(time.perf_counter() - start)
+                outbox.put((doc_id, digest, chunks, vectors))
+        finally:
+            self._stage_done("embed", outbox, 1)
+
+    def _write(self, inbox):
+        try:
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    break
+                doc_id, digest, chunks, vectors = item
+                start = time.perf_counter()
+                try:
+                    written = self.registry.replace_chunks(doc_id, digest, chunks, vectors)
+                except Exception as e:
+                    self.counters["write"].add(time.perf_counter() - start, ok=False)
+                    self._fail(doc_id, "write", e)
+                    continue
+                self.counters["write"].add(time.perf_counter() - start, ok=written)
+        finally:
+            self._stage_done("write", None, 0)
+
+    def run(self, paths):
+        """扫描 paths 并处理全部增量，返回扫描结果与各阶段计数"""
+        recovered = self.registry.recover()
+        scan = self.registry.scan(paths)
+        todo = self.registry.claim_ready()
+
+        start = time.perf_counter()
+        parse_q = queue.Queue(maxsize=self.queue_size)
+        embed_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+
+        parsers = [threading.Thread(target=self._parse_and_chunk, args=(parse_q, embed_q), daemon=True)
+                   for _ in range(self.parse_workers)]
+        embedders = [threading.Thread(target=self._embed, args=(embed_q, write_q), daemon=True)
+                     for _ in range(self.embed_workers)]
+        writer = threading.Thread(target=self._write, args=(write_q,), daemon=True)
+        # 每个阶段的最后一个线程退出时把 _STOP 传给下游，run() 只需向第一阶段发送
+        self._live = {"parse": len(parsers), "embed": len(embedders), "write": 1}
+        for t in parsers + embedders + [writer]:
+            t.start()
+
+        for item in todo:
+            parse_q.put(item)
+        for _ in parsers:
+            parse_q.put(_STOP)
+        for t in parsers + embedders + [writer]:
+            t.join()
+
+        self._wall_s = time.perf_counter() - start
+        return {
+            "recovered": recovered,
+            "scan": scan,
+            "queued": len(todo),
+            "wall_s": round(self._wall_s, 3),
+            "stages": self.stage_stats(),
+            "status": {s.value: n for s, n in self.registry.status_counts().items()},
+        }
+
+    def stage_stats(self):
+        return {name: counter.snapshot(self._wall_s) for name, counter in self.counters.items()}
+
+
+def discover_sources(root, extensions=(".txt", ".json")):
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(extensions):
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from src.rag.chunking import Chunk
+from src.rag.index import BruteForceIndex
+from src.rag.status import DocStatus
+
+# 状态流转：
+#   READY      扫描发现新增/变更，等待入队
+#   PENDING    已入队，等待解析
+#   HANDLING   解析、切分中
+#   PROCESSING 向量化、写入中
+#   PROCESSED  已完成，分片与向量已入库
+#   FAILED     任一阶段失败（内容再次变化或手动重试时重新进入 READY）
+IN_FLIGHT = (DocStatus.PENDING, DocStatus.HANDLING, DocStatus.PROCESSING)
+
+
+def content_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class DocumentRegistry:
+    """
+    SQLite 持久化的文档登记表：记录每个源文件的内容哈希与 DocStatus，
+    以及已入库的分片文本和向量。只有内容哈希变化的文档才会被重新处理。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                num_chunks INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+                chunk_id TEXT NOT NULL UNIQUE,
+                doc_id TEXT NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                vector BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id);
+            """
+        )
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def recover(self):
+        """重启恢复：上次中断时处于 PENDING/HANDLING/PROCESSING 的文档回到 READY，返回数量"""
+        with self._lock:
+            cur = self._conn.execute(
+                f"UPDATE documents SET status=?, updated_at=? WHERE status IN ({','.join('?' * len(IN_FLIGHT))})",
+                (DocStatus.READY.value, time.time(), *[s.value for s in IN_FLIGHT]),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def scan(self, paths):
+        """
+        对比内容哈希登记文档：新增或内容变化的置为 READY；已不存在的连同分片一起删除。
+        返回 {"new": n, "changed": n, "unchanged": n, "removed": n}。
+        """
+        summary = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0}
+        now = time.time()
+        current = {os.path.abspath(p): content_hash(p) for p in paths}
+        with self._lock:
+            known = dict(self._conn.execute("SELECT doc_id, content_hash FROM documents").fetchall())
+            for doc_id, digest in current.items():
+                if doc_id not in known:
+                    self._conn.execute(
+                        "INSERT INTO documents (doc_id, content_hash, status, updated_at) VALUES (?, ?, ?, ?)",
+                        (doc_id, digest, DocStatus.READY.value, now),
+                    )
+                    summary["new"] += 1
+                elif known[doc_id] != digest:
+                    self._conn.execute(
+                        "UPDATE documents SET content_hash=?, status=?, attempts=0, error=NULL, updated_at=? "
+                        "WHERE doc_id=?",
+                        (digest, DocStatus.READY.value, now, doc_id),
+                    )
+                    summary["changed"] += 1
+                else:
+                    summary["unchanged"] += 1
+            for doc_id in set(known) - set(current):
+                self._conn.execute("DELETE FROM documents WHERE doc_id=?", (doc_id,))
+                summary["removed"] += 1
+            self._conn.commit()
+        return summary
+
+    def claim_ready(self, limit=None):
+        """取出 READY 文档并置为 PENDING，返回 [(doc_id, content_hash)]"""
+        with self._lock:
+            sql = "SELECT doc_id, content_hash FROM documents WHERE status=? ORDER BY doc_id"
+            params = [DocStatus.READY.value]
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.executemany(
+                "UPDATE documents SET status=?, updated_at=? WHERE doc_id=?",
+                [(DocStatus.PENDING.value, time.time(), doc_id) for doc_id, _ in rows],
+            )
+            self._conn.commit()
+        return rows
+
+    def set_status(self, doc_id, status, error=None):
+        with self._lock:
+            attempts = ", attempts=attempts+1" if status == DocStatus.FAILED else ""
+            self._conn.execute(
+                f"UPDATE documents SET status=?, error=?, updated_at=?{attempts} WHERE doc_id=?",
+                (DocStatus(status).value, error, time.time(), doc_id),
+            )
+            self._conn.commit()
+
+    def retry_failed(self, max_attempts=3):
+        """把失败次数未超限的文档重新置为 READY"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE documents SET status=?, updated_at=? WHERE status=? AND attempts<?",
+                (DocStatus.READY.value, time.time(), DocStatus.FAILED.value, max_attempts),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def replace_chunks(self, doc_id, digest, chunks, vectors):
+        """
+        在同一事务中替换文档的全部分片并标记 PROCESSED。
+        若处理期间文档内容又发生变化（哈希不一致），丢弃本次结果，等待下一轮处理。
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM documents WHERE doc_id=?", (doc_id,)).fetchone()
+            if row is None or row[0] != digest:
+                return False
+            with self._conn:
+                self._conn.execute("DELETE FROM chunks WHERE doc_id=?", (doc_id,))
+                self._conn.executemany(
+                    "INSERT INTO chunks (chunk_id, doc_id, text, metadata, vector) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (chunk.chunk_id, doc_id, chunk.text, json.dumps(chunk.metadata, ensure_ascii=False),
+                         vector.tobytes())
+                        for chunk, vector in zip(chunks, vectors)
+                    ],
+                )
+                self._conn.execute(
+                    "UPDATE documents SET status=?, num_chunks=?, error=NULL, updated_at=? WHERE doc_id=?",
+                    (DocStatus.PROCESSED.value, len(chunks), time.time(), doc_id),
+                )
+        return True
+
+    def status_counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM documents GROUP BY status").fetchall()
+        return {DocStatus(status): count for status, count in rows}
+
+    def get_status(self, doc_id):
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM documents WHERE doc_id=?", (doc_id,)).fetchone()
+        return DocStatus(row[0]) if row else None
+
+    def get_chunks(self, rowids):
+        """按分片 rowid（即索引中的 id）取回分片"""
+        rowids = [int(r) for r in rowids]
+        if not rowids:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT rowid, chunk_id, doc_id, text, metadata FROM chunks WHERE rowid IN ({','.join('?' * len(rowids))})",
+                rowids,
+            ).fetchall()
+        by_id = {row[0]: Chunk(chunk_id=row[1], source=row[2], text=row[3], metadata=json.loads(row[4]))
+                 for row in rows}
+        return [by_id[r] for r in rowids if r in by_id]
+
+    def build_index(self, dim, index=None):
+        """
+        构建或增量更新暴力检索索引，id 为分片 rowid。
+        传入已有 index 时只做增量：删除已不在库中的分片（文档被删除或内容变化），
+        再追加 rowid 大于索引中最大 id 的新分片（rowid 为 AUTOINCREMENT，只增不复用）。
+        """
+        if index is None:
+            index = BruteForceIndex(dim)
+        with self._lock:
+            if len(index):
+                live = np.fromiter((r for r, in self._conn.execute("SELECT rowid FROM chunks")), dtype=np.int64)
+                index.remove(index.ids[~np.isin(index.ids, live)])
+            high = int(index.ids.max()) if len(index) else 0
+            rows = self._conn.execute(
+                "SELECT rowid, vector FROM chunks WHERE rowid > ? ORDER BY rowid", (high,)
+            ).fetchall()
+        if rows:
+            index.add(np.stack([np.frombuffer(v, dtype=np.float32) for _, v in rows]), [r for r, _ in rows])
+        return index
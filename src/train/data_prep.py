@@ -0,0 +1,186 @@
+import bisect
+import io
+import json
+import os
+import re
+
+from datasets import Image as ImageFeature
+from PIL import Image
+
+DEFAULT_PROMPT = "<image>图片中的诊断结果是怎样?"
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+SHARD_PATTERN = re.compile(r"^shard-(\d{9})-(\d{9})\.jsonl$")
+MANIFEST_NAME = "manifest.json"
+
+
+def build_record(img_path, caption, prompt=DEFAULT_PROMPT):
+    """构造一条 mllm_data 格式的多模态对话样本"""
+    return {
+        "messages": [
+            {"content": prompt, "role": "user"},
+            {"content": caption, "role": "assistant"},
+        ],
+        "images": [img_path],
+    }
+
+
+def shard_name(first, last):
+    return f"shard-{first:09d}-{last:09d}.jsonl"
+
+
+def completed_ranges(output_dir):
+    """扫描已完成的分片文件（写完才原子重命名），返回按起点排序的闭区间列表"""
+    shard_dir = os.path.join(output_dir, "shards")
+    if not os.path.isdir(shard_dir):
+        return []
+    ranges = []
+    for name in os.listdir(shard_dir):
+        match = SHARD_PATTERN.match(name)
+        if match:
+            ranges.append((int(match.group(1)), int(match.group(2))))
+    return sorted(ranges)
+
+
+def uncovered_runs(indices, done_ranges):
+    """把一个批次的全局下标切成若干段连续且尚未导出的区间 [(批内起点, 批内终点)]"""
+    starts = [first for first, _ in done_ranges]
+
+    def covered(idx):
+        k = bisect.bisect_right(starts, idx) - 1
+        return k >= 0 and idx <= done_ranges[k][1]
+
+    runs = []
+    run_start = None
+    for pos, idx in enumerate(indices):
+        covered_idx = covered(idx)
+        if not covered_idx and run_start is None:
+            run_start = pos
+        elif covered_idx and run_start is not None:
+            runs.append((run_start, pos))
+            run_start = None
+        elif run_start is not None and idx != indices[pos - 1] + 1:
+            runs.append((run_start, pos))
+            run_start = pos
+    if run_start is not None:
+        runs.append((run_start, len(indices)))
+    return runs
+
+
+def _write_image(image, img_path):
+    """
+    写出图片：已是 JPEG 字节的直接落盘，其余情况解码后转 JPEG。
+    image 为 decode=False 的 {"bytes", "path"} 字典，或已解码的 PIL 图像。
+    """
+    if isinstance(image, dict):
+        data = image.get("bytes")
+        if data is None and image.get("path"):
+            with open(image["path"], "rb") as f:
+                data = f.read()
+        if data.startswith(JPEG_SIGNATURE):
+            with open(img_path, "wb") as f:
+                f.write(data)
+            return
+        image = Image.open(io.BytesIO(data))
+    with image:
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(img_path, format="JPEG", quality=95)
+
+
+def _export_batch(batch, indices, output_dir, done_ranges, prompt):
+    """map 的批处理函数：写图片与 JSONL 分片，只返回每个分片的摘要行"""
+    shard_dir = os.path.join(output_dir, "shards")
+    image_dir = os.path.join(output_dir, "images")
+    result = {"shard": [], "first_index": [], "records": []}
+
+    for start, end in uncovered_runs(indices, done_ranges):
+        first, last = indices[start], indices[end - 1]
+        name = shard_name(first, last)
+        tmp_path = os.path.join(shard_dir, name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for pos in range(start, end):
+                img_path = f"{output_dir}/images/{batch['id'][pos]}.jpg"
+                _write_image(batch["image"][pos], os.path.join(image_dir, f"{batch['id'][pos]}.jpg"))
+                record = build_record(img_path, batch["caption"][pos], prompt)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, os.path.join(shard_dir, name))
+        result["shard"].append(name)
+        result["first_index"].append(first)
+        result["records"].append(end - start)
+    return result
+
+
+def write_manifest(output_dir, total_rows=None):
+    """根据磁盘上已完成的分片生成清单；中断后重跑会跳过清单中已覆盖的下标"""
+    shards = [
+        {"file": f"shards/{shard_name(first, last)}", "first_index": first, "last_index": last,
+         "records": last - first + 1}
+        for first, last in completed_ranges(output_dir)
+    ]
+    num_records = sum(s["records"] for s in shards)
+    manifest = {
+        "num_records": num_records,
+        "total_rows": total_rows,
+        "complete": total_rows is not None and num_records == total_rows,
+        "shards": shards,
+    }
+    tmp_path = os.path.join(output_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+    return manifest
+
+
+def load_manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_mllm_dataset(ds, output_dir="mllm_data", num_proc=4, batch_size=1000, prompt=DEFAULT_PROMPT):
+    """
+    将数据集中的图像和对应的对话样本并行导出为 图片 + JSONL 分片 + 清单。
+
+    - datasets.map(batched=True, num_proc=N) 多进程写出，每个批次落成独立分片
+    - 图片列按原始字节读取，JPEG 直接写出，避免无谓的解码/重编码
+    - 批次处理完即释放，峰值内存与数据集大小无关
+    - 分片写完才原子重命名，中断后重跑自动跳过已完成下标
+
+    参数:
+    ds: 包含 id / image / caption 列的数据集对象。
+    output_dir: 输出目录，默认为 "mllm_data"。
+    返回: 清单字典。
+    """
+    os.makedirs(os.path.join(output_dir, "shards"), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, "images"), exist_ok=True)
+
+    done_ranges = completed_ranges(output_dir)
+    done = sum(last - first + 1 for first, last in done_ranges)
+    if done >= len(ds):
+        return write_manifest(output_dir, len(ds))
+    if done:
+        print(f"⏩ 检测到已完成 {done}/{len(ds)} 条，继续导出剩余部分...")
+
+    if isinstance(ds.features.get("image"), ImageFeature):
+        ds = ds.cast_column("image", ImageFeature(decode=False))
+
+    ds.map(
+        _export_batch,
+        batched=True,
+        batch_size=batch_size,
+        with_indices=True,
+        num_proc=num_proc,
+        remove_columns=ds.column_names,
+        fn_kwargs={"output_dir": output_dir, "done_ranges": done_ranges, "prompt": prompt},
+        load_from_cache_file=False,
+        desc="导出 mllm_data 分片",
+    )
+    return write_manifest(output_dir, len(ds))
+
+
+def iter_manifest_records(output_dir):
+    """按清单顺序逐行读取导出的样本，不一次性载入全部分片"""
+    manifest = load_manifest(output_dir)
+    for shard in manifest["shards"]:
+        with open(os.path.join(output_dir, shard["file"]), "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
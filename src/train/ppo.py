@@ -0,0 +1,215 @@
+import time
+from dataclasses import dataclass
+
+import torch
+import torch.nn.functional as F
+
+
+@dataclass
+class PPOConfig:
+    """默认值同 notebooks/rlhf/for_ppo.ipynb"""
+    ppo_epochs: int = 5
+    mini_batch_size: int = 2
+    kl_ctl: float = 0.1
+    vf_coef: float = 0.1
+    lam: float = 0.9
+    gamma: float = 0.9
+    cliprange: float = 0.2
+    cliprange_value: float = 0.2
+    max_new_tokens: int = 5
+    whiten_advantages: bool = True
+
+
+def masked_mean(values, mask, dim=None):
+    if dim is None:
+        return (values * mask).sum() / mask.sum().clamp(min=1)
+    return (values * mask).sum(dim=dim) / mask.sum(dim=dim).clamp(min=1)
+
+
+def whiten(values, mask, eps=1e-8):
+    mean = masked_mean(values, mask)
+    var = masked_mean((values - mean) ** 2, mask)
+    return (values - mean) * torch.rsqrt(var + eps) * mask
+
+
+def position_ids_from_mask(attention_mask):
+    """左填充时按有效 token 计数生成位置编号（与 generate 内部一致）"""
+    return (attention_mask.long().cumsum(-1) - 1).clamp(min=0)
+
+
+def logprobs_from_logits(logits, labels):
+    return torch.gather(F.log_softmax(logits.float(), dim=-1), 2, labels.unsqueeze(-1)).squeeze(-1)
+
+
+def response_mask_from_tokens(response, eos_token_id):
+    """回复部分的 mask：第一个 eos（含）之前为 1，之后 generate 填充的 pad 为 0"""
+    is_eos = (response == eos_token_id).long()
+    after_eos = (is_eos.cumsum(dim=1) - is_eos) > 0
+    return (~after_eos).long()
+
+
+def compute_rewards(scores, logprobs, ref_logprobs, mask, kl_ctl):
+    """逐 token 奖励 = -kl_ctl·(logπ - logπ_ref)，序列得分加在最后一个有效回复 token 上"""
+    kl = logprobs - ref_logprobs
+    rewards = -kl_ctl * kl * mask
+    last = (mask.sum(dim=1) - 1).clamp(min=0).long()
+    rewards[torch.arange(len(scores), device=rewards.device), last] += scores
+    return rewards, kl
+
+
+def _discount_matrix(length, factor, device, dtype):
+    # coef[t, j] = factor^(j - t)（j >= t），上三角
+    exponents = torch.arange(length, device=device, dtype=dtype)
+    diff = exponents.unsqueeze(0) - exponents.unsqueeze(1)
+    return torch.where(diff >= 0, factor ** diff.clamp(min=0), torch.zeros((), device=device, dtype=dtype))
+
+
+def compute_gae(rewards, values, mask, gamma, lam):
+    """
+    向量化的 GAE：δ_t = r_t + γ·V_{t+1} - V_t，A_t = Σ_{j>=t} (γλ)^{j-t} δ_j，
+    用一次 (T×T) 折扣矩阵乘法代替按时间步倒序的 Python 循环。返回 (advantages, returns)。
+    """
+    values = values * mask
+    rewards = rewards * mask
+    next_values = F.pad(values[:, 1:], (0, 1))
+    deltas = rewards + gamma * next_values - values
+    coef = _discount_matrix(rewards.shape[1], gamma * lam, rewards.device, rewards.dtype)
+    advantages = deltas @ coef.T
+    return advantages, advantages + values
+
+
+def ppo_losses(logprobs, old_logprobs, values, old_values, advantages, returns, mask, config):
+    ratio = torch.exp(logprobs - old_logprobs)
+    pg_losses = -advantages * ratio
+    pg_losses2 = -advantages * torch.clamp(ratio, 1.0 - config.cliprange, 1.0 + config.cliprange)
+    pg_loss = masked_mean(torch.max(pg_losses, pg_losses2), mask)
+
+    values_clipped = old_values + torch.clamp(values - old_values, -config.cliprange_value, config.cliprange_value)
+    vf_loss = 0.5 * masked_mean(torch.max((values - returns) ** 2, (values_clipped - returns) ** 2), mask)
+    loss = pg_loss + config.vf_coef * vf_loss
+    return loss, {
+        "pg_loss": pg_loss.item(),
+        "vf_loss": vf_loss.item(),
+        "clipfrac": masked_mean((torch.abs(ratio - 1.0) > config.cliprange).float(), mask).item(),
+        "approx_kl": masked_mean(0.5 * (logprobs - old_logprobs) ** 2, mask).item(),
+    }
+
+
+class ActorCritic(torch.nn.Module):
+    """策略模型 + 价值头共享主干：一次前向同时得到 logits 与每个位置的 value"""
+
+    def __init__(self, model, hidden_size=None):
+        super().__init__()
+        self.model = model
+        hidden_size = hidden_size or model.config.hidden_size
+        self.value_head = torch.nn.Linear(hidden_size, 1)
+
+    def forward(self, input_ids, attention_mask):
+        out = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                         position_ids=position_ids_from_mask(attention_mask), output_hidden_states=True)
+        return out.logits, self.value_head(out.hidden_states[-1]).squeeze(-1)
+
+    def generate(self, *args, **kwargs):
+        return self.model.generate(*args, **kwargs)
+
+
+def forward_batch(actor_critic, ref_model, sequences, attention_mask, prompt_len):
+    """
+    对整批 (prompt + response) 各做一次前向，返回回复部分的 logprobs、ref_logprobs 与 values。
+    位置 t 的 logits 预测第 t+1 个 token，因此回复 token 的 logprob 取 logits[:, P-1:-1]。
+    """
+    labels = sequences[:, prompt_len:]
+    logits, values = actor_critic(sequences, attention_mask)
+    logprobs = logprobs_from_logits(logits[:, prompt_len - 1:-1], labels)
+    with torch.no_grad():
+        ref_logits = ref_model(input_ids=sequences, attention_mask=attention_mask,
+                               position_ids=position_ids_from_mask(attention_mask)).logits
+        ref_logprobs = logprobs_from_logits(ref_logits[:, prompt_len - 1:-1], labels)
+    return logprobs, ref_logprobs, values[:, prompt_len - 1:-1]
+
+
+class PPOTrainer:
+    """
+    批量 PPO：
+    1. make_experience：整批左填充 prompt 一次 generate，actor-critic 与 ref 各一次前向，
+       KL 奖励、GAE、returns 全部是张量运算
+    2. train：ppo_epochs 轮 × 随机 minibatch 的裁剪策略损失 + 裁剪价值损失
+
+    reward_fn(sequences, attention_mask) -> (batch,) 序列得分（如奖励模型）。
+    """
+
+    def __init__(self, actor_critic, ref_model, reward_fn, optimizer, config=None, pad_token_id=0,
+                 eos_token_id=None):
+        self.actor_critic = actor_critic
+        self.ref_model = ref_model.eval()
+        self.reward_fn = reward_fn
+        self.optimizer = optimizer
+        self.config = config or PPOConfig()
+        self.pad_token_id = pad_token_id
+        self.eos_token_id = eos_token_id
+
+    @torch.no_grad()
+    def make_experience(self, prompt_ids, prompt_mask):
+        self.actor_critic.eval()
+        sequences = self.actor_critic.generate(
+            input_ids=prompt_ids, attention_mask=prompt_mask, max_new_tokens=self.config.max_new_tokens,
+            do_sample=True, pad_token_id=self.pad_token_id, eos_token_id=self.eos_token_id,
+        )
+        prompt_len = prompt_ids.shape[1]
+        response = sequences[:, prompt_len:]
+        if self.eos_token_id is None:
+            response_mask = torch.ones_like(response)
+        else:
+            response_mask = response_mask_from_tokens(response, self.eos_token_id)
+        attention_mask = torch.cat([prompt_mask, response_mask], dim=1)
+
+        logprobs, ref_logprobs, values = forward_batch(
+            self.actor_critic, self.ref_model, sequences, attention_mask, prompt_len)
+        scores = self.reward_fn(sequences, attention_mask).reshape(-1).float()
+        rewards, kl = compute_rewards(scores, logprobs, ref_logprobs, response_mask.float(), self.config.kl_ctl)
+        advantages, returns = compute_gae(rewards, values, response_mask.float(), self.config.gamma,
+                                          self.config.lam)
+        if self.config.whiten_advantages:
+            advantages = whiten(advantages, response_mask.float())
+        return {
+            "sequences": sequences,
+            "attention_mask": attention_mask,
+            "response_mask": response_mask.float(),
+            "prompt_len": prompt_len,
+            "logprobs": logprobs,
+            "values": values,
+            "advantages": advantages,
+            "returns": returns,
+            "scores": scores,
+            "kl": masked_mean(kl, response_mask.float()).item(),
+        }
+
+    def train(self, experience):
+        self.actor_critic.train()
+        batch_size = experience["sequences"].shape[0]
+        prompt_len = experience["prompt_len"]
+        stats = []
+        for _ in range(self.config.ppo_epochs):
+            for idx in torch.randperm(batch_size).split(self.config.mini_batch_size):
+                sequences = experience["sequences"][idx]
+                attention_mask = experience["attention_mask"][idx]
+                logits, values = self.actor_critic(sequences, attention_mask)
+                logprobs = logprobs_from_logits(logits[:, prompt_len - 1:-1], sequences[:, prompt_len:])
+                loss, loss_stats = ppo_losses(
+                    logprobs, experience["logprobs"][idx], values[:, prompt_len - 1:-1], experience["values"][idx],
+                    experience["advantages"][idx], experience["returns"][idx], experience["response_mask"][idx],
+                    self.config,
+                )
+                self.optimizer.zero_grad()
+                loss.backward()
+                self.optimizer.step()
+                stats.append({"loss": loss.item(), **loss_stats})
+        return {key: sum(s[key] for s in stats) / len(stats) for key in stats[0]}
+
+    def step(self, prompt_ids, prompt_mask):
+        start = time.perf_counter()
+        experience = self.make_experience(prompt_ids, prompt_mask)
+        stats = self.train(experience)
+        stats.update(score_mean=experience["scores"].mean().item(), kl=experience["kl"],
+                     step_s=time.perf_counter() - start)
+        return stats
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from src.train.ppo import position_ids_from_mask
+from src.train.sft_data import resolve_pad_token_id
+
+
+class RewardModel(torch.nn.Module):
+    """
+    与 notebooks/rlhf/for_ppo.ipynb 的 GPTRewardModel 参数布局相同（gpt_model.* + reward_head.*），可直接加载其权重。
+    区别：只跑主干（base_model），不经 lm_head、不保留每层 hidden_states，且只对每行最后一个有效 token 过线性头。
+    左右填充均可，返回 (batch,) 得分。
+    """
+
+    def __init__(self, gpt_model, reward_head):
+        super().__init__()
+        self.gpt_model = gpt_model
+        self.reward_head = reward_head
+
+    def forward(self, input_ids, attention_mask):
+        hidden = self.gpt_model.base_model(
+            input_ids=input_ids, attention_mask=attention_mask,
+            position_ids=position_ids_from_mask(attention_mask), use_cache=False,
+        ).last_hidden_state
+        last = attention_mask.shape[1] - 1 - attention_mask.flip(1).long().argmax(dim=1)
+        rows = torch.arange(len(input_ids), device=input_ids.device)
+        return self.reward_head(hidden[rows, last]).squeeze(-1)
+
+
+class ScoreCache:
+    """
+    (prompt, response) 哈希 -> 得分。内存层为 OrderedDict LRU；给定 db_path 时同时写入 SQLite，
+    换进程、换一轮 PPO 仍可命中。线程安全。
+    """
+
+    def __init__(self, db_path=None, max_entries=1_000_000):
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL NOT NULL)")
+            self._conn.commit()
+
+    def __len__(self):
+        return len(self._memory)
+
+    @property
+    def persistent(self):
+        return self._conn is not None
+
+    def _remember(self, key, score):
+        self._memory[key] = score
+        self._memory.move_to_end(key)
+
+    def get_many(self, keys):
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+            if self._conn is not None and missing:
+                for start in range(0, len(missing), 500):
+                    part = missing[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, score FROM scores WHERE key IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+                    found.update(rows)
+                    # SQLite 命中的也放进内存层，之后不必再查库
+                    for key, score in rows:
+                        self._remember(key, score)
+                while len(self._memory) > self.max_entries:
+                    self._memory.popitem(last=False)
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            for key, score in items.items():
+                self._remember(key, score)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+            if self._conn is not None and items:
+                self._conn.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", items.items())
+                self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+class RewardScorer:
+    """
+    离线奖励打分：
+    - 未命中缓存的 (prompt, response) 去重后按 token 长度排序再切 batch，减少填充
+    - 左填充后一次主干前向，只取最后一个有效 token
+    - 得分按 sha1(model_tag, template, max_len, prompt, response) 缓存；
+      使用持久化（SQLite）缓存时必须显式给出 model_tag（如权重文件名或其哈希），换权重时随之更换
+    score_jsonl 把候选对 JSONL 分块交给线程池（分词、查缓存与前向在线程间重叠），按输入顺序写出。
+
+    用法：
+        scorer = RewardScorer(RewardModel(model, head), tokenizer, cache=ScoreCache("results/cache/rm.sqlite"),
+                              model_tag="rm-step-2000")
+        scores = scorer.score([("肺部CT提示？", "双肺纹理增粗。")])
+    """
+
+    def __init__(self, reward_model, tokenizer, batch_size=32, max_len=1024, cache=None, device="cpu",
+                 model_tag=None, template="用户：{prompt}\n助手：{response}"):
+        self.reward_model = reward_model.to(device).eval()
+        self.tokenizer = tokenizer
+        self.pad_token_id = resolve_pad_token_id(tokenizer)
+        self.batch_size = batch_size
+        self.max_len = max_len
+        self.cache = cache if cache is not None else ScoreCache()
+        if model_tag is None and self.cache.persistent:
+            # 持久化缓存跨进程保留：默认标签会让新权重命中旧权重的得分
+            raise ValueError("使用持久化 ScoreCache 时必须指定 model_tag，用以区分不同的奖励模型权重")
+        self.device = device
+        self.model_tag = model_tag or "reward_model"
+        self.template = template
+        self._lock = threading.Lock()
+        # CPU 上 torch 算子本身已占满所有核，多线程同时前向只会互相争抢；前向串行，线程池只重叠分词、查缓存与读写
+        self._forward_lock = threading.Lock()
+        self.counters = {"pairs": 0, "cache_hits": 0, "scored": 0, "batches": 0, "real_tokens": 0,
+                         "padded_tokens": 0}
+        self.timings = {"forward_s": 0.0}
+
+    def key(self, prompt, response):
+        payload = json.dumps([self.model_tag, self.template, self.max_len, prompt, response], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def encode(self, prompt, response):
+        ids = self.tokenizer.encode(self.template.format(prompt=prompt, response=response))
+        eos = getattr(self.tokenizer, "eos_token_id", None)
+        if eos is not None:
+            ids = list(ids) + [eos]
+        # 截断时保留结尾：得分取自最后一个 token
+        return ids[-self.max_len:]
+
+    def _pad_left(self, sequences):
+        width = max(len(s) for s in sequences)
+        input_ids = torch.full((len(sequences), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, seq in enumerate(sequences):
+            input_ids[row, width - len(seq):] = torch.as_tensor(seq, dtype=torch.long)
+            attention_mask[row, width - len(seq):] = 1
+        return input_ids.to(self.device), attention_mask.to(self.device)
+
+    @torch.no_grad()
+    def _score_sequences(self, sequences):
+        input_ids, attention_mask = self._pad_left(sequences)
+        with self._forward_lock:
+            start = time.perf_counter()
+            scores = self.reward_model(input_ids, attention_mask).float().cpu().tolist()
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self.counters["batches"] += 1
+            self.counters["real_tokens"] += int(attention_mask.sum())
+            self.counters["padded_tokens"] += attention_mask.numel()
+            self.timings["forward_s"] += elapsed
+        return scores
+
+    def score(self, pairs):
+        """pairs: [(prompt, response)] -> [float]，顺序与输入一致"""
+        pairs = list(pairs)
+        keys = [self.key(p, r) for p, r in pairs]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        todo = {}
+        for key, (prompt, response) in zip(keys, pairs):
+            if key not in found and key not in todo:
+                todo[key] = self.encode(prompt, response)
+        order = sorted(todo, key=lambda k: len(todo[k]))
+        computed = {}
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            computed.update(zip(batch, self._score_sequences([todo[k] for k in batch])))
+        self.cache.put_many(computed)
+        found.update(computed)
+        with self._lock:
+            self.counters["pairs"] += len(pairs)
+            self.counters["scored"] += len(computed)
+            self.counters["cache_hits"] += len(pairs) - len(computed)
+        return [found[k] for k in keys]
+
+    def score_jsonl(self, input_path, output_path, num_workers=2, chunk_size=1024, prompt_key="prompt",
+                    response_key="response", score_key="score"):
+        """
+        流式处理候选对 JSONL（每行含 prompt / response 字段），写出附带 score 字段的 JSONL。
+        最多 2 × num_workers 个块在途，内存占用与文件大小无关；返回写出的行数。
+        """
+        written = 0
+        pending = deque()
+
+        def flush(block):
+            nonlocal written
+            while pending and (block or pending[0][1].done()):
+                records, future = pending.popleft()
+                for record, score in zip(records, future.result()):
+                    record[score_key] = score
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                written += len(records)
+                block = False
+
+        with open(input_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=num_workers) as pool:
+            records = []
+            for line in src:
+                if not line.strip():
+                    continue
+                records.append(json.loads(line))
+                if len(records) == chunk_size:
+                    pairs = [(r[prompt_key], r[response_key]) for r in records]
+                    pending.append((records, pool.submit(self.score, pairs)))
+                    records = []
+                    flush(block=len(pending) >= 2 * num_workers)
+            if records:
+                pairs = [(r[prompt_key], r[response_key]) for r in records]
+                pending.append((records, pool.submit(self.score, pairs)))
+            while pending:
+                flush(block=True)
+        return written
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, **{k: round(v, 3) for k, v in self.timings.items()})
+        stats["padding_efficiency"] = round(stats["real_tokens"] / stats["padded_tokens"], 3) \
+            if stats["padded_tokens"] else 0.0
+        stats["hit_rate"] = round(stats["cache_hits"] / stats["pairs"], 3) if stats["pairs"] else 0.0
+        return stats
+
+    def report(self, title="奖励打分"):
+        s = self.stats()
+        print(f"🏅 {title}")
+        print(f"   候选对 {s['pairs']}  命中缓存 {s['cache_hits']}（{s['hit_rate']:.1%}）  实际打分 {s['scored']}")
+        print(f"   batch {s['batches']}  填充效率 {s['padding_efficiency']}  前向 {s['forward_s']}s")
@@ -0,0 +1,336 @@
+import bisect
+import hashlib
+import inspect
+import json
+import os
+import random
+from array import array
+
+import numpy as np
+import torch
+
+from src.train.data_prep import MANIFEST_NAME, iter_manifest_records
+
+IGNORE_INDEX = -100
+STORE_VERSION = 2
+
+
+def resolve_pad_token_id(tokenizer):
+    """GPT-2 等分词器没有 pad token，填充位置被 attention_mask / loss_mask 屏蔽，用 eos 填充即可"""
+    pad_token_id = getattr(tokenizer, "pad_token_id", None)
+    if pad_token_id is None:
+        pad_token_id = getattr(tokenizer, "eos_token_id", None)
+    if pad_token_id is None:
+        raise ValueError("分词器既没有 pad_token_id 也没有 eos_token_id，无法填充")
+    return pad_token_id
+
+
+def tokenize_record(record, tokenizer, user_prefix="用户：", assistant_prefix="\n助手："):
+    """
+    mllm_data 样本 -> (input_ids, loss_mask)。只对 assistant 回复（含结尾 eos）计算损失。
+    tokenizer 只需提供 encode(text) 与 eos_token_id（ByteTokenizer 或 HF tokenizer 均可）。
+    """
+    ids, mask = [], []
+    for message in record["messages"]:
+        if message["role"] == "assistant":
+            prefix = tokenizer.encode(assistant_prefix)
+            answer = tokenizer.encode(message["content"]) + [tokenizer.eos_token_id]
+            ids += prefix + answer
+            mask += [0] * len(prefix) + [1] * len(answer)
+        else:
+            piece = tokenizer.encode(user_prefix + message["content"])
+            ids += piece
+            mask += [0] * len(piece)
+    return ids, mask
+
+
+def tokenizer_signature(tokenizer, tokenizer_name=None):
+    """
+    影响分词结果的分词器标识：类名之外还要区分同一类的不同模型（name_or_path、词表大小、特殊 token），
+    否则换了模型却复用旧的 token id。
+    """
+    vocab_size = getattr(tokenizer, "vocab_size", None)
+    try:
+        vocab_size = len(tokenizer)  # HF tokenizer 的 len 包含新增的特殊 token
+    except TypeError:
+        pass
+    return {
+        "name": tokenizer_name or type(tokenizer).__name__,
+        "name_or_path": getattr(tokenizer, "name_or_path", None),
+        "vocab_size": vocab_size,
+        "eos_token_id": tokenizer.eos_token_id,
+        "pad_token_id": getattr(tokenizer, "pad_token_id", None),
+    }
+
+
+def source_fingerprint(data_dir, tokenizer_sig, max_len, tokenize_kwargs=None):
+    """清单内容 + 分词器标识 + max_len + 对话模板前缀（tokenize_record 的参数，含默认值）"""
+    with open(os.path.join(data_dir, MANIFEST_NAME), "rb") as f:
+        manifest = f.read()
+    params = {k: v.default for k, v in inspect.signature(tokenize_record).parameters.items()
+              if v.default is not inspect.Parameter.empty}
+    params.update(tokenize_kwargs or {})
+    key = json.dumps([STORE_VERSION, tokenizer_sig, max_len, params], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8") + b":" + manifest).hexdigest()
+
+
+class TokenStore:
+    """
+    预分词后的内存映射 token 仓库：
+      tokens.bin    所有样本首尾相接的 int32 token
+      loss_mask.bin 对应的 uint8 损失掩码
+      offsets.npy   每个样本的起点（长度 n+1）
+      images.jsonl  每行一个样本的图片路径列表，images_offsets.npy 为行的字节偏移，按需读取
+    清单（manifest.json）、分词器或对话模板前缀变化时自动重建，否则直接复用。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.lengths = np.diff(self.offsets)
+        self.tokens = np.memmap(os.path.join(path, "tokens.bin"), dtype=np.int32, mode="r") \
+            if self.offsets[-1] else np.zeros(0, dtype=np.int32)
+        self.loss_mask = np.memmap(os.path.join(path, "loss_mask.bin"), dtype=np.uint8, mode="r") \
+            if self.offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self._image_offsets = np.load(os.path.join(path, "images_offsets.npy"))
+        self._images_file = None
+
+    @classmethod
+    def build(cls, data_dir, store_dir, tokenizer, tokenizer_name=None, max_len=2048, **tokenize_kwargs):
+        """流式读取清单中的分片并分词写盘，峰值内存与样本数无关；指纹未变时直接打开已有仓库"""
+        pad_token_id = resolve_pad_token_id(tokenizer)
+        signature = tokenizer_signature(tokenizer, tokenizer_name)
+        fingerprint = source_fingerprint(data_dir, signature, max_len, tokenize_kwargs)
+        meta_path = os.path.join(store_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if json.load(f).get("fingerprint") == fingerprint:
+                    return cls(store_dir)
+            # 先作废旧的 meta.json：重写数据文件中途中断时，不能让旧指纹匹配上写了一半的文件
+            os.remove(meta_path)
+
+        os.makedirs(store_dir, exist_ok=True)
+        offsets = array("q", [0])
+        image_offsets = array("q")
+        truncated = 0
+        with open(os.path.join(store_dir, "tokens.bin"), "wb") as tok_f, \
+                open(os.path.join(store_dir, "loss_mask.bin"), "wb") as mask_f, \
+                open(os.path.join(store_dir, "images.jsonl"), "wb") as img_f:
+            for record in iter_manifest_records(data_dir):
+                ids, mask = tokenize_record(record, tokenizer, **tokenize_kwargs)
+                if len(ids) > max_len:
+                    ids, mask = ids[:max_len], mask[:max_len]
+                    truncated += 1
+                tok_f.write(np.asarray(ids, dtype=np.int32).tobytes())
+                mask_f.write(np.asarray(mask, dtype=np.uint8).tobytes())
+                image_offsets.append(img_f.tell())
+                img_f.write((json.dumps(record.get("images", []), ensure_ascii=False) + "\n").encode("utf-8"))
+                offsets.append(offsets[-1] + len(ids))
+
+        np.save(os.path.join(store_dir, "offsets.npy"), np.frombuffer(offsets, dtype=np.int64))
+        np.save(os.path.join(store_dir, "images_offsets.npy"), np.frombuffer(image_offsets, dtype=np.int64))
+        # meta.json 最后原子写入，存在即表示数据文件完整
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "tokenizer": signature, "max_len": max_len,
+                       "num_samples": len(offsets) - 1, "num_tokens": offsets[-1], "truncated": truncated,
+                       "pad_token_id": pad_token_id}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, meta_path)
+        return cls(store_dir)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {"input_ids": self.tokens[start:end], "loss_mask": self.loss_mask[start:end]}
+
+    def images(self, idx):
+        if self._images_file is None:
+            self._images_file = open(os.path.join(self.path, "images.jsonl"), "rb")
+        self._images_file.seek(int(self._image_offsets[idx]))
+        return json.loads(self._images_file.readline())
+
+
+class LengthBucketSampler:
+    """
+    按长度分桶的 batch sampler：打乱后每 bucket_batches 个 batch 的样本为一组，组内按长度排序再切 batch，
+    最后打乱 batch 顺序。长度相近的样本进同一个 batch，填充大幅减少，同时保留随机性。
+    """
+
+    def __init__(self, lengths, batch_size, bucket_batches=50, shuffle=True, seed=0, drop_last=False):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_batches = bucket_batches
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _batches(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        group = self.batch_size * self.bucket_batches
+        batches = []
+        for start in range(0, len(order), group):
+            chunk = order[start:start + group]
+            chunk = chunk[np.argsort(self.lengths[chunk], kind="stable")]
+            for b in range(0, len(chunk), self.batch_size):
+                batch = chunk[b:b + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch.tolist())
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self._batches())
+
+    def __len__(self):
+        n = len(self.lengths) // self.batch_size
+        return n if self.drop_last or len(self.lengths) % self.batch_size == 0 else n + 1
+
+
+def pack_lengths(lengths, max_seq_len, shuffle=True, seed=0):
+    """
+    最佳适配递减（BFD）装箱：样本按长度降序，放进剩余空间最小且放得下的序列，
+    剩余空间用有序列表 + bisect 维护，O(n log n)。返回每条序列的样本下标列表。
+    """
+    lengths = np.asarray(lengths)
+    bins = []
+    rooms, room_bins = [], []  # 按剩余空间升序
+    for idx in np.argsort(-lengths, kind="stable").tolist():
+        length = int(lengths[idx])
+        pos = bisect.bisect_left(rooms, length)
+        if pos < len(rooms):
+            b = room_bins.pop(pos)
+            room = rooms.pop(pos) - length
+            bins[b].append(idx)
+        else:
+            b = len(bins)
+            bins.append([idx])
+            room = max_seq_len - length
+        insert_at = bisect.bisect_left(rooms, room)
+        rooms.insert(insert_at, room)
+        room_bins.insert(insert_at, b)
+    if shuffle:
+        random.Random(seed).shuffle(bins)
+    return bins
+
+
+def pad_collate(samples, pad_token_id):
+    """右填充到批内最长：input_ids / attention_mask / labels（非回复与填充位置为 -100）"""
+    width = max(len(s["input_ids"]) for s in samples)
+    input_ids = torch.full((len(samples), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(samples), width), dtype=torch.long)
+    labels = torch.full((len(samples), width), IGNORE_INDEX, dtype=torch.long)
+    for row, s in enumerate(samples):
+        n = len(s["input_ids"])
+        ids = torch.from_numpy(np.asarray(s["input_ids"], dtype=np.int64))
+        input_ids[row, :n] = ids
+        attention_mask[row, :n] = 1
+        labels[row, :n] = torch.where(torch.from_numpy(np.asarray(s["loss_mask"], dtype=bool)), ids, IGNORE_INDEX)
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+class PackedDataset(torch.utils.data.Dataset):
+    """
+    每一项是一条装箱后的序列：多个样本首尾相接，补齐到 max_seq_len。
+    返回 segment_ids（样本编号，从 1 开始，填充为 0）与每段从 0 开始的 position_ids；
+    每个样本的第一个 token 不作为上一个样本的预测目标（labels 置 -100），跨样本不计损失。
+    """
+
+    def __init__(self, store, max_seq_len=None, shuffle=True, seed=0):
+        self.store = store
+        self.max_seq_len = max_seq_len or store.meta["max_len"]
+        # 比 max_seq_len 长的样本只能截断装入，丢掉的往往是回复结尾，提醒调大 max_seq_len
+        self.truncated = int((store.lengths > self.max_seq_len).sum())
+        if self.truncated:
+            print(f"⚠️ {self.truncated} 个样本长于 max_seq_len={self.max_seq_len}，装箱时将被截断"
+                  f"（仓库 max_len={store.meta['max_len']}）")
+        self.bins = pack_lengths(np.minimum(store.lengths, self.max_seq_len), self.max_seq_len,
+                                 shuffle=shuffle, seed=seed)
+
+    def __len__(self):
+        return len(self.bins)
+
+    def __getitem__(self, idx):
+        input_ids = np.full(self.max_seq_len, self.store.meta["pad_token_id"], dtype=np.int64)
+        labels = np.full(self.max_seq_len, IGNORE_INDEX, dtype=np.int64)
+        position_ids = np.zeros(self.max_seq_len, dtype=np.int64)
+        segment_ids = np.zeros(self.max_seq_len, dtype=np.int64)
+        pos = 0
+        for seg, sample_idx in enumerate(self.bins[idx], start=1):
+            sample = self.store[sample_idx]
+            n = min(len(sample["input_ids"]), self.max_seq_len - pos)
+            ids = sample["input_ids"][:n]
+            input_ids[pos:pos + n] = ids
+            labels[pos:pos + n] = np.where(sample["loss_mask"][:n] > 0, ids, IGNORE_INDEX)
+            labels[pos] = IGNORE_INDEX
+            position_ids[pos:pos + n] = np.arange(n)
+            segment_ids[pos:pos + n] = seg
+            pos += n
+        return {"input_ids": input_ids, "labels": labels, "position_ids": position_ids, "segment_ids": segment_ids,
+                "num_samples": len(self.bins[idx])}
+
+
+def packed_attention_mask(position_ids):
+    """
+    块对角因果 mask (batch, 1, L, L)：位置 i 只能看到本样本内 [i - position_ids[i], i] 的 token。
+    每段的 position_ids 从 0 开始，段起点即 i - position_ids[i]；填充位置 position_ids 为 0，只看得到自己，
+    不会出现整行被屏蔽导致 softmax 为 NaN。
+    """
+    length = position_ids.shape[1]
+    cols = torch.arange(length, device=position_ids.device)
+    rows = cols[:, None]
+    starts = (rows - position_ids[:, :, None])
+    return ((cols <= rows) & (cols >= starts))[:, None]
+
+
+def cu_seqlens(segment_ids):
+    """flash-attn varlen 接口需要的累计长度（整批按行展平后各样本的边界）"""
+    lengths = [torch.bincount(row[row > 0])[1:] for row in segment_ids]
+    return torch.nn.functional.pad(torch.cat(lengths).cumsum(0), (1, 0)).to(torch.int32)
+
+
+def packed_collate(items):
+    batch = {key: torch.from_numpy(np.stack([item[key] for item in items]))
+             for key in ("input_ids", "labels", "position_ids", "segment_ids")}
+    batch["attention_mask"] = packed_attention_mask(batch["position_ids"])
+    batch["cu_seqlens"] = cu_seqlens(batch["segment_ids"])
+    batch["num_samples"] = sum(item["num_samples"] for item in items)
+    return batch
+
+
+def padding_efficiency(batch):
+    """有效 token 占张量总位置的比例"""
+    if "segment_ids" in batch:
+        return float((batch["segment_ids"] > 0).float().mean())
+    return float(batch["attention_mask"].float().mean())
+
+
+def make_loader(store, mode="bucket", batch_size=16, max_seq_len=None, num_workers=0, seed=0):
+    """
+    mode:
+      naive   随机 batch，填充到批内最长
+      bucket  LengthBucketSampler 分桶后填充
+      pack    装箱成 max_seq_len（默认为仓库的 max_len）的序列，每批 batch_size 条序列
+    """
+    pad_token_id = store.meta["pad_token_id"]
+    collate = lambda samples: pad_collate(samples, pad_token_id)  # noqa: E731
+    if mode == "naive":
+        sampler = torch.utils.data.BatchSampler(
+            torch.utils.data.RandomSampler(store, generator=torch.Generator().manual_seed(seed)), batch_size, False)
+        return torch.utils.data.DataLoader(store, batch_sampler=sampler, collate_fn=collate, num_workers=num_workers)
+    if mode == "bucket":
+        sampler = LengthBucketSampler(store.lengths, batch_size, seed=seed)
+        return torch.utils.data.DataLoader(store, batch_sampler=sampler, collate_fn=collate, num_workers=num_workers)
+    if mode == "pack":
+        return torch.utils.data.DataLoader(PackedDataset(store, max_seq_len, seed=seed), batch_size=batch_size,
+                                           shuffle=False, collate_fn=packed_collate, num_workers=num_workers)
+    raise ValueError(f"未知 mode: {mode}")
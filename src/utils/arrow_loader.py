@@ -0,0 +1,173 @@
+import bisect
+import hashlib
+import io
+import json
+import os
+from collections.abc import Mapping
+
+import pyarrow as pa
+from PIL import Image
+
+# id 索引默认写到用户缓存目录，而不是数据目录：数据集可能挂载为只读或多人共享
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "med-llm", "arrow_index")
+
+
+def open_arrow_table(path):
+    """内存映射打开一个 Arrow 分片（datasets 写出的是 IPC stream 格式，兼容 IPC file 格式），不拷贝数据"""
+    source = pa.memory_map(path, "r")
+    try:
+        return pa.ipc.open_stream(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_file(source).read_all()
+
+
+def _fingerprint(paths):
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+
+class LazyRow(Mapping):
+    """按需取列的行视图：访问 image 时才解码图片，其余列只在访问时从内存映射中读取"""
+
+    def __init__(self, table, row, image_column="image"):
+        self._table = table
+        self._row = row
+        self._image_column = image_column
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            if key not in self._table.column_names:
+                raise KeyError(key)
+            value = self._table.column(key)[self._row].as_py()
+            if key == self._image_column and isinstance(value, dict):
+                value = decode_image(value)
+            self._cache[key] = value
+        return self._cache[key]
+
+    def raw(self, key):
+        """返回列的原始值（图片列为 {"bytes", "path"}，不解码）"""
+        return self._table.column(key)[self._row].as_py()
+
+    def __iter__(self):
+        return iter(self._table.column_names)
+
+    def __len__(self):
+        return self._table.num_columns
+
+    def __repr__(self):
+        return f"LazyRow(row={self._row}, columns={self._table.column_names})"
+
+
+def decode_image(value):
+    if value.get("bytes") is not None:
+        return Image.open(io.BytesIO(value["bytes"]))
+    return Image.open(value["path"])
+
+
+class ArrowShardDataset:
+    """
+    直接内存映射本地 .arrow 分片的只读数据集，无需 load_dataset 转换与缓存。
+    - ds[i]：按全局行号访问
+    - ds["sample_id"]：按 id 列 O(1) 查找，id 列表以 JSON 持久化在 index_dir（默认 ~/.cache/med-llm/arrow_index）
+    - 返回 LazyRow，图片只在被访问时才解码
+    """
+
+    def __init__(self, data_dir=None, data_files=None, id_column="id", image_column="image", index_path=None,
+                 index_dir=DEFAULT_INDEX_DIR):
+        if data_files is None:
+            data_files = sorted(
+                os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(".arrow")
+            )
+        if not data_files:
+            raise ValueError(f"未找到 .arrow 文件: {data_dir}")
+        self.data_files = list(data_files)
+        self.id_column = id_column
+        self.image_column = image_column
+        if index_path is None:
+            # 按分片绝对路径与 id 列区分不同数据集
+            key = json.dumps([[os.path.abspath(p) for p in self.data_files], id_column])
+            index_path = os.path.join(index_dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+        self.index_path = index_path
+
+        self.tables = [open_arrow_table(path) for path in self.data_files]
+        self._offsets = [0]
+        for table in self.tables:
+            self._offsets.append(self._offsets[-1] + table.num_rows)
+        self._index = None
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    @property
+    def column_names(self):
+        return self.tables[0].column_names
+
+    @property
+    def index(self):
+        """id -> (分片序号, 分片内行号)；首次访问时加载持久化索引，缺失或过期则重建"""
+        if self._index is None:
+            self._index = self._load_index() or self._build_index()
+        return self._index
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("fingerprint") != _fingerprint(self.data_files) or payload.get("id_column") != self.id_column:
+            return None
+        return self._index_from_ids(payload["ids"])
+
+    def _index_from_ids(self, ids):
+        """ids 为按全局行号排列的 id 列表"""
+        index = {}
+        for shard in range(len(self.tables)):
+            first = self._offsets[shard]
+            for row, key in enumerate(ids[first:self._offsets[shard + 1]]):
+                index[key] = (shard, row)
+        return index
+
+    def _build_index(self):
+        ids = []
+        for table in self.tables:
+            ids.extend(table.column(self.id_column).to_pylist())
+        payload = {"fingerprint": _fingerprint(self.data_files), "id_column": self.id_column, "ids": ids}
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            # 索引只是加速用的缓存，写不了就只保留在内存里
+            print(f"⚠️ 无法写入 id 索引 {self.index_path}: {e}")
+        return self._index_from_ids(ids)
+
+    def locate(self, key):
+        """返回 (分片序号, 分片内行号)；整数为全局行号，字符串为 id"""
+        if isinstance(key, str):
+            return self.index[key]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        shard = bisect.bisect_right(self._offsets, key) - 1
+        return shard, key - self._offsets[shard]
+
+    def __getitem__(self, key):
+        shard, row = self.locate(key)
+        return LazyRow(self.tables[shard], row, self.image_column)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        for table in self.tables:
+            for row in range(table.num_rows):
+                yield LazyRow(table, row, self.image_column)
@@ -0,0 +1,327 @@
+"""
+放射影像批量入库：DICOM / PNG / JPEG -> 解码、窗宽窗位归一化、等比缩放补边 -> 固定形状 uint8 数组，
+写入内存映射张量仓库，训练 / 推理时按下标直接切片读取，不再逐张解码。
+
+仓库布局（ImageTensorStore）：
+  images.u8    (N, C, H, W) uint8，np.memmap 直接打开
+  index.jsonl  每行一张图的元数据（id、源路径、原始尺寸、来源格式、窗宽窗位、错误信息）
+  meta.json    入库参数、样本数与指纹；源文件与参数未变时 build() 直接复用
+
+用法：
+    from src.utils.image_ingest import IngestConfig, ImageTensorStore
+
+    store = ImageTensorStore.build(image_paths, "data/iu_xray_store", IngestConfig(size=(512, 512), channels=3),
+                                   num_workers=8)
+    batch = store.batch([0, 5, 9])                        # (3, 3, 512, 512) uint8，零解码
+    pixel_values = store.to_model_input(batch)            # float32 torch 张量，按 image_mean/std 标准化
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+STORE_VERSION = 1
+DICOM_SUFFIXES = (".dcm", ".dicom")
+
+
+@dataclasses.dataclass(frozen=True)
+class IngestConfig:
+    """
+    size: 输出 (H, W)；channels: 1 为灰度，3 为复制成 RGB（多模态模型的输入格式）
+    keep_aspect: True 时等比缩放后居中补 0，False 时直接拉伸
+    percentiles: 没有 DICOM 窗宽窗位或为 16 位图时，按该百分位裁剪后线性映射到 0..255
+    image_mean / image_std: to_model_input() 标准化参数（0..1 尺度），默认为 CLIP / Qwen-VL 的取值
+    """
+    size: tuple = (512, 512)
+    channels: int = 3
+    keep_aspect: bool = True
+    percentiles: tuple = (0.5, 99.5)
+    image_mean: tuple = (0.48145466, 0.4578275, 0.40821073)
+    image_std: tuple = (0.26862954, 0.26130258, 0.27577711)
+
+    @classmethod
+    def from_image_processor(cls, image_processor, **overrides):
+        """从 transformers 图像处理器读取 size / image_mean / image_std（固定尺寸的处理器，如 CLIP、SigLIP）"""
+        size = getattr(image_processor, "size", None) or {}
+        if "height" in size:
+            hw = (size["height"], size["width"])
+        else:
+            edge = size.get("shortest_edge", 512)
+            hw = (edge, edge)
+        kwargs = {"size": hw}
+        for name in ("image_mean", "image_std"):
+            value = getattr(image_processor, name, None)
+            if value is not None:
+                kwargs[name] = tuple(value)
+        return cls(**(kwargs | overrides))
+
+
+def window_to_uint8(pixels, center=None, width=None, percentiles=(0.5, 99.5)):
+    """
+    灰度像素 -> uint8。给定窗位 center / 窗宽 width 时按 DICOM 线性 VOI 变换，否则按百分位裁剪。
+    返回 (uint8 数组, (low, high))。
+    """
+    pixels = pixels.astype(np.float32, copy=False)
+    if center is not None and width is not None and width > 1:
+        low, high = center - 0.5 - (width - 1) / 2, center - 0.5 + (width - 1) / 2
+    else:
+        # 百分位用抽样估计，大图上比全量 percentile 快一个数量级
+        step = max(1, pixels.size // 65536)
+        low, high = np.percentile(pixels.reshape(-1)[::step], percentiles)
+    if high <= low:
+        high = low + 1.0
+    scaled = (pixels - low) * (255.0 / (high - low))
+    return np.clip(scaled, 0, 255).astype(np.uint8), (float(low), float(high))
+
+
+def _first(value):
+    """DICOM 多值字段（如多组窗宽窗位）取第一组"""
+    if value is None:
+        return None
+    try:
+        return float(value[0])
+    except TypeError:
+        return float(value)
+
+
+def decode_dicom(path, config):
+    """读取 DICOM：Rescale Slope/Intercept -> 窗宽窗位 -> MONOCHROME1 反相，返回 (uint8 灰度, 元数据)"""
+    try:
+        import pydicom
+    except ImportError:
+        raise ImportError("读取 DICOM 需要 pydicom：pip install pydicom") from None
+
+    ds = pydicom.dcmread(path)
+    pixels = ds.pixel_array.astype(np.float32)
+    if pixels.ndim == 3:  # 多帧只取第一帧
+        pixels = pixels[0]
+    pixels = pixels * float(getattr(ds, "RescaleSlope", 1) or 1) + float(getattr(ds, "RescaleIntercept", 0) or 0)
+    center, width = _first(getattr(ds, "WindowCenter", None)), _first(getattr(ds, "WindowWidth", None))
+    gray, window = window_to_uint8(pixels, center, width, config.percentiles)
+    photometric = str(getattr(ds, "PhotometricInterpretation", "MONOCHROME2"))
+    if photometric == "MONOCHROME1":
+        gray = 255 - gray
+    return gray, {"format": "dicom", "orig_size": list(pixels.shape), "window": window, "photometric": photometric,
+                  "modality": str(getattr(ds, "Modality", ""))}
+
+
+def decode_pil(path, config):
+    """读取 PNG / JPEG 等：8 位直接用，16 位按百分位映射；JPEG 用 draft 模式按目标尺寸降采样解码"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        orig_size = [img.height, img.width]
+        if img.format == "JPEG":
+            # DCT 域直接缩小到不小于目标尺寸的 1/2、1/4、1/8，解码量成倍减少
+            img.draft("L", (config.size[1], config.size[0]))
+        if img.mode in ("I;16", "I;16B", "I;16L", "I"):
+            gray, window = window_to_uint8(np.asarray(img), percentiles=config.percentiles)
+        else:
+            gray, window = np.asarray(img.convert("L")), None
+    return gray, {"format": "pil", "orig_size": orig_size, "window": window, "photometric": "MONOCHROME2"}
+
+
+def resize_gray(gray, config):
+    """uint8 灰度 -> 目标 (H, W)；keep_aspect 时等比缩放并居中补 0"""
+    from PIL import Image
+
+    target_h, target_w = config.size
+    img = Image.fromarray(gray)
+    if not config.keep_aspect:
+        return np.asarray(img.resize((target_w, target_h), Image.BILINEAR, reducing_gap=2.0))
+    scale = min(target_h / img.height, target_w / img.width)
+    new_w, new_h = max(1, round(img.width * scale)), max(1, round(img.height * scale))
+    resized = np.asarray(img.resize((new_w, new_h), Image.BILINEAR, reducing_gap=2.0))
+    out = np.zeros((target_h, target_w), dtype=np.uint8)
+    top, left = (target_h - new_h) // 2, (target_w - new_w) // 2
+    out[top:top + new_h, left:left + new_w] = resized
+    return out
+
+
+def preprocess_image(path, config):
+    """单张影像 -> ((C, H, W) uint8, 元数据)"""
+    decode = decode_dicom if str(path).lower().endswith(DICOM_SUFFIXES) else decode_pil
+    gray, info = decode(path, config)
+    resized = resize_gray(gray, config)
+    return np.broadcast_to(resized, (config.channels, *config.size)), info
+
+
+# ---- 进程池 worker：每个进程打开一次 memmap，像素直接写进仓库，只把元数据传回主进程 ----
+_worker = {}
+
+
+def _init_worker(images_path, shape, config):
+    _worker["images"] = np.memmap(images_path, dtype=np.uint8, mode="r+", shape=shape)
+    _worker["config"] = config
+
+
+def _ingest_chunk(chunk):
+    images, config = _worker["images"], _worker["config"]
+    results = []
+    for row, image_id, path in chunk:
+        try:
+            pixels, info = preprocess_image(path, config)
+            images[row] = pixels
+            results.append((row, {"id": image_id, "path": path, **info, "error": None}))
+        except Exception as e:
+            results.append((row, {"id": image_id, "path": path, "error": f"{type(e).__name__}: {e}"}))
+    images.flush()
+    return results
+
+
+def _normalize_sources(sources):
+    """路径列表或 (id, 路径) 列表 -> [(id, 路径)]；id 默认取文件名（不含扩展名）"""
+    items = []
+    for source in sources:
+        if isinstance(source, (tuple, list)):
+            items.append((str(source[0]), os.fspath(source[1])))
+        else:
+            path = os.fspath(source)
+            items.append((os.path.splitext(os.path.basename(path))[0], path))
+    return items
+
+
+def source_fingerprint(items, config):
+    # image_mean / image_std 只在读取时使用，改动它们不需要重新入库
+    pixel_params = {k: v for k, v in dataclasses.asdict(config).items() if k not in ("image_mean", "image_std")}
+    h = hashlib.sha1(f"{STORE_VERSION}:{json.dumps(pixel_params, sort_keys=True)}".encode())
+    for image_id, path in items:
+        try:
+            st = os.stat(path)
+            state = f"{st.st_size}\0{st.st_mtime_ns}"
+        except OSError as e:
+            # 缺失或无权限的文件照常入库为失败行（index 中记录 error），文件恢复后指纹随之变化
+            state = f"error\0{e.errno}"
+        h.update(f"{image_id}\0{path}\0{state}\n".encode())
+    return h.hexdigest()
+
+
+def _write_meta(meta_path, meta):
+    """先写临时文件再替换，meta.json 要么是旧的完整内容，要么是新的完整内容"""
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+class ImageTensorStore:
+    """固定形状 uint8 影像的内存映射仓库，见模块说明"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.config = IngestConfig(**{k: tuple(v) if isinstance(v, list) else v
+                                      for k, v in self.meta["config"].items()})
+        shape = tuple(self.meta["shape"])
+        self.images = np.memmap(os.path.join(path, "images.u8"), dtype=np.uint8, mode="r", shape=shape) \
+            if shape[0] else np.zeros(shape, dtype=np.uint8)
+        with open(os.path.join(path, "index.jsonl"), "r", encoding="utf-8") as f:
+            self.index = [json.loads(line) for line in f]
+        self._rows = None
+
+    @classmethod
+    def build(cls, sources, store_dir, config=None, num_workers=None, chunk_size=32):
+        """
+        并行预处理 sources（路径或 (id, 路径)）写入 store_dir；指纹未变时直接打开已有仓库。
+        单张失败不影响整体：该行像素为 0，index 中记录 error，可用 valid_rows() 过滤。
+        """
+        config = config or IngestConfig()
+        items = _normalize_sources(sources)
+        fingerprint = source_fingerprint(items, config)
+        meta_path = os.path.join(store_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("fingerprint") == fingerprint:
+                config_json = json.loads(json.dumps(dataclasses.asdict(config)))
+                if meta["config"] != config_json:  # 只有标准化参数变了
+                    meta["config"] = config_json
+                    _write_meta(meta_path, meta)
+                return cls(store_dir)
+            # 先作废旧的 meta.json：重写 images.u8 中途中断后，再用旧的输入构建不能匹配上写了一半的数据
+            os.remove(meta_path)
+
+        os.makedirs(store_dir, exist_ok=True)
+        shape = (len(items), config.channels, *config.size)
+        images_path = os.path.join(store_dir, "images.u8")
+        # 预分配（稀疏文件），各 worker 按行号直接写入
+        with open(images_path, "wb") as f:
+            f.truncate(int(np.prod(shape)))
+        num_workers = num_workers or os.cpu_count() or 1
+        chunks = [[(row, *items[row]) for row in range(start, min(start + chunk_size, len(items)))]
+                  for start in range(0, len(items), chunk_size)]
+
+        start = time.perf_counter()
+        index = [None] * len(items)
+        if chunks:
+            if num_workers == 1:
+                _init_worker(images_path, shape, config)
+                results = map(_ingest_chunk, chunks)
+            else:
+                pool = ProcessPoolExecutor(num_workers, initializer=_init_worker,
+                                           initargs=(images_path, shape, config))
+                results = pool.map(_ingest_chunk, chunks)
+            try:
+                for chunk_results in results:
+                    for row, info in chunk_results:
+                        index[row] = info
+            finally:
+                if num_workers != 1:
+                    pool.shutdown()
+                _worker.clear()
+        elapsed = time.perf_counter() - start
+
+        with open(os.path.join(store_dir, "index.jsonl"), "w", encoding="utf-8") as f:
+            for info in index:
+                f.write(json.dumps(info, ensure_ascii=False) + "\n")
+        failed = sum(1 for info in index if info["error"])
+        # meta.json 最后写入，存在即表示 images.u8 与 index.jsonl 完整
+        _write_meta(meta_path, {"fingerprint": fingerprint, "version": STORE_VERSION,
+                                "config": dataclasses.asdict(config), "shape": list(shape), "num_images": len(items),
+                                "failed": failed, "build_seconds": round(elapsed, 3)})
+        return cls(store_dir)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, row):
+        """(C, H, W) uint8 只读视图"""
+        return self.images[row]
+
+    def batch(self, rows):
+        """按行号取一批，返回连续的 (B, C, H, W) uint8 数组；行号排序后读取对磁盘更友好"""
+        rows = np.asarray(rows)
+        order = np.argsort(rows, kind="stable")
+        out = np.empty((len(rows), *self.images.shape[1:]), dtype=np.uint8)
+        out[order] = self.images[rows[order]]
+        return out
+
+    def row_of(self, image_id):
+        if self._rows is None:
+            self._rows = {info["id"]: row for row, info in enumerate(self.index)}
+        return self._rows[image_id]
+
+    def by_id(self, image_id):
+        return self.images[self.row_of(image_id)]
+
+    def valid_rows(self):
+        return [row for row, info in enumerate(self.index) if not info["error"]]
+
+    def to_model_input(self, batch, device=None, dtype=None):
+        """uint8 (B, C, H, W) -> 按 image_mean / image_std 标准化的 float 张量（torch 在此才导入）"""
+        import torch
+
+        x = torch.from_numpy(np.ascontiguousarray(batch))
+        if device is not None:
+            x = x.to(device, non_blocking=True)  # 以 uint8 传输，体积是 float32 的 1/4
+        dtype = dtype or torch.float32
+        channels = x.shape[1]
+        mean = torch.tensor(self.config.image_mean[:channels], dtype=dtype, device=x.device).view(1, -1, 1, 1)
+        std = torch.tensor(self.config.image_std[:channels], dtype=dtype, device=x.device).view(1, -1, 1, 1)
+        # (x / 255 - mean) / std 合并为一次 x * scale + bias
+        return torch.addcmul(-mean / std, x.to(dtype), 1.0 / (255.0 * std))
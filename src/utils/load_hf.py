@@ -1,44 +1,79 @@
+"""
+Hugging Face 模型 / 数据集下载。
+
+- setup_environment / download_hf_dataset / download_hf_model：基于 huggingface_hub / datasets 的单仓库下载
+- HubFetcher：按清单（manifest）并发下载多个模型与数据集的原始文件，逐个校验 sha256（LFS）或 git blob id，
+  存进跨项目共享的内容寻址文件库 ArtifactStore（相同内容只存一份），再以硬链接组装出各仓库的快照目录。
+  离线模式（HF_HUB_OFFLINE=1 或 --offline）只从文件库解析上次在线时记录的版本，不发任何请求。
+
+清单格式（JSON）：
+    {"models": ["org/model", {"repo_id": "org/other", "revision": "main", "allow_patterns": ["*.json", "*.safetensors"]}],
+     "datasets": [{"repo_id": "org/data", "ignore_patterns": ["*.md"]}]}
+
+用法（在仓库根目录）：
+    python -m src.utils.load_hf --manifest hf_manifest.json --snapshots ./models
+    python -m src.utils.load_hf --manifest hf_manifest.json --snapshots ./models --offline
+"""
+import argparse
+import dataclasses
+import fnmatch
+import hashlib
+import json
 import os
+import shutil
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from dotenv import load_dotenv
-from datasets import load_dataset
-from huggingface_hub import login, snapshot_download
 
+from config.settings import get_settings
+from src.utils import telemetry
 
-def setup_environment(use_mirror=True):
-    """配置环境：Token、镜像站及加速器"""
-    load_dotenv()
-    token = os.getenv("HUGGING_FACE_TOKEN")
 
-    if not token:
-        raise ValueError("错误：未在 .env 文件中找到 HUGGING_FACE_TOKEN")
-
-    login(token=token)
+def setup_environment(use_mirror=None):
+    """配置环境：Token、镜像站及加速器（use_mirror 默认取 HF_USE_MIRROR）"""
+    settings = get_settings()
+    token = settings.require("hf_token")
+    if use_mirror is None:
+        use_mirror = settings.hf_use_mirror
 
+    # huggingface_hub 在导入时读取 HF_ENDPOINT / HF_HUB_ENABLE_HF_TRANSFER，必须先设置环境变量再导入
     if use_mirror:
-        os.environ["HF_ENDPOINT"] = "https://hf-mirror.com"
+        os.environ["HF_ENDPOINT"] = settings.hf_mirror_endpoint
         print("已启用 HF 镜像站加速")
 
     # 开启极速下载模式（底层由 Rust 编写，远快于默认的 Python 下载器）
     os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"
     print("已开启 HF_TRANSFER 并发加速模式")
 
+    from huggingface_hub import login
+
+    login(token=token)
+
 
 def download_hf_dataset(repo_id, config_name=None, cache_dir="cache"):
     """
     下载数据集。datasets 库默认自带 tqdm 进度条。
     """
+    from datasets import load_dataset
+
     print(f"开始处理数据集: {repo_id} (Config: {config_name})")
     try:
-        ds = load_dataset(
-            repo_id,
-            config_name,
-            cache_dir=cache_dir,
-            num_proc=4  # 多进程处理提升加载速度
-        )
+        with telemetry.span("hf.download", labels={"kind": "dataset"}, repo_id=repo_id, config=config_name):
+            ds = load_dataset(
+                repo_id,
+                config_name,
+                cache_dir=cache_dir,
+                num_proc=4  # 多进程处理提升加载速度
+            )
+        telemetry.inc("hf_downloads_total", kind="dataset", status="ok")
         print(f"数据集加载成功，样本量: {len(ds['train'])}")
         return ds
     except Exception as e:
+        telemetry.inc("hf_downloads_total", kind="dataset", status="failed")
         print(f"数据集下载失败: {e}")
         return None
 
@@ -47,24 +82,444 @@ def download_hf_model(model_id, cache_dir="models"):
     """
     下载大模型。snapshot_download 提供更直观的进度反馈。
     """
+    from huggingface_hub import snapshot_download
+
     print(f"开始下载模型: {model_id}")
     try:
-        model_path = snapshot_download(
-            repo_id=model_id,
-            cache_dir=cache_dir,
-            ignore_patterns=["*.msgpack", "*.h5", "*.ot"],  # 排除非必要格式节省空间
-            resume_download=True
-        )
+        with telemetry.span("hf.download", labels={"kind": "model"}, repo_id=model_id):
+            model_path = snapshot_download(
+                repo_id=model_id,
+                cache_dir=cache_dir,
+                ignore_patterns=["*.msgpack", "*.h5", "*.ot"],  # 排除非必要格式节省空间
+                resume_download=True
+            )
+        telemetry.inc("hf_downloads_total", kind="model", status="ok")
+        telemetry.observe("hf_download_bytes", _dir_bytes(model_path), buckets=telemetry.BYTE_BUCKETS, kind="model")
         print(f"模型已存至: {model_path}")
         return model_path
     except Exception as e:
+        telemetry.inc("hf_downloads_total", kind="model", status="failed")
         print(f"模型下载失败: {e}")
         return None
 
 
+def _dir_bytes(path):
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class FetchError(Exception):
+    """清单中有文件下载或校验失败；report 为完整的下载报告"""
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+class ChecksumError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class ManifestEntry:
+    kind: str  # "model" / "dataset"
+    repo_id: str
+    revision: str = "main"
+    allow_patterns: tuple = ()
+    ignore_patterns: tuple = ()
+
+    @property
+    def key(self):
+        return f"{self.kind}:{self.repo_id}@{self.revision}"
+
+    def wants(self, path):
+        if self.allow_patterns and not any(fnmatch.fnmatch(path, p) for p in self.allow_patterns):
+            return False
+        return not any(fnmatch.fnmatch(path, p) for p in self.ignore_patterns)
+
+
+@dataclasses.dataclass(frozen=True)
+class RemoteFile:
+    path: str
+    size: int
+    git_oid: str  # git blob sha1（非 LFS 文件以此校验）
+    sha256: str = None  # LFS 文件的内容 sha256
+
+
+def load_manifest(path_or_dict):
+    """读取清单，返回 [ManifestEntry]；条目可以是仓库名字符串或字典"""
+    data = path_or_dict
+    if not isinstance(data, dict):
+        with open(path_or_dict, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    entries = []
+    for section, kind in (("models", "model"), ("datasets", "dataset")):
+        for item in data.get(section, []):
+            item = {"repo_id": item} if isinstance(item, str) else dict(item)
+            for field in ("allow_patterns", "ignore_patterns"):
+                item[field] = tuple(item.get(field) or ())
+            entries.append(ManifestEntry(kind=kind, **item))
+    return entries
+
+
+def git_blob_hasher(size):
+    """按 git blob 规则计算 sha1 的哈希对象：sha1("blob <size>\\0" + 内容)，需预先知道文件大小"""
+    h = hashlib.sha1()
+    h.update(f"blob {size}\0".encode())
+    return h
+
+
+class ArtifactStore:
+    """
+    内容寻址文件库：objects/<sha256 前两位>/<sha256>，SQLite 索引记录
+    - objects：sha256、大小、git blob id（非 LFS 文件据此判断是否已有）
+    - refs：(类型, 仓库, 版本) -> 解析出的 commit 及其文件列表，离线模式据此组装快照
+    多个项目指向同一个 root 即可共享；同一内容只存一份，快照目录用硬链接指向对象（跨盘时退化为复制）。
+    """
+
+    def __init__(self, root):
+        self.root = os.path.expanduser(root)
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " sha256 TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " git_oid TEXT,"
+            " added_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_objects_git_oid ON objects (git_oid)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            " kind TEXT NOT NULL,"
+            " repo_id TEXT NOT NULL,"
+            " revision TEXT NOT NULL,"
+            " commit_sha TEXT NOT NULL,"
+            " files TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, repo_id, revision))"
+        )
+        self._conn.commit()
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def tmp_path(self):
+        return os.path.join(self.root, "tmp", f"{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}")
+
+    def resolve(self, remote):
+        """已入库时返回该远程文件对应的 sha256，否则返回 None"""
+        with self._lock:
+            if remote.sha256:
+                row = self._conn.execute("SELECT sha256 FROM objects WHERE sha256=?", (remote.sha256,)).fetchone()
+            else:
+                row = self._conn.execute("SELECT sha256 FROM objects WHERE git_oid=?", (remote.git_oid,)).fetchone()
+        if row and os.path.exists(self.object_path(row[0])):
+            return row[0]
+        return None
+
+    def ingest(self, tmp_path, sha256, size, git_oid=None):
+        """把已校验的临时文件移入对象目录（已存在则丢弃临时文件）"""
+        dest = self.object_path(sha256)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if os.path.exists(dest):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, dest)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO objects (sha256, size, git_oid, added_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET git_oid=COALESCE(objects.git_oid, excluded.git_oid)",
+                (sha256, size, git_oid, time.time()),
+            )
+            self._conn.commit()
+
+    def set_ref(self, entry, commit_sha, files):
+        """files: {仓库内路径: sha256}"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO refs (kind, repo_id, revision, commit_sha, files, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (entry.kind, entry.repo_id, entry.revision, commit_sha, json.dumps(files, sort_keys=True), time.time()),
+            )
+            self._conn.commit()
+
+    def get_ref(self, entry):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT commit_sha, files FROM refs WHERE kind=? AND repo_id=? AND revision=?",
+                (entry.kind, entry.repo_id, entry.revision),
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else (None, None)
+
+    def materialize(self, entry, commit_sha, files, snapshot_root):
+        """在 snapshot_root/<类型>s/<仓库>/<commit> 下按仓库路径组装快照，返回目录"""
+        dest_root = os.path.join(snapshot_root, f"{entry.kind}s", *entry.repo_id.split("/"), commit_sha)
+        os.makedirs(dest_root, exist_ok=True)
+        for rel_path, sha256 in files.items():
+            dest = os.path.join(dest_root, *rel_path.split("/"))
+            src = self.object_path(sha256)
+            if os.path.exists(dest):
+                if os.path.samefile(src, dest):
+                    continue
+                os.remove(dest)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            try:
+                os.link(src, dest)
+            except OSError:
+                shutil.copy2(src, dest)
+        return dest_root
+
+    def stats(self):
+        with self._lock:
+            objects, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return {"objects": objects, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HubFetcher:
+    """
+    清单驱动的并发下载器：
+    - 每个仓库先请求 /api/{models|datasets}/<repo>/revision/<rev>?blobs=true 得到 commit 与文件列表（含大小、
+      LFS sha256、git blob id），按 allow/ignore 过滤后，所有仓库的文件放进同一个线程池下载
+    - 下载前先查文件库：内容已存在（包括其它仓库、其它项目下载过的同一文件）直接复用；同一内容同时被多个仓库
+      需要时按内容加锁，只下载一次
+    - 边下载边计算 sha256 与 git blob sha1，大小或哈希不符视为损坏，重试 max_retries 次后记为失败
+    - 某仓库所有文件就绪后记录 refs 并组装快照目录；有失败时 fetch() 抛 FetchError（附完整报告），不再只打印
+    - offline=True 时完全不联网，按 refs 从文件库组装快照
+    """
+
+    def __init__(self, store, snapshot_root, endpoint=None, token=None, max_workers=8, max_retries=3,
+                 offline=None, timeout=30):
+        settings = get_settings()
+        self.store = store
+        self.snapshot_root = snapshot_root
+        self.endpoint = (endpoint or settings.hf_endpoint).rstrip("/")
+        self.token = settings.hf_token if token is None else token
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.offline = settings.hf_offline if offline is None else offline
+        self.timeout = timeout
+        self._session = None
+        self._key_locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self.counters = {"api_requests": 0, "file_requests": 0, "downloaded_files": 0, "downloaded_bytes": 0,
+                         "reused_files": 0, "checksum_errors": 0}
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            if self.token:
+                self._session.headers["Authorization"] = f"Bearer {self.token}"
+        return self._session
+
+    def _count(self, name, value=1):
+        with self._counters_lock:
+            self.counters[name] += value
+
+    def _key_lock(self, key):
+        with self._locks_guard:
+            return self._key_locks[key]
+
+    def _repo_prefix(self, entry):
+        return "datasets/" if entry.kind == "dataset" else ""
+
+    def list_files(self, entry):
+        """返回 (commit sha, [RemoteFile])，已按清单的 allow/ignore 过滤"""
+        quoted_rev = urllib.parse.quote(entry.revision, safe="")
+        url = f"{self.endpoint}/api/{entry.kind}s/{entry.repo_id}/revision/{quoted_rev}"
+        self._count("api_requests")
+        with telemetry.span("hf.list_files", labels={"kind": entry.kind}, repo_id=entry.repo_id):
+            resp = self.session.get(url, params={"blobs": "true"}, timeout=self.timeout)
+        resp.raise_for_status()
+        info = resp.json()
+        files = []
+        for sibling in info.get("siblings", []):
+            if not entry.wants(sibling["rfilename"]):
+                continue
+            lfs = sibling.get("lfs") or {}
+            files.append(RemoteFile(path=sibling["rfilename"], size=lfs.get("size", sibling.get("size")),
+                                    git_oid=sibling.get("blobId"), sha256=lfs.get("sha256")))
+        return info["sha"], files
+
+    def _download_once(self, url, remote):
+        tmp = self.store.tmp_path()
+        sha256, sha1 = hashlib.sha256(), git_blob_hasher(remote.size)
+        size = 0
+        try:
+            self._count("file_requests")
+            with self.session.get(url, stream=True, timeout=self.timeout) as resp:
+                resp.raise_for_status()
+                with open(tmp, "wb") as f:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        sha256.update(chunk)
+                        sha1.update(chunk)
+                        size += len(chunk)
+            digest = sha256.hexdigest()
+            if remote.size is not None and size != remote.size:
+                raise ChecksumError(f"大小不符：期望 {remote.size}，实际 {size}")
+            if remote.sha256 and digest != remote.sha256:
+                raise ChecksumError("sha256 不符")
+            if not remote.sha256 and remote.git_oid and sha1.hexdigest() != remote.git_oid:
+                raise ChecksumError("git blob id 不符")
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.store.ingest(tmp, digest, size, remote.git_oid)
+        return digest, size
+
+    def fetch_file(self, entry, commit_sha, remote):
+        """确保文件在库中，返回 sha256；已存在时不发请求"""
+        sha = self.store.resolve(remote)
+        if sha:
+            self._count("reused_files")
+            telemetry.inc("hf_fetch_files_total", status="reused")
+            return sha
+        with self._key_lock(remote.sha256 or remote.git_oid or f"{entry.key}/{remote.path}"):
+            sha = self.store.resolve(remote)  # 等锁期间可能已被另一个仓库下载
+            if sha:
+                self._count("reused_files")
+                telemetry.inc("hf_fetch_files_total", status="reused")
+                return sha
+            path = urllib.parse.quote(remote.path)
+            url = f"{self.endpoint}/{self._repo_prefix(entry)}{entry.repo_id}/resolve/{commit_sha}/{path}"
+            last_error = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with telemetry.span("hf.fetch_file", labels={"kind": entry.kind}, path=remote.path):
+                        sha, size = self._download_once(url, remote)
+                    self._count("downloaded_files")
+                    self._count("downloaded_bytes", size)
+                    telemetry.inc("hf_fetch_files_total", status="downloaded")
+                    telemetry.observe("hf_fetch_bytes", size, buckets=telemetry.BYTE_BUCKETS)
+                    return sha
+                except ChecksumError as e:
+                    self._count("checksum_errors")
+                    last_error = e
+                except Exception as e:  # 网络错误等，退避后重试
+                    last_error = e
+                if attempt < self.max_retries:
+                    time.sleep(min(0.5 * 2 ** attempt, 8.0))
+            telemetry.inc("hf_fetch_files_total", status="failed")
+            raise FetchError(f"{entry.key} {remote.path}: {last_error}")
+
+    def _fetch_offline(self, entries, report):
+        for entry in entries:
+            commit_sha, files = self.store.get_ref(entry)
+            if commit_sha is None:
+                report["failed"][entry.key] = ["离线模式下文件库中没有该仓库的记录"]
+                continue
+            missing = [p for p, sha in files.items() if not os.path.exists(self.store.object_path(sha))]
+            if missing:
+                report["failed"][entry.key] = [f"文件库缺少对象: {p}" for p in missing]
+                continue
+            report["snapshots"][entry.key] = self.store.materialize(entry, commit_sha, files, self.snapshot_root)
+
+    def fetch(self, entries, raise_on_error=True):
+        """下载清单中的全部仓库，返回报告（各仓库快照目录、下载 / 复用统计、失败明细）"""
+        start = time.perf_counter()
+        report = {"snapshots": {}, "failed": {}}
+        if self.offline:
+            self._fetch_offline(entries, report)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                listings = {pool.submit(self.list_files, entry): entry for entry in entries}
+                file_futures = {}
+                # 列表返回即记下版本：没有文件匹配 allow/ignore 规则的仓库同样登记版本并生成（空）快照
+                commits = {}
+                for future in as_completed(listings):
+                    entry = listings[future]
+                    try:
+                        commit_sha, remotes = future.result()
+                    except Exception as e:
+                        report["failed"][entry.key] = [f"获取文件列表失败: {e}"]
+                        continue
+                    commits[entry] = commit_sha
+                    for remote in remotes:
+                        file_futures[pool.submit(self.fetch_file, entry, commit_sha, remote)] = (
+                            entry, commit_sha, remote)
+
+                resolved = defaultdict(dict)
+                for future in as_completed(file_futures):
+                    entry, commit_sha, remote = file_futures[future]
+                    try:
+                        resolved[entry][remote.path] = future.result()
+                    except FetchError as e:
+                        report["failed"].setdefault(entry.key, []).append(str(e))
+
+            for entry, commit_sha in commits.items():
+                if entry.key not in report["failed"]:
+                    self.store.set_ref(entry, commit_sha, resolved[entry])
+                    report["snapshots"][entry.key] = self.store.materialize(
+                        entry, commit_sha, resolved[entry], self.snapshot_root)
+
+        report.update(self.counters, offline=self.offline, elapsed_s=round(time.perf_counter() - start, 3),
+                      store=self.store.stats())
+        if report["failed"] and raise_on_error:
+            raise FetchError(f"{len(report['failed'])} 个仓库未能完整下载: {sorted(report['failed'])}", report)
+        return report
+
+
+def fetch_manifest(manifest, snapshot_root="models", store_dir=None, **fetcher_kwargs):
+    """按清单下载（或离线解析）全部仓库，返回报告；store_dir 默认取 MED_LLM_HF_STORE"""
+    entries = load_manifest(manifest)
+    with ArtifactStore(store_dir or get_settings().hf_store_dir) as store:
+        return HubFetcher(store, snapshot_root, **fetcher_kwargs).fetch(entries)
+
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest", help="JSON 清单；不给时运行下方的单仓库示例")
+    parser.add_argument("--snapshots", default="models", help="快照目录")
+    parser.add_argument("--store", default=None, help="共享文件库目录（默认 MED_LLM_HF_STORE）")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--offline", action="store_true", default=None, help="只从文件库解析，不联网")
+    args = parser.parse_args()
+
+    if args.manifest:
+        try:
+            report = fetch_manifest(args.manifest, args.snapshots, args.store, max_workers=args.workers,
+                                    offline=args.offline)
+        except FetchError as e:
+            print(f"❌ {e}")
+            for key, errors in (e.report or {}).get("failed", {}).items():
+                for error in errors:
+                    print(f"   {key}: {error}")
+            raise SystemExit(1)
+        for key, path in report["snapshots"].items():
+            print(f"✅ {key} -> {path}")
+        print(f"📦 下载 {report['downloaded_files']} 个文件（{report['downloaded_bytes'] / 1024 ** 2:.1f}MB），"
+              f"复用 {report['reused_files']} 个，耗时 {report['elapsed_s']}s，文件库 {report['store']['objects']} 个对象")
+        telemetry.report("下载埋点")
+        telemetry.flush()
+        return
+
     # 1. 初始化
-    setup_environment(use_mirror=True)
+    setup_environment()
 
     # 2. 数据集下载示例 (MedTrinity)
     # dataset_id = "UCSC-VLAA/MedTrinity-25M"
@@ -75,6 +530,9 @@ def main():
     # model_id = "microsoft/Phi-3-vision-128k-instruct"
     # download_hf_model(model_id, cache_dir="./models")
 
+    telemetry.report("下载埋点")
+    telemetry.flush()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,347 @@
+"""
+轻量埋点：span 计时（上下文管理器 / 装饰器）、计数器与直方图，导出为 JSONL 事件流与 Prometheus 文本格式。
+
+默认关闭，关闭时 span() 返回共享的空对象、inc()/observe() 第一行即返回，开销只有一次属性判断。
+开启方式：环境变量 MED_LLM_TELEMETRY=1，或代码中 telemetry.configure(enabled=True, ...)。
+  MED_LLM_TELEMETRY_JSONL   每个 span 结束时追加一行 JSON（含耗时、属性、父 span）
+  MED_LLM_METRICS_PATH      flush() 时写出 Prometheus 文本格式（node_exporter textfile 可直接采集）
+
+用法：
+    from src.utils import telemetry
+
+    with telemetry.span("ocr.request", labels={"api": "ocrtransapi"}, image=name) as sp:
+        res = request(...)
+        sp.set(error_code=res.get("errorCode"))
+    telemetry.inc("ocr_requests_total", code=res.get("errorCode"))
+    telemetry.observe("ocr_upload_bytes", len(payload), buckets=telemetry.BYTE_BUCKETS)
+
+    @telemetry.timed("tts.synthesize")
+    def synthesize(chunk): ...
+
+    telemetry.flush()   # 写出 Prometheus 文件并刷新 JSONL
+"""
+import atexit
+import bisect
+import functools
+import itertools
+import json
+import math
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1KB .. 256MB
+
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _bucket_bounds(buckets):
+    return [str(int(b)) if float(b).is_integer() else repr(float(b)) for b in buckets] + ["+Inf"]
+
+
+class Histogram:
+    """固定桶直方图（累计计数在导出时计算），另记 sum / count / max"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按桶上界估计分位数（与 Prometheus histogram_quantile 同样的粗粒度）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, cumulative in zip(self.buckets, itertools.accumulate(self.counts)):
+            if cumulative >= rank:
+                return bound
+        return self.max
+
+
+class Registry:
+    """计数器与直方图的线程安全登记表；键为 (指标名, 排序后的标签元组)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, labels=None):
+        key = (_metric_name(name), _label_key(labels or {}))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS):
+        key = (_metric_name(name), _label_key(labels or {}))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(k), "value": v} for (n, k), v in sorted(self.counters.items())],
+                "histograms": [
+                    {"name": n, "labels": dict(k), "count": h.count, "sum": round(h.sum, 6), "max": round(h.max, 6),
+                     "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                    for (n, k), h in sorted(self.histograms.items())
+                ],
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, key), value in sorted(self.counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(key)} {value}")
+            for (name, key), hist in sorted(self.histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                for bound, cumulative in zip(_bucket_bounds(hist.buckets), itertools.accumulate(hist.counts)):
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+class JsonlExporter:
+    """span 事件追加写入 JSONL；行缓冲在内存中，满 buffer_size 行或 flush() 时落盘"""
+
+    def __init__(self, path, buffer_size=256):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._buffer = []
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def emit(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.buffer_size:
+                self._write_locked()
+
+    def _write_locked(self):
+        if self._buffer:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._write_locked()
+
+
+class Span:
+    """一次计时；结束时把耗时记入 <name>_seconds 直方图，并（若配置）写出一条 JSONL 事件"""
+
+    __slots__ = ("name", "labels", "attrs", "span_id", "parent_id", "start_wall", "_start", "duration")
+
+    def __init__(self, name, labels, attrs):
+        self.name = name
+        self.labels = labels
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        self.parent_id = stack[-1].span_id if stack else None
+        stack.append(self)
+        self.start_wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        _local.stack.pop()
+        labels = dict(self.labels)
+        if exc_type is not None:
+            labels["outcome"] = "error"
+        _registry.observe(f"{self.name}_seconds", self.duration, labels)
+        if _state.exporter is not None:
+            event = {"type": "span", "name": self.name, "span_id": self.span_id, "parent_id": self.parent_id,
+                     "thread": threading.current_thread().name, "start": round(self.start_wall, 6),
+                     "duration_s": round(self.duration, 6), "labels": self.labels, "attrs": self.attrs}
+            if exc_type is not None:
+                event["error"] = f"{exc_type.__name__}: {exc}"
+            _state.exporter.emit(event)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+    duration = None
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.exporter = None
+        self.prometheus_path = None
+
+
+_NOOP = _NoopSpan()
+_span_ids = itertools.count(1)
+_local = threading.local()
+_state = _State()
+_registry = Registry()
+
+
+def configure(enabled=True, jsonl_path=None, prometheus_path=None):
+    """开启 / 关闭埋点；jsonl_path 为 span 事件流，prometheus_path 为 flush() 写出的指标文件"""
+    if _state.exporter is not None:
+        _state.exporter.flush()
+    _state.enabled = enabled
+    _state.exporter = JsonlExporter(jsonl_path) if enabled and jsonl_path else None
+    _state.prometheus_path = prometheus_path if enabled else None
+
+
+def configure_from_env():
+    flag = os.getenv("MED_LLM_TELEMETRY", "").strip().lower()
+    if flag in ("1", "true", "yes", "on"):
+        configure(True, os.getenv("MED_LLM_TELEMETRY_JSONL") or None, os.getenv("MED_LLM_METRICS_PATH") or None)
+
+
+def enabled():
+    return _state.enabled
+
+
+def registry():
+    return _registry
+
+
+def span(name, labels=None, **attrs):
+    """
+    计时上下文管理器。labels 会成为直方图标签（应为低基数，如接口名、状态）；
+    其余关键字参数只写进 JSONL 事件（可以是文件名等高基数信息）。
+    """
+    if not _state.enabled:
+        return _NOOP
+    return Span(name, labels or {}, attrs)
+
+
+def timed(name=None, labels=None):
+    """装饰器版 span；name 默认取 模块.函数名"""
+
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, labels or {}, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def inc(name, value=1, **labels):
+    if not _state.enabled:
+        return
+    _registry.inc(name, value, labels)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    if not _state.enabled:
+        return
+    _registry.observe(name, value, labels, buckets)
+
+
+def flush():
+    """刷新 JSONL 缓冲，并把当前指标写成 Prometheus 文本文件（先写临时文件再原子替换）"""
+    if not _state.enabled:
+        return
+    if _state.exporter is not None:
+        _state.exporter.emit({"type": "metrics", "time": round(time.time(), 6), **_registry.snapshot()})
+        _state.exporter.flush()
+    if _state.prometheus_path:
+        path = _state.prometheus_path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_registry.to_prometheus())
+        os.replace(tmp, path)
+
+
+def report(title="埋点统计"):
+    """打印计数器与各 span / 直方图的次数、均值、p50、p99（按桶估计）"""
+    if not _state.enabled:
+        return None
+    snap = _registry.snapshot()
+    print(f"\n📈 {title}")
+    for c in snap["counters"]:
+        print(f"   {c['name']}{_format_labels(_label_key(c['labels']))} = {c['value']}")
+    for h in snap["histograms"]:
+        mean = h["sum"] / h["count"] if h["count"] else math.nan
+        print(f"   {h['name']}{_format_labels(_label_key(h['labels']))} n={h['count']} mean={mean:.4g} "
+              f"p50≤{h['p50']} p99≤{h['p99']} max={h['max']}")
+    return snap
+
+
+def _flush_at_exit():
+    # 进程退出时尽力落盘，目标目录已不存在等情况不应打断退出
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+configure_from_env()
+atexit.register(_flush_at_exit)
@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器，替代固定的 time.sleep。
+    :param rate: 每秒补充的令牌数（即稳定 QPS）
+    :param capacity: 桶容量（允许的瞬时突发请求数），默认等于 rate
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于 0: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1.0):
+        """阻塞直到取得令牌，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class RunStats:
+    """单次运行的吞吐量与延迟统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._end = None
+        self.latencies = []
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def finish(self):
+        self._end = time.perf_counter()
+        return self
+
+    @property
+    def elapsed(self):
+        return (self._end or time.perf_counter()) - self._start
+
+    def percentile(self, p):
+        """最近邻法计算延迟分位数（秒）"""
+        if not self.latencies:
+            return 0.0
+        data = sorted(self.latencies)
+        k = min(len(data) - 1, max(0, int(round(p / 100.0 * len(data) + 0.5)) - 1))
+        return data[k]
+
+    def summary(self):
+        total = self.succeeded + self.failed
+        elapsed = self.elapsed
+        return {
+            "total": total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(total / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_p50_s": round(self.percentile(50), 3),
+            "latency_p90_s": round(self.percentile(90), 3),
+            "latency_p99_s": round(self.percentile(99), 3),
+            "latency_max_s": round(max(self.latencies), 3) if self.latencies else 0.0,
+        }
+
+    def report(self, title="运行统计"):
+        s = self.summary()
+        print(f"\n📊 {title}")
+        print(f"   总数 {s['total']} | 成功 {s['succeeded']} | 失败 {s['failed']} | 重试 {s['retries']}")
+        print(f"   耗时 {s['elapsed_s']}s | 吞吐 {s['throughput_per_s']}/s")
+        print(f"   延迟 p50={s['latency_p50_s']}s p90={s['latency_p90_s']}s "
+              f"p99={s['latency_p99_s']}s max={s['latency_max_s']}s")
+        return s
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """指数退避（带抖动）：第 attempt 次重试前应等待的秒数"""
+    delay = min(cap, base * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
+
+
+def create_session(pool_size):
+    """创建连接池大小与并发数匹配的 HTTP 会话，复用 TCP/TLS 连接"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
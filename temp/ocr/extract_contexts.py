@@ -1,6 +1,14 @@
+"""
+从图片翻译结果 JSON 中提取原文段落，逐文件写出纯文本。
+
+用法（在仓库根目录）：
+    python -m temp.ocr.extract_contexts
+"""
 import json
 import os
 
+from src.utils import telemetry
+
 # -------------------------- 配置项 --------------------------
 JSON_DIR = "results/translated_results/json_results"  # 存放 JSON 的目录
 TEXT_OUTPUT_DIR = "results/translated_results/extracted_contexts"  # 提取后的文本存放目录
@@ -24,41 +32,52 @@ def extract_contexts():
     print(f"🚀 开始处理 {len(json_files)} 个文件...")
 
     for filename in json_files:
-        json_path = os.path.join(JSON_DIR, filename)
-
-        try:
-            with open(json_path, 'r', encoding='utf-8') as jf:
-                data = json.load(jf)
-
-            # 3. 提取 resRegions 中的 context
-            # 根据官方文档，信息存储在 resRegions 列表中
-            if "resRegions" in data:
-                # 提取所有非空的 context 字段
-                contexts = []
-                for region in data["resRegions"]:
-                    text = region.get("context", "").strip()
-                    if text:
-                        contexts.append(text)
-
-                # 4. 保存到 txt 文件
-                if contexts:
-                    # 文件名保持一致，仅后缀改为 .txt
-                    txt_filename = os.path.splitext(filename)[0] + ".txt"
-                    txt_path = os.path.join(TEXT_OUTPUT_DIR, txt_filename)
-
-                    with open(txt_path, 'w', encoding='utf-8') as tf:
-                        tf.write("\n\n".join(contexts))
-
-                    print(f"✅ 处理成功: {filename} -> {txt_filename}")
-                else:
-                    print(f"⚠️  跳过: {filename} (未发现 context 内容)")
-            else:
-                print(f"❌ 错误: {filename} 格式不正确，缺少 resRegions 字段")
-
-        except Exception as e:
-            print(f"❌ 读取文件 {filename} 时发生错误: {str(e)}")
+        with telemetry.span("contexts.file", file=filename):
+            status = _extract_file(filename)
+        telemetry.inc("contexts_files_total", status=status)
 
     print(f"\n✨ 处理完成！所有原文已保存至: {TEXT_OUTPUT_DIR}")
+    telemetry.report("原文提取埋点")
+    telemetry.flush()
+
+
+def _extract_file(filename):
+    """处理单个 JSON，返回状态：ok / empty / invalid / error"""
+    json_path = os.path.join(JSON_DIR, filename)
+    try:
+        telemetry.observe("contexts_json_bytes", os.path.getsize(json_path), buckets=telemetry.BYTE_BUCKETS)
+        with open(json_path, 'r', encoding='utf-8') as jf:
+            data = json.load(jf)
+
+        # 3. 提取 resRegions 中的 context
+        # 根据官方文档，信息存储在 resRegions 列表中
+        if "resRegions" not in data:
+            print(f"❌ 错误: {filename} 格式不正确，缺少 resRegions 字段")
+            return "invalid"
+
+        # 提取所有非空的 context 字段
+        contexts = []
+        for region in data["resRegions"]:
+            text = region.get("context", "").strip()
+            if text:
+                contexts.append(text)
+
+        # 4. 保存到 txt 文件
+        if not contexts:
+            print(f"⚠️  跳过: {filename} (未发现 context 内容)")
+            return "empty"
+
+        # 文件名保持一致，仅后缀改为 .txt
+        txt_filename = os.path.splitext(filename)[0] + ".txt"
+        txt_path = os.path.join(TEXT_OUTPUT_DIR, txt_filename)
+        with open(txt_path, 'w', encoding='utf-8') as tf:
+            tf.write("\n\n".join(contexts))
+        print(f"✅ 处理成功: {filename} -> {txt_filename}")
+        return "ok"
+
+    except Exception as e:
+        print(f"❌ 读取文件 {filename} 时发生错误: {str(e)}")
+        return "error"
 
 
 if __name__ == "__main__":
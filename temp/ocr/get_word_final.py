@@ -1,4 +1,12 @@
+import hashlib
+import json
 import os
+import resource
+import sys
+import time
+import tracemalloc
+
+from PIL import Image
 from docx import Document
 from docx.shared import Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -11,6 +19,14 @@ TRANS_IMG_DIR = os.path.join(BASE_DIR, "translated_images")
 AUDIO_DIR = os.path.join(BASE_DIR, "audio_output")
 OUTPUT_DOCX = "翻译汇总报告_链接版.docx"
 
+# 图片在文档中的显示宽度与目标分辨率：嵌入前先缩放到该像素宽度，避免嵌入全尺寸原图
+DISPLAY_WIDTH_INCHES = 6.0
+DISPLAY_DPI = 150
+THUMB_CACHE_DIR = os.path.join("results", "cache", "thumbnails")
+
+# 单卷文档中图片字节数上限，超过后新条目写入下一卷
+MAX_VOLUME_BYTES = 50 * 1024 ** 2
+
 
 # -----------------------------------------------------------
 
@@ -38,59 +54,279 @@ def add_hyperlink(paragraph, text, url):
     return hyperlink
 
 
-def create_word_report():
-    doc = Document()
-    doc.add_heading('图片翻译与语音合成报告', 0)
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
 
-    # 获取原图并按名称排序
-    img_files = [f for f in os.listdir(ORIGINAL_IMG_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    img_files.sort()
 
-    if not img_files:
-        print(f"⚠️ 错误：在 {ORIGINAL_IMG_DIR} 文件夹中未找到图片。")
-        return
+def display_image(src_path, src_hash=None, max_px=None, cache_dir=THUMB_CACHE_DIR):
+    """
+    返回适合嵌入文档的图片路径：宽度超过显示分辨率的图片缩放后存入缩略图缓存，
+    缓存以源文件哈希 + 目标宽度为键，重复运行直接复用。
+    """
+    max_px = max_px or int(DISPLAY_WIDTH_INCHES * DISPLAY_DPI)
+    src_hash = src_hash or file_sha256(src_path)
+    thumb_path = os.path.join(cache_dir, f"{src_hash}_{max_px}.jpg")
+    if os.path.exists(thumb_path):
+        return thumb_path
 
-    print(f"🚀 开始生成文档，共 {len(img_files)} 组数据...")
+    with Image.open(src_path) as img:
+        if img.width <= max_px:
+            return src_path
+        # JPEG 可在解码阶段直接按比例缩小，省去全尺寸解码
+        img.draft("RGB", (max_px, int(img.height * max_px / img.width)))
+        img = img.convert("RGB")
+        img.thumbnail((max_px, max_px * 10), Image.Resampling.LANCZOS)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = thumb_path + ".tmp"
+        img.save(tmp_path, format="JPEG", quality=85)
+    os.replace(tmp_path, thumb_path)
+    return thumb_path
 
+
+def collect_entries():
+    """扫描原图目录，返回 {base_name: 条目}，条目签名由原图、翻译图哈希及音频是否存在决定"""
+    img_files = [f for f in os.listdir(ORIGINAL_IMG_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    img_files.sort()
+
+    entries = {}
     for img_name in img_files:
         base_name = os.path.splitext(img_name)[0]
-
         # 路径匹配 (根据你的截图：image_xxx_translated.jpg)
         orig_path = os.path.join(ORIGINAL_IMG_DIR, img_name)
         trans_path = os.path.join(TRANS_IMG_DIR, f"{base_name}_translated.jpg")
+        has_trans = os.path.exists(trans_path)
+        has_audio = os.path.exists(os.path.join(AUDIO_DIR, f"{base_name}.mp3"))
+
+        orig_hash = file_sha256(orig_path)
+        trans_hash = file_sha256(trans_path) if has_trans else None
+        signature = hashlib.sha256(f"{orig_hash}|{trans_hash}|{has_audio}".encode()).hexdigest()
+        entries[base_name] = {
+            "orig_path": orig_path,
+            "orig_hash": orig_hash,
+            "trans_path": trans_path if has_trans else None,
+            "trans_hash": trans_hash,
+            "has_audio": has_audio,
+            "signature": signature,
+        }
+    return entries
+
+
+def add_entry(doc, base_name, entry):
+    """向文档追加一组内容，返回嵌入图片的字节数"""
+    embedded = 0
+    # 音频相对路径 (Word 相对于音频文件的路径)
+    # 假设 Word 保存在 BASE_DIR 的同级目录，音频在 BASE_DIR/audio_output
+    audio_rel_path = f"{BASE_DIR}/audio_output/{base_name}.mp3"
+
+    # 1. 添加标题
+    doc.add_heading(f"项目: {base_name}", level=1)
+
+    # 2. 插入原图 (显示宽度 6 英寸，嵌入的是按显示分辨率缩放后的图片)
+    doc.add_paragraph("【原始图片】").bold = True
+    orig_display = display_image(entry["orig_path"], entry["orig_hash"])
+    doc.add_picture(orig_display, width=Inches(DISPLAY_WIDTH_INCHES))
+    embedded += os.path.getsize(orig_display)
+
+    # 3. 插入翻译图
+    doc.add_paragraph("\n【翻译结果】").bold = True
+    if entry["trans_path"]:
+        trans_display = display_image(entry["trans_path"], entry["trans_hash"])
+        doc.add_picture(trans_display, width=Inches(DISPLAY_WIDTH_INCHES))
+        embedded += os.path.getsize(trans_display)
+    else:
+        doc.add_paragraph(f"(⚠️ 翻译图未找到: {base_name}_translated.jpg)")
+
+    # 4. 添加音频超链接
+    p_audio = doc.add_paragraph("\n🔊 ")
+    if entry["has_audio"]:
+        add_hyperlink(p_audio, "点击播放对应的合成语音 (MP3)", audio_rel_path)
+    else:
+        p_audio.add_run("(音频文件缺失)")
+
+    # 5. 分页：每组内容占一页
+    doc.add_page_break()
+    return embedded
+
 
-        # 音频相对路径 (Word 相对于音频文件的路径)
-        # 假设 Word 保存在 BASE_DIR 的同级目录，音频在 BASE_DIR/audio_output
-        audio_rel_path = f"{BASE_DIR}/audio_output/{base_name}.mp3"
+def volume_path(output_docx, volume_idx):
+    """第 1 卷沿用原文件名，之后依次为 xxx_2.docx、xxx_3.docx ..."""
+    if volume_idx == 0:
+        return output_docx
+    stem, ext = os.path.splitext(output_docx)
+    return f"{stem}_{volume_idx + 1}{ext}"
 
-        # 1. 添加标题
-        doc.add_heading(f"项目: {base_name}", level=1)
 
-        # 2. 插入原图 (宽度设为 6 英寸，保证大图清晰)
-        doc.add_paragraph("【原始图片】").bold = True
-        doc.add_picture(orig_path, width=Inches(6.0))
+def manifest_path_for(output_docx):
+    return output_docx + ".manifest.json"
 
-        # 3. 插入翻译图
-        doc.add_paragraph("\n【翻译结果】").bold = True
-        if os.path.exists(trans_path):
-            doc.add_picture(trans_path, width=Inches(6.0))
-        else:
-            doc.add_paragraph(f"(⚠️ 翻译图未找到: {base_name}_translated.jpg)")
 
-        # 4. 添加音频超链接
-        p_audio = doc.add_paragraph("\n🔊 ")
-        if os.path.exists(os.path.join(AUDIO_DIR, f"{base_name}.mp3")):
-            add_hyperlink(p_audio, "点击播放对应的合成语音 (MP3)", audio_rel_path)
-        else:
-            p_audio.add_run("(音频文件缺失)")
+def load_manifest(output_docx):
+    path = manifest_path_for(output_docx)
+    if not os.path.exists(path):
+        return {"volumes": [], "entries": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-        # 5. 分页：每组内容占一页
-        doc.add_page_break()
 
-    doc.save(OUTPUT_DOCX)
-    print(f"✨ 处理完成！文档已生成: {OUTPUT_DOCX}")
+def new_volume_document(volume_idx):
+    doc = Document()
+    title = '图片翻译与语音合成报告'
+    doc.add_heading(title if volume_idx == 0 else f"{title}（第 {volume_idx + 1} 卷）", 0)
+    return doc
+
+
+def _reset_peak_rss():
+    """把本进程的峰值 RSS（VmHWM）重置为当前 RSS；需要 Linux 4.0+，不支持时忽略"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """
+    进程峰值 RSS（MB），包含 Pillow 等原生库分配的图像缓冲区（tracemalloc 统计不到这部分）。
+    优先读 /proc/self/status 的 VmHWM，否则退回 ru_maxrss（进程生命周期内的峰值）。
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def _build_volumes(output_docx, max_volume_bytes, rebuild):
+    start = time.perf_counter()
+    entries = collect_entries()
+    manifest = {"volumes": [], "entries": {}} if rebuild else load_manifest(output_docx)
+    volumes = manifest["volumes"]
+
+    # 1. 找出需要重建的卷：包含已变化或已删除条目的卷
+    dirty = set()
+    for name, info in manifest["entries"].items():
+        current = entries.get(name)
+        if current is None or current["signature"] != info["signature"]:
+            dirty.add(info["volume"])
+    for idx, volume in enumerate(volumes):
+        if not os.path.exists(volume_path(output_docx, idx)):
+            dirty.add(idx)
+    new_names = [name for name in entries if name not in manifest["entries"]]
+
+    rebuilt = appended = 0
+    for idx in sorted(dirty):
+        volume = volumes[idx]
+        volume["entries"] = [name for name in volume["entries"] if name in entries]
+        doc = new_volume_document(idx)
+        volume["bytes"] = 0
+        for name in volume["entries"]:
+            volume["bytes"] += add_entry(doc, name, entries[name])
+            rebuilt += 1
+        doc.save(volume_path(output_docx, idx))
+        del doc
+
+    # 2. 新条目追加到最后一卷，满了就新开一卷
+    doc = None
+    idx = len(volumes) - 1
+    for name in new_names:
+        if idx < 0 or volumes[idx]["bytes"] >= max_volume_bytes:
+            if doc is not None:
+                doc.save(volume_path(output_docx, idx))
+            idx += 1
+            volumes.append({"entries": [], "bytes": 0})
+            doc = new_volume_document(idx)
+        elif doc is None:
+            doc = Document(volume_path(output_docx, idx))
+        volumes[idx]["bytes"] += add_entry(doc, name, entries[name])
+        volumes[idx]["entries"].append(name)
+        appended += 1
+    if doc is not None:
+        doc.save(volume_path(output_docx, idx))
+        del doc
+
+    # 3. 删除超出当前卷数的旧分卷（如 rebuild 前上一次构建的卷更多）
+    stale = len(volumes)
+    while os.path.exists(volume_path(output_docx, stale)):
+        os.remove(volume_path(output_docx, stale))
+        stale += 1
+
+    # 4. 更新清单
+    manifest["entries"] = {
+        name: {"signature": entries[name]["signature"], "volume": v_idx}
+        for v_idx, volume in enumerate(volumes)
+        for name in volume["entries"]
+    }
+    for v_idx, volume in enumerate(volumes):
+        volume["file"] = os.path.basename(volume_path(output_docx, v_idx))
+    with open(manifest_path_for(output_docx), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return {
+        "entries": len(entries),
+        "rebuilt": rebuilt,
+        "appended": appended,
+        "unchanged": len(entries) - rebuilt - appended,
+        "volumes": len(volumes),
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def build_word_report(output_docx=OUTPUT_DOCX, max_volume_bytes=MAX_VOLUME_BYTES, rebuild=False, profile=False):
+    """
+    增量构建报告：
+    - 未变化的条目保持不动；内容变化或被删除的条目所在卷整体重建
+    - 新增条目追加到最后一卷，超过 max_volume_bytes 时另起新卷
+    - 同一时刻只在内存中保留一卷文档，嵌入的图片均为显示分辨率缩略图
+    返回构建统计（耗时、重建/追加数量）。
+
+    profile=True 时额外返回进程峰值 RSS 与 Python 堆峰值。这会重置整个进程的 VmHWM 并开启 tracemalloc
+    （明显拖慢构建），只适合在脚本入口或独立的基准进程中使用。
+    """
+    if not profile:
+        return _build_volumes(output_docx, max_volume_bytes, rebuild)
+
+    _reset_peak_rss()
+    owns_tracing = not tracemalloc.is_tracing()
+    if owns_tracing:
+        tracemalloc.start()
+    else:  # 调用方已在追踪，只重置峰值，结束后不关闭
+        tracemalloc.reset_peak()
+    try:
+        stats = _build_volumes(output_docx, max_volume_bytes, rebuild)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if owns_tracing:
+            tracemalloc.stop()
+    stats["peak_rss_mb"] = _peak_rss_mb()
+    stats["python_heap_peak_mb"] = round(peak / 1024 ** 2, 2)
+    return stats
+
+
+def create_word_report():
+    if not os.path.exists(ORIGINAL_IMG_DIR) or not any(
+            f.lower().endswith(('.png', '.jpg', '.jpeg')) for f in os.listdir(ORIGINAL_IMG_DIR)):
+        print(f"⚠️ 错误：在 {ORIGINAL_IMG_DIR} 文件夹中未找到图片。")
+        return
+
+    print("🚀 开始增量生成文档...")
+    stats = build_word_report(profile=True)
+    print(f"   条目 {stats['entries']} | 重建 {stats['rebuilt']} | 新增 {stats['appended']} | "
+          f"未变 {stats['unchanged']} | 分卷 {stats['volumes']}")
+    print(f"   耗时 {stats['elapsed_s']}s | 峰值 RSS {stats['peak_rss_mb']}MB "
+          f"(Python 堆 {stats['python_heap_peak_mb']}MB)")
+    print(f"✨ 处理完成！文档已生成: {OUTPUT_DOCX}" + (f" 等 {stats['volumes']} 卷" if stats['volumes'] > 1 else ""))
+    return stats
 
 
 if __name__ == "__main__":
-    create_base_dir = os.path.dirname(OUTPUT_DOCX)
-    create_word_report()
\ No newline at end of file
+    create_word_report()
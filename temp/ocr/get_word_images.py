@@ -1,95 +1,241 @@
-from docx import Document
-from docx.oxml.ns import qn
-import os
-from PIL import Image
+import hashlib
 import io
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 
+from lxml import etree
+from PIL import Image
 
-def extract_all_images_in_order(doc_path, output_dir="extracted_images"):
+# -------------------------- XML 命名空间 --------------------------
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+V_NS = "urn:schemas-microsoft-com:vml"
+MC_NS = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+W_BODY = f"{{{W_NS}}}body"
+W_HDR = f"{{{W_NS}}}hdr"
+W_FTR = f"{{{W_NS}}}ftr"
+W_P = f"{{{W_NS}}}p"
+W_R = f"{{{W_NS}}}r"
+W_TBL = f"{{{W_NS}}}tbl"
+W_HEADER_REF = f"{{{W_NS}}}headerReference"
+W_FOOTER_REF = f"{{{W_NS}}}footerReference"
+A_BLIP = f"{{{A_NS}}}blip"
+V_IMAGEDATA = f"{{{V_NS}}}imagedata"
+MC_FALLBACK = f"{{{MC_NS}}}Fallback"
+R_EMBED = f"{{{R_NS}}}embed"
+R_ID = f"{{{R_NS}}}id"
+
+# 下游 OCR 翻译只接受 png/jpg，这两种格式直接原样写出，其余格式才需要转码
+PASSTHROUGH_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"\xff\xd8\xff": "jpg",
+}
+
+
+# -----------------------------------------------------------------
+
+def sniff_format(image_bytes):
+    """按文件头识别可直接写出的格式，返回扩展名或 None"""
+    for signature, ext in PASSTHROUGH_SIGNATURES.items():
+        if image_bytes.startswith(signature):
+            return ext
+    return None
+
+
+def _read_rels(zf, part_name):
+    """读取部件的关系表：rId -> 包内图片路径"""
+    rels_name = posixpath.join(posixpath.dirname(part_name), "_rels", posixpath.basename(part_name) + ".rels")
+    try:
+        root = etree.fromstring(zf.read(rels_name))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(part_name), rel.get("Target")))
+        rels[rel.get("Id")] = target.lstrip("/")
+    return rels
+
+
+def iter_image_refs(zf, part_name, collect_refs=None):
+    """
+    单次流式遍历部件 XML，按文档顺序产出 (段落序号, run 序号, 图片 rId)。
+    - 段落序号 / run 序号与旧版 doc.paragraphs / paragraph.runs 的编号一致：
+      只对部件顶层段落计数，run 只计顶层段落的直接子 w:r
+    - 覆盖正文、表格、文本框内的 w:drawing(a:blip) 与旧版 w:pict(v:imagedata)；
+      不在顶层段落里的图片（如表格内）段落序号为 None，不在直接子 run 里的 run 序号为 None
+    - 跳过 mc:Fallback，避免同一张图被兼容分支重复计数
+    - 正文顶层节点处理完即释放，内存占用与文档大小无关
+    :param collect_refs: 传入列表时，顺带收集页眉/页脚引用的 rId
+    """
+    tags = (W_P, W_R, W_TBL, A_BLIP, V_IMAGEDATA, MC_FALLBACK, W_HEADER_REF, W_FOOTER_REF)
+    top_level = (W_BODY, W_HDR, W_FTR)
+    fallback_depth = 0
+    para_idx = -1
+    paragraph = run = None  # 当前所在的顶层段落 / 其直接子 run
+    run_idx = -1
+    with zf.open(part_name) as stream:
+        for event, elem in etree.iterparse(stream, events=("start", "end"), tag=tags):
+            tag = elem.tag
+            if event == "start":
+                if tag == MC_FALLBACK:
+                    fallback_depth += 1
+                elif fallback_depth:
+                    continue
+                elif tag == W_P:
+                    parent = elem.getparent()
+                    if parent is not None and parent.tag in top_level:
+                        para_idx += 1
+                        paragraph, run_idx = elem, -1
+                elif tag == W_R:
+                    if paragraph is not None and elem.getparent() is paragraph:
+                        run_idx += 1
+                        run = elem
+                elif tag in (A_BLIP, V_IMAGEDATA):
+                    r_id = elem.get(R_EMBED if tag == A_BLIP else R_ID)
+                    if r_id:
+                        yield (para_idx if paragraph is not None else None,
+                               run_idx if run is not None else None, r_id)
+                elif tag in (W_HEADER_REF, W_FOOTER_REF) and collect_refs is not None:
+                    collect_refs.append(elem.get(R_ID))
+            else:
+                if tag == MC_FALLBACK:
+                    fallback_depth -= 1
+                elif elem is run:
+                    run = None
+                elif elem is paragraph:
+                    paragraph = None
+                if tag in (W_P, W_TBL):
+                    parent = elem.getparent()
+                    if parent is not None and parent.tag == W_BODY:
+                        elem.clear()
+                        while elem.getprevious() is not None:
+                            del parent[0]
+
+
+def _transcode_to_png(image_bytes, save_path, fallback_ext):
+    """进程池任务：转码为 PNG；PIL 无法解码（如 EMF/WMF）时原样写出"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+                img = img.convert("RGBA")
+            img.save(save_path, format="PNG")
+        return save_path
+    except Exception:
+        raw_path = os.path.splitext(save_path)[0] + "." + fallback_ext
+        with open(raw_path, "wb") as f:
+            f.write(image_bytes)
+        return raw_path
+
+
+def extract_all_images_in_order(doc_path, output_dir="extracted_images", max_workers=None):
     """
     按顺序提取Word文档中的所有图片，并保存到指定目录
+    - 正文（含表格、文本框）单次流式遍历，随后依次处理各节页眉/页脚
+    - 字节完全相同的图片只保存一次，后续出现记为 duplicate_of
+    - PNG/JPEG 原样写出；其余格式交给进程池转码为 PNG
     :param doc_path: Word文档路径
     :param output_dir: 图片保存目录
+    :param max_workers: 转码进程数，默认 CPU 核数
     :return: 按顺序的图片信息列表（路径、位置索引）
     """
     # 1. 初始化配置
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    doc = Document(doc_path)
     image_info_list = []  # 存储按顺序的图片信息
-    image_index = 0  # 图片顺序索引
-
-    # 2. 遍历文档的所有段落（核心：按XML节点顺序提取）
-    for para_idx, paragraph in enumerate(doc.paragraphs):
-        # 遍历段落中的每个Run（文字/图片容器）
-        for run_idx, run in enumerate(paragraph.runs):
-            # 解析Run中的图片节点（w:drawing 是现代Word的图片标签）
-            drawing_nodes = run._r.xpath(".//w:drawing")
-            for draw_node in drawing_nodes:
-                # 提取图片二进制数据
-                blip = draw_node.xpath(".//a:blip/@r:embed")[0]  # 关联的图片ID
-                image_part = doc.part.related_parts[blip]
-                image_bytes = image_part.blob  # 图片二进制数据
-
-                # 获取图片格式（默认png，兼容jpg/jpeg）
-                img_ext = image_part.content_type.split("/")[-1].lower()
-                img_ext = "jpg" if img_ext == "jpeg" else img_ext
-
-                # 保存图片
-                img_filename = f"image_{image_index:03d}.{img_ext}"
-                img_save_path = os.path.join(output_dir, img_filename)
-
-                # 写入图片文件（处理PIL兼容问题）
-                try:
-                    with Image.open(io.BytesIO(image_bytes)) as img:
-                        img.save(img_save_path)
-                except:
-                    # 直接写入二进制（兼容特殊格式）
-                    with open(img_save_path, "wb") as f:
-                        f.write(image_bytes)
-
-                # 记录图片信息（顺序索引、位置、路径）
-                image_info = {
-                    "index": image_index,
-                    "paragraph_idx": para_idx,
-                    "run_idx": run_idx,
-                    "save_path": img_save_path,
-                    "filename": img_filename
-                }
-                image_info_list.append(image_info)
-                image_index += 1
-
-    # 3. 兼容旧版Word的w:pict标签（老式图片嵌入）
-    pict_nodes = doc.element.body.xpath(".//w:pict")
-    for pict_idx, pict_node in enumerate(pict_nodes):
-        blip_nodes = pict_node.xpath(".//v:imagedata/@r:id")
-        for blip_id in blip_nodes:
-            if blip_id in doc.part.related_parts:
-                image_part = doc.part.related_parts[blip_id]
-                image_bytes = image_part.blob
-                img_ext = image_part.content_type.split("/")[-1].lower()
-                img_ext = "jpg" if img_ext == "jpeg" else img_ext
-
-                img_filename = f"image_{image_index:03d}.{img_ext}"
-                img_save_path = os.path.join(output_dir, img_filename)
-
-                with open(img_save_path, "wb") as f:
-                    f.write(image_bytes)
-
-                image_info = {
-                    "index": image_index,
-                    "type": "pict (old style)",
-                    "save_path": img_save_path,
-                    "filename": img_filename
-                }
-                image_info_list.append(image_info)
-                image_index += 1
-
-    # 4. 输出提取结果
-    print(f"共提取 {len(image_info_list)} 张图片，保存至：{output_dir}")
+    first_seen = {}  # sha1 -> 首次出现的图片信息
+    pending = []  # (future, image_info)
+    pool = None
+
+    with zipfile.ZipFile(doc_path) as zf:
+        names = set(zf.namelist())
+        main_part = "word/document.xml"
+
+        def iter_all_parts():
+            # 正文遍历结束后 header_refs 才收集完整，因此页眉/页脚部件需惰性追加
+            header_refs = []
+            yield main_part, iter_image_refs(zf, main_part, collect_refs=header_refs)
+            main_rels = _read_rels(zf, main_part)
+            seen_parts = set()
+            for r_id in header_refs:
+                part_name = main_rels.get(r_id)
+                if part_name and part_name not in seen_parts and part_name in names:
+                    seen_parts.add(part_name)
+                    yield part_name, iter_image_refs(zf, part_name)
+
+        try:
+            for part_name, refs in iter_all_parts():
+                rels = _read_rels(zf, part_name)
+                for para_idx, run_idx, r_id in refs:
+                    media_name = rels.get(r_id)
+                    if not media_name:
+                        continue
+                    image_index = len(image_info_list)
+                    image_bytes = zf.read(media_name)
+                    digest = hashlib.sha1(image_bytes).hexdigest()
+                    image_info = {
+                        "index": image_index,
+                        "part": posixpath.basename(part_name),
+                        "paragraph_idx": para_idx,
+                        "run_idx": run_idx,
+                        "sha1": digest,
+                    }
+                    image_info_list.append(image_info)
+
+                    # 2. 去重：相同字节的图片直接引用首次保存的文件
+                    if digest in first_seen:
+                        original = first_seen[digest]
+                        image_info["duplicate_of"] = original["index"]
+                        pending.append((None, image_info))
+                        continue
+                    first_seen[digest] = image_info
+
+                    # 3. 已是目标格式：零解码直接写出
+                    ext = sniff_format(image_bytes)
+                    if ext:
+                        img_filename = f"image_{image_index:03d}.{ext}"
+                        img_save_path = os.path.join(output_dir, img_filename)
+                        with open(img_save_path, "wb") as f:
+                            f.write(memoryview(image_bytes))
+                        image_info["save_path"] = img_save_path
+                        image_info["filename"] = img_filename
+                        continue
+
+                    # 4. 需要转码：提交到进程池，主线程继续遍历
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=max_workers)
+                    raw_ext = posixpath.splitext(media_name)[1].lstrip(".").lower() or "bin"
+                    img_save_path = os.path.join(output_dir, f"image_{image_index:03d}.png")
+                    future = pool.submit(_transcode_to_png, image_bytes, img_save_path, raw_ext)
+                    image_info["transcoded"] = True
+                    pending.append((future, image_info))
+
+            # 5. 回填转码结果与重复图片的保存路径（按文档顺序，重复项总在其原图之后）
+            for future, image_info in pending:
+                if future is not None:
+                    image_info["save_path"] = future.result()
+                    image_info["filename"] = os.path.basename(image_info["save_path"])
+                else:
+                    original = image_info_list[image_info["duplicate_of"]]
+                    image_info["save_path"] = original["save_path"]
+                    image_info["filename"] = original["filename"]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    # 6. 输出提取结果
+    unique = len(first_seen)
+    print(f"共提取 {len(image_info_list)} 张图片（去重后 {unique} 张），保存至：{output_dir}")
     for info in image_info_list:
-        print(f"顺序 {info['index']:03d} | 保存路径：{info['save_path']}")
+        note = f"（与顺序 {info['duplicate_of']:03d} 相同）" if "duplicate_of" in info else ""
+        print(f"顺序 {info['index']:03d} | 保存路径：{info['save_path']}{note}")
 
     return image_info_list
 
@@ -106,4 +252,4 @@ if __name__ == "__main__":
     # 验证顺序：打印所有图片的顺序索引和路径
     print("\n按文档顺序的图片列表：")
     for img in extracted_images:
-        print(f"第{img['index'] + 1}张图：{img['save_path']}")
\ No newline at end of file
+        print(f"第{img['index'] + 1}张图：{img['save_path']}")
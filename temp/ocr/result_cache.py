@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.rag.status import DocStatus
+
+
+class ResultCache:
+    """
+    内容寻址的持久化结果缓存（OCR 翻译 JSON / TTS 音频片段）。
+    - 键：输入字节 + 请求参数的 sha256，参数变化即视为新任务
+    - 值：以键命名的文件，按前两位分目录存放
+    - 索引：SQLite 记录每个条目的 DocStatus、大小与最近访问时间
+    - 超过 max_bytes 时按最近最少使用（LRU）淘汰已完成条目
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " size INTEGER NOT NULL DEFAULT 0,"
+            " last_access REAL NOT NULL,"
+            " error TEXT)"
+        )
+        self._conn.commit()
+        self.recover()
+
+    @staticmethod
+    def make_key(data, **params):
+        """由输入字节与请求参数生成缓存键"""
+        h = hashlib.sha256()
+        h.update(data if isinstance(data, bytes) else data.encode("utf-8"))
+        h.update(b"\0")
+        h.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "objects", key[:2], key)
+
+    def recover(self):
+        """崩溃恢复：上次运行中断时仍为 PROCESSING 的条目重置为 PENDING，返回重置数量"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE entries SET status=? WHERE status=?",
+                (DocStatus.PENDING.value, DocStatus.PROCESSING.value),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def status(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM entries WHERE key=?", (key,)).fetchone()
+        return DocStatus(row[0]) if row else None
+
+    def mark(self, key, status, error=None):
+        """更新条目状态（不存在则创建），用于记录 PROCESSING / FAILED 等中间态"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (key, status, last_access, error) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET status=excluded.status, error=excluded.error",
+                (key, DocStatus(status).value, time.time(), error),
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        """
+        命中返回缓存字节，否则返回 None；只有 PROCESSED 条目计为命中。
+        文件在锁内读取，避免并发 put() 触发的淘汰在查到索引之后删掉文件；文件缺失同样按未命中处理。
+        """
+        path = self._path(key)
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM entries WHERE key=?", (key,)).fetchone()
+            data = None
+            if row and row[0] == DocStatus.PROCESSED.value:
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    pass
+            if data is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access=? WHERE key=?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """原子写入结果并标记为 PROCESSED，随后按容量上限淘汰"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (key, status, size, last_access, error) VALUES (?, ?, ?, ?, NULL) "
+                "ON CONFLICT(key) DO UPDATE SET status=excluded.status, size=excluded.size, "
+                "last_access=excluded.last_access, error=NULL",
+                (key, DocStatus.PROCESSED.value, len(data), time.time()),
+            )
+            self._conn.commit()
+            self._evict_locked()
+
+    def get_json(self, key):
+        data = self.get(key)
+        return json.loads(data.decode("utf-8")) if data is not None else None
+
+    def put_json(self, key, obj):
+        self.put(key, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict_locked(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM entries WHERE status=? ORDER BY last_access ASC",
+            (DocStatus.PROCESSED.value,),
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._conn.execute("DELETE FROM entries WHERE key=?", (key,))
+            total -= size
+            self.evictions += 1
+        self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM entries GROUP BY status").fetchall())
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": total,
+            "entries": counts,
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"🗃️ 缓存: 命中 {s['hits']} | 未命中 {s['misses']} | 命中率 {s['hit_rate']:.1%} | "
+              f"淘汰 {s['evictions']} | 占用 {s['bytes'] / 1024 ** 2:.1f}MB")
+        return s
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,13 +1,26 @@
+"""
+文本转语音：把 extracted_contexts 下的段落文本按句切分后调用有道 TTS 合成，拼接为 mp3。
+
+用法（在仓库根目录）：
+    python -m temp.ocr.text_to_mp3
+"""
 import requests
 import hashlib
 import uuid
 import time
 import os
 import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import get_settings
+from src.rag.status import DocStatus
+from temp.ocr.concurrency import TokenBucket, RunStats, backoff_delay, create_session
+from src.utils import telemetry
+from temp.ocr.result_cache import ResultCache
 
 # -------------------------- 配置项 --------------------------
-APP_KEY = "22edc1db2a3413df".strip()
-APP_SECRET = "nPtqYG8xgUmg7PsgzW26gv6S5XLhW9PN".strip()
+# 应用密钥从环境变量或 .env 读取：YOUDAO_APP_KEY / YOUDAO_APP_SECRET（见 config/settings.py）
 
 INPUT_DIR = "results/translated_results/extracted_contexts"
 AUDIO_OUTPUT_DIR = "results/translated_results/audio_output"
@@ -19,6 +32,19 @@ VOLUME = "1.0"
 # 单次 API 请求建议的最大字节长度（留出余量，官方限制 2048）
 MAX_BYTE_LEN = 1500
 
+API_URL = "https://openapi.youdao.com/ttsapi"
+
+# 并发配置：片段并发合成数、每秒最多发起的请求数（原先每段间隔 0.4s，即 2.5 QPS）
+MAX_WORKERS = 4
+RATE_LIMIT_QPS = 2.5
+MAX_RETRIES = 3
+# 可重试的限流类错误码（411: 访问频率受限, 412: 长请求过于频繁），其余错误码不重试
+THROTTLE_ERROR_CODES = {"411", "412"}
+
+# 片段级音频缓存：相同文本 + 相同发音参数的片段不再重复合成
+CACHE_DIR = "results/cache/tts"
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
 
 # -----------------------------------------------------------
 
@@ -62,18 +88,21 @@ def split_text(text):
     return chunks
 
 
-def get_tts_audio(text):
-    """调用 API 返回音频的二进制数据"""
-    api_url = "https://openapi.youdao.com/ttsapi"
+def request_tts(text, session=None, api_url=API_URL):
+    """
+    调用 API，返回 (音频二进制, 错误码)。
+    成功时错误码为 None；网络异常或服务端 5xx 时音频为 None、错误码为 None（可重试）。
+    """
     salt = str(uuid.uuid4())
     cur_time = str(int(time.time()))
+    app_key, app_secret = get_settings().youdao_credentials()
 
     data = {
         'q': text,
-        'appKey': APP_KEY,
+        'appKey': app_key,
         'salt': salt,
         'curtime': cur_time,
-        'sign': generate_sign(APP_KEY, text, salt, cur_time, APP_SECRET),
+        'sign': generate_sign(app_key, text, salt, cur_time, app_secret),
         'signType': 'v3',
         'voiceName': VOICE_NAME,
         'format': 'mp3',
@@ -82,18 +111,181 @@ def get_tts_audio(text):
     }
 
     try:
-        response = requests.post(api_url, data=data, timeout=30)
+        with telemetry.span("tts.request", chars=len(text)):
+            response = (session or requests).post(api_url, data=data, timeout=30)
         if 'audio' in response.headers.get('Content-Type', ''):
-            return response.content
-        else:
-            print(f"❌ 分段请求失败: {response.json()}")
-            return None
+            telemetry.inc("tts_requests_total", status="ok")
+            telemetry.observe("tts_audio_bytes", len(response.content), buckets=telemetry.BYTE_BUCKETS)
+            return response.content, None
+        if response.status_code >= 500:
+            telemetry.inc("tts_requests_total", status="server_error")
+            print(f"❌ 分段请求失败: HTTP {response.status_code}")
+            return None, None
+        telemetry.inc("tts_requests_total", status="api_error")
+        try:
+            res = response.json()
+        except ValueError:
+            res = {"errorCode": f"HTTP {response.status_code}"}
+        print(f"❌ 分段请求失败: {res}")
+        return None, str(res.get("errorCode"))
     except Exception as e:
+        telemetry.inc("tts_requests_total", status="network_error")
         print(f"❌ 请求异常: {str(e)}")
-        return None
+        return None, None
+
+
+def get_tts_audio(text, session=None, api_url=API_URL):
+    """调用 API 返回音频的二进制数据，失败返回 None"""
+    return request_tts(text, session=session, api_url=api_url)[0]
+
+
+def chunk_cache_key(chunk):
+    """缓存键：片段文本 + 影响合成结果的参数"""
+    return ResultCache.make_key(chunk, voice_name=VOICE_NAME, speed=SPEED, volume=VOLUME)
+
+
+def index_path_for(audio_path):
+    """片段索引（sidecar）文件路径：xxx.mp3 -> xxx.mp3.index.json"""
+    return audio_path + ".index.json"
+
+
+class ChunkSynthesizer:
+    """
+    片段合成器：令牌桶限速 + 失败退避重试 + 片段级缓存，可被线程池并发调用。
+    """
+
+    def __init__(self, cache=None, session=None, rate=RATE_LIMIT_QPS, max_retries=MAX_RETRIES,
+                 api_url=API_URL, pool_size=MAX_WORKERS):
+        self.cache = cache
+        self.session = session or create_session(pool_size)
+        self.limiter = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.api_url = api_url
+        self.stats = RunStats()
+
+    def _fetch(self, chunk):
+        """仅在网络异常、服务端 5xx 或限流类错误码时退避重试；密钥错误、文本非法等直接失败"""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            audio_data, error_code = request_tts(chunk, session=self.session, api_url=self.api_url)
+            retryable = audio_data is None and (error_code is None or error_code in THROTTLE_ERROR_CODES)
+            if not retryable or attempt == self.max_retries:
+                return audio_data
+            self.stats.add_retry()
+            telemetry.inc("tts_retries_total")
+            time.sleep(backoff_delay(attempt))
+
+    def synthesize(self, chunk, use_cache=True):
+        """合成单个片段，优先读缓存；失败重试耗尽后返回 None"""
+        start = time.perf_counter()
+        key = chunk_cache_key(chunk)
+        audio_data = None
+        if self.cache is not None and use_cache:
+            audio_data = self.cache.get(key)
+            telemetry.inc("tts_cache_total", result="hit" if audio_data is not None else "miss")
+        if audio_data is None:
+            if self.cache is not None:
+                self.cache.mark(key, DocStatus.PROCESSING)
+            audio_data = self._fetch(chunk)
+            if self.cache is not None:
+                if audio_data:
+                    self.cache.put(key, audio_data)
+                else:
+                    self.cache.mark(key, DocStatus.FAILED)
+        self.stats.record(time.perf_counter() - start, bool(audio_data))
+        return audio_data
+
+
+def synthesize_to_file(text_chunks, audio_path, synthesizer, pool):
+    """
+    并发合成全部片段，并按片段顺序流式写入 MP3：
+    只要前缀片段全部完成就立即落盘，不等待整篇合成结束。
+    同时写出片段索引（文本、字节偏移、长度、状态），返回失败片段序号列表。
+    """
+    futures = [pool.submit(synthesizer.synthesize, chunk) for chunk in text_chunks]
+    entries = []
+    failed = []
+    offset = 0
+    with open(audio_path, 'wb') as final_audio:
+        for i, (chunk, future) in enumerate(zip(text_chunks, futures)):
+            audio_data = future.result()
+            if audio_data:
+                final_audio.write(audio_data)
+                length = len(audio_data)
+                status = DocStatus.PROCESSED
+            else:
+                length = 0
+                status = DocStatus.FAILED
+                failed.append(i)
+                print(f"   ❌ 片段 {i + 1}/{len(text_chunks)} 重试后仍合成失败，已记录到索引，可单独重新合成")
+            entries.append({
+                "index": i,
+                "text": chunk,
+                "offset": offset,
+                "length": length,
+                "status": status.value,
+            })
+            offset += length
+
+    write_chunk_index(audio_path, entries)
+    return failed
+
+
+def write_chunk_index(audio_path, entries):
+    index = {
+        "audio": os.path.basename(audio_path),
+        "voice_name": VOICE_NAME,
+        "speed": SPEED,
+        "volume": VOLUME,
+        "chunks": entries,
+    }
+    with open(index_path_for(audio_path), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+
+def resynthesize_segment(audio_path, chunk_index, synthesizer=None):
+    """
+    根据片段索引，只重新合成第 chunk_index 段并替换进 MP3，其余片段字节原样保留。
+    返回是否成功。
+    """
+    with open(index_path_for(audio_path), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    entries = index["chunks"]
+    entry = entries[chunk_index]
+
+    synthesizer = synthesizer or ChunkSynthesizer()
+    audio_data = synthesizer.synthesize(entry["text"], use_cache=False)
+    if not audio_data:
+        print(f"❌ 片段 {chunk_index + 1} 重新合成失败")
+        return False
+
+    with open(audio_path, 'rb') as f:
+        old_audio = f.read()
+    start, end = entry["offset"], entry["offset"] + entry["length"]
+    tmp_path = audio_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(memoryview(old_audio)[:start])
+        f.write(audio_data)
+        f.write(memoryview(old_audio)[end:])
+    os.replace(tmp_path, audio_path)
+
+    delta = len(audio_data) - entry["length"]
+    entry["length"] = len(audio_data)
+    entry["status"] = DocStatus.PROCESSED.value
+    for later in entries[chunk_index + 1:]:
+        later["offset"] += delta
+    write_chunk_index(audio_path, entries)
+    print(f"✅ 片段 {chunk_index + 1} 已重新合成并写回: {os.path.basename(audio_path)}")
+    return True
 
 
 def batch_process_tts():
+    try:
+        get_settings().youdao_credentials()
+    except ValueError as e:
+        print(f"❌ 错误：{e}（可写入 .env，参考 env.example）")
+        return
+
     if not os.path.exists(AUDIO_OUTPUT_DIR):
         os.makedirs(AUDIO_OUTPUT_DIR)
 
@@ -103,38 +295,49 @@ def batch_process_tts():
         print(f"⚠️ 未找到文件")
         return
 
-    # 这里你之前写的是 [1:]，表示跳过第一个文件，我保留了你的逻辑
-    for filename in txt_files[3:]:
-        txt_path = os.path.join(INPUT_DIR, filename)
-        audio_filename = os.path.splitext(filename)[0] + ".mp3"
-        audio_path = os.path.join(AUDIO_OUTPUT_DIR, audio_filename)
+    # 已合成的片段由缓存自动跳过，无需再手动切片跳过已完成的文件
+    cache = ResultCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES)
+    synthesizer = ChunkSynthesizer(cache=cache)
+    incomplete = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for filename in txt_files:
+            txt_path = os.path.join(INPUT_DIR, filename)
+            audio_filename = os.path.splitext(filename)[0] + ".mp3"
+            audio_path = os.path.join(AUDIO_OUTPUT_DIR, audio_filename)
 
-        with open(txt_path, 'r', encoding='utf-8') as f:
-            full_text = f.read().strip()
+            with open(txt_path, 'r', encoding='utf-8') as f:
+                full_text = f.read().strip()
 
-        if not full_text:
-            continue
+            if not full_text:
+                continue
 
-        print(f"🎙️ 正在处理: {filename} (长度: {len(full_text)})")
+            print(f"🎙️ 正在处理: {filename} (长度: {len(full_text)})")
 
-        # 1. 切分文本
-        text_chunks = split_text(full_text)
-        print(f"   已切分为 {len(text_chunks)} 个片段进行合成...")
+            # 1. 切分文本
+            text_chunks = split_text(full_text)
+            print(f"   已切分为 {len(text_chunks)} 个片段，并发合成中...")
 
-        # 2. 逐段获取音频并合并写入
-        with open(audio_path, 'wb') as final_audio:
-            for i, chunk in enumerate(text_chunks):
-                print(f"   -> 正在合成片段 {i + 1}/{len(text_chunks)}...")
-                audio_data = get_tts_audio(chunk)
-                if audio_data:
-                    final_audio.write(audio_data)
-                    # 避免触发频率限制
-                    time.sleep(0.4)
-                else:
-                    print(f"   ⚠️ 片段 {i + 1} 合成中断")
+            # 2. 并发获取音频，按顺序流式写入
+            with telemetry.span("tts.file", file=filename, chunks=len(text_chunks)):
+                failed = synthesize_to_file(text_chunks, audio_path, synthesizer, pool)
+            telemetry.inc("tts_files_total", status="partial" if failed else "ok")
+            if failed:
+                incomplete[audio_filename] = failed
+                print(f"⚠️ 部分片段失败: {audio_filename} 缺失片段 {[i + 1 for i in failed]}\n")
+            else:
+                print(f"✅ 合并保存成功: {audio_filename}\n")
+
+    synthesizer.stats.finish().report("片段合成统计")
+    cache.report()
+    cache.close()
+    telemetry.report("语音合成埋点")
+    telemetry.flush()
 
-        print(f"✅ 合并保存成功: {audio_filename}\n")
+    if incomplete:
+        print("👉 可调用 resynthesize_segment(audio_path, chunk_index) 单独补合成以下片段:")
+        for name, failed in incomplete.items():
+            print(f"   {name}: {failed}")
 
 
 if __name__ == "__main__":
-    batch_process_tts()
\ No newline at end of file
+    batch_process_tts()
@@ -1,3 +1,9 @@
+"""
+图片 OCR 翻译：并发调用有道图片翻译接口，处理 results/extracted_images 下的图片，结果写入 results/translated_results。
+
+用法（在仓库根目录）：
+    python -m temp.ocr.trans_imgs
+"""
 import requests
 import hashlib
 import uuid
@@ -7,12 +13,17 @@ import os
 from PIL import Image
 import base64
 import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config.settings import get_settings
+from src.rag.status import DocStatus
+from temp.ocr.concurrency import TokenBucket, RunStats, backoff_delay, create_session
+from src.utils import telemetry
+from temp.ocr.result_cache import ResultCache
 
 # -------------------------- 配置项 --------------------------
-# 1. 请务必确认控制台该应用已绑定【图片翻译服务】
-# 2. 粘贴后，确保引号内没有多余空格
-APP_KEY = "22edc1db2a3413df"
-APP_SECRET = "nPtqYG8xgUmg7PsgzW26gv6S5XLhW9PN"
+# 应用密钥从环境变量或 .env 读取：YOUDAO_APP_KEY / YOUDAO_APP_SECRET（见 config/settings.py）
+# 请务必确认控制台该应用已绑定【图片翻译服务】
 
 IMAGE_DIR = "results/extracted_images"
 OUTPUT_DIR = "results/translated_results"
@@ -24,6 +35,19 @@ TO_LANG = "zh-CHS"
 # 限制图片最大长宽，防止 Base64 过长导致 5003 错误
 MAX_SIZE = 1024
 
+API_URL = "https://openapi.youdao.com/ocrtransapi"
+
+# 并发配置：同时在途的请求数、每秒最多发起的请求数
+MAX_WORKERS = 4
+RATE_LIMIT_QPS = 4
+# 触发限流类错误码时的最大重试次数（411: 访问频率受限, 412: 长请求过于频繁）
+MAX_RETRIES = 3
+THROTTLE_ERROR_CODES = {"411", "412"}
+
+# 结果缓存：相同图片 + 相同翻译参数的结果直接复用，重跑/断点续跑时跳过已完成的图片
+CACHE_DIR = "results/cache/ocr"
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
 
 # -------------------------------------------------------------
 
@@ -38,6 +62,7 @@ def init_dirs():
         os.makedirs(d, exist_ok=True)
 
 
+@telemetry.timed("ocr.encode")
 def compress_and_encode_image(image_path):
     """压缩图片并转为纯净的 Base64"""
     try:
@@ -58,6 +83,7 @@ def compress_and_encode_image(image_path):
 
             # 转 Base64 (确保无换行符)
             base64_data = base64.b64encode(img_byte_stream.read()).decode('utf-8').replace("\n", "")
+            telemetry.observe("ocr_upload_bytes", len(base64_data), buckets=telemetry.BYTE_BUCKETS)
             return base64_data
     except Exception as e:
         print(f"❌ 图片处理失败 {image_path}：{str(e)}")
@@ -84,24 +110,20 @@ def generate_sign(app_key, q, salt, curtime, app_secret):
     return hashlib.sha256(sign_str.encode('utf-8')).hexdigest()
 
 
-def translate_image(image_path):
-    api_url = "https://openapi.youdao.com/ocrtransapi"
-
-    base64_image = compress_and_encode_image(image_path)
-    if not base64_image:
-        return None
-
+def request_translation(base64_image, session=None, api_url=API_URL):
+    """对已编码的图片发起一次翻译请求（每次调用重新生成 salt/curtime/sign）"""
     # 生成参数
     # 使用无横线的UUID，更符合官方风格
     salt = str(uuid.uuid4()).replace("-", "")
     cur_time = str(int(time.time()))
-    sign = generate_sign(APP_KEY, base64_image, salt, cur_time, APP_SECRET)
+    app_key, app_secret = get_settings().youdao_credentials()
+    sign = generate_sign(app_key, base64_image, salt, cur_time, app_secret)
 
     data = {
         'q': base64_image,
         'from': FROM_LANG,
         'to': TO_LANG,
-        'appKey': APP_KEY,
+        'appKey': app_key,
         'salt': salt,
         'curtime': cur_time,
         'sign': sign,
@@ -114,13 +136,26 @@ def translate_image(image_path):
 
     try:
         # requests 自动处理 URL Encode
-        response = requests.post(api_url, data=data, timeout=30)
-        return response.json()
+        with telemetry.span("ocr.request") as sp:
+            response = (session or requests).post(api_url, data=data, timeout=30)
+            res = response.json()
+            sp.set(error_code=res.get("errorCode"), response_bytes=len(response.content))
+        telemetry.inc("ocr_requests_total", code=res.get("errorCode"))
+        telemetry.observe("ocr_response_bytes", len(response.content), buckets=telemetry.BYTE_BUCKETS)
+        return res
     except Exception as e:
+        telemetry.inc("ocr_requests_total", code="network_error")
         print(f"❌ 网络请求异常：{str(e)}")
         return None
 
 
+def translate_image(image_path, session=None, api_url=API_URL):
+    base64_image = compress_and_encode_image(image_path)
+    if not base64_image:
+        return None
+    return request_translation(base64_image, session=session, api_url=api_url)
+
+
 def save_result(image_name, result):
     base_name = os.path.splitext(image_name)[0]
 
@@ -164,10 +199,113 @@ def save_result(image_name, result):
         print(f"⚠️  翻译完成但无文本: {image_name}")
 
 
+def translate_with_retry(image_path, session, limiter, stats=None,
+                         api_url=API_URL, max_retries=MAX_RETRIES):
+    """
+    限流 + 重试地翻译单张图片。
+    仅在网络异常或限流类 errorCode 时退避重试，其余错误直接返回结果。
+    """
+    base64_image = compress_and_encode_image(image_path)
+    if not base64_image:
+        return None
+
+    res = None
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        res = request_translation(base64_image, session=session, api_url=api_url)
+        retryable = res is None or res.get("errorCode") in THROTTLE_ERROR_CODES
+        if not retryable or attempt == max_retries:
+            break
+        if stats is not None:
+            stats.add_retry()
+        telemetry.inc("ocr_retries_total")
+        time.sleep(backoff_delay(attempt))
+    return res
+
+
+def handle_result(image_name, res):
+    """处理 API 返回：成功则保存，失败则打印错误；返回是否成功"""
+    if not res:
+        return False
+    if res.get("errorCode") == "0":
+        save_result(image_name, res)
+        return True
+    print(f"❌ API 错误: {image_name} Code={res.get('errorCode')} Msg={res.get('msg')}")
+    if res.get("errorCode") == "202":
+        print("   👉 提示：请检查控制台是否开通了【图片翻译】服务，或检查Key/Secret是否复制了空格。")
+    return False
+
+
+def image_cache_key(image_path):
+    """缓存键：原始图片字节 + 影响翻译结果的参数"""
+    with open(image_path, "rb") as f:
+        return ResultCache.make_key(f.read(), from_lang=FROM_LANG, to_lang=TO_LANG, max_size=MAX_SIZE)
+
+
+def run_concurrent(files, image_dir=IMAGE_DIR, max_workers=MAX_WORKERS, rate=RATE_LIMIT_QPS,
+                   api_url=API_URL, session=None, cache=None):
+    """
+    有界并发地翻译一批图片：
+    - 最多 max_workers 个请求同时在途
+    - 令牌桶将请求发起速率限制在 rate QPS 以内
+    - 共享连接池会话
+    - 传入 cache 时，已翻译过的图片直接从缓存恢复结果，不再请求 API
+    返回 RunStats，包含吞吐量与延迟分位数。
+    """
+    limiter = TokenBucket(rate)
+    stats = RunStats()
+    session = session or create_session(max_workers)
+
+    def work(name):
+        with telemetry.span("ocr.image", image=name) as sp:
+            ok = process(name)
+            sp.set(ok=ok)
+        telemetry.inc("ocr_images_total", status="ok" if ok else "failed")
+        return name, ok
+
+    def process(name):
+        start = time.perf_counter()
+        image_path = os.path.join(image_dir, name)
+        key = None
+        if cache is not None:
+            try:
+                key = image_cache_key(image_path)
+            except OSError as e:  # 图片已删除或不可读：只记这一张失败，不中断整批
+                print(f"❌ 图片读取失败 {image_path}：{str(e)}")
+                stats.record(time.perf_counter() - start, False)
+                return False
+            cached = cache.get_json(key)
+            telemetry.inc("ocr_cache_total", result="hit" if cached is not None else "miss")
+            if cached is not None:
+                ok = handle_result(name, cached)
+                stats.record(time.perf_counter() - start, ok)
+                return ok
+            cache.mark(key, DocStatus.PROCESSING)
+
+        res = translate_with_retry(image_path, session, limiter, stats, api_url=api_url)
+        ok = handle_result(name, res)
+        if key is not None:
+            if ok:
+                cache.put_json(key, res)
+            else:
+                cache.mark(key, DocStatus.FAILED, error=(res or {}).get("errorCode"))
+        stats.record(time.perf_counter() - start, ok)
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(work, name) for name in files]
+        for done, future in enumerate(as_completed(futures), start=1):
+            name, ok = future.result()
+            print(f"[{done}/{len(files)}] {name} {'✅' if ok else '❌'}")
+
+    return stats.finish()
+
+
 def main():
-    # 简单检查
-    if len(APP_KEY) < 5 or len(APP_SECRET) < 5:
-        print("❌ 错误：请先在代码顶部填入正确的 APP_KEY 和 APP_SECRET")
+    try:
+        get_settings().youdao_credentials()
+    except ValueError as e:
+        print(f"❌ 错误：{e}（可写入 .env，参考 env.example）")
         return
 
     init_dirs()
@@ -176,22 +314,18 @@ def main():
         return
 
     files = [f for f in os.listdir(IMAGE_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    print(f"🚀 开始处理 {len(files)} 张图片...")
-
-    for i, f in enumerate(files):
-        print(f"[{i + 1}/{len(files)}] {f} ...")
-        res = translate_image(os.path.join(IMAGE_DIR, f))
+    print(f"🚀 开始处理 {len(files)} 张图片 (并发 {MAX_WORKERS}, 限速 {RATE_LIMIT_QPS} QPS)...")
 
-        if res:
-            if res.get("errorCode") == "0":
-                save_result(f, res)
-            else:
-                print(f"❌ API 错误: Code={res.get('errorCode')} Msg={res.get('msg')}")
-                if res.get("errorCode") == "202":
-                    print("   👉 提示：请检查控制台是否开通了【图片翻译】服务，或检查Key/Secret是否复制了空格。")
-
-        time.sleep(1)
+    cache = ResultCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES)
+    try:
+        stats = run_concurrent(files, cache=cache)
+        stats.report("图片翻译统计")
+        cache.report()
+        telemetry.report("图片翻译埋点")
+    finally:
+        cache.close()
+        telemetry.flush()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,406 @@
+import csv
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.utils import telemetry
+from temp.ocr.concurrency import RunStats, TokenBucket, backoff_delay, create_session
+from temp.spiders.wbi import WbiSigner
+
+API_BASE = "https://api.bilibili.com"
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 "
+              "Safari/537.36")
+FIELDS = ["bvid", "title", "description", "created", "length", "play", "mid"]
+# -412 请求被拦截、-403 访问权限不足（高频时也会出现）：降速重试；-352 风控校验失败：刷新 WBI 密钥后重试
+THROTTLE_CODES = {-412, -403}
+SIGN_ERROR_CODES = {-352}
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    AIMD 自适应限速的令牌桶：
+    - 每次成功把速率加 increase（不超过 max_rate）
+    - 遇到限流码时速率乘以 decrease（不低于 min_rate），清空令牌并让所有线程暂停 cooldown_s；
+      暂停期间在途请求再报限流不会重复降速
+    """
+
+    def __init__(self, rate, min_rate=0.2, max_rate=None, increase=0.05, decrease=0.5, cooldown_s=5.0):
+        super().__init__(rate, capacity=1)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown_s = cooldown_s
+        self.throttles = 0
+        self._paused_until = 0.0
+
+    def acquire(self, tokens=1.0):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        return super().acquire(tokens)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            if now < self._paused_until:
+                return
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = 0.0
+            self._paused_until = now + self.cooldown_s
+
+
+class _AppendSink:
+    """逐页追加写出并立即 flush；打开时读入已有 bvid，续跑时跳过重复行（线程安全）"""
+
+    def __init__(self, path, fields=FIELDS):
+        self.path = path
+        self.fields = fields
+        self.seen = set()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _encode(self, rows):
+        raise NotImplementedError
+
+    def write(self, rows):
+        """写入未见过的行，返回实际写入条数"""
+        with self._lock:
+            fresh = [r for r in rows if r["bvid"] not in self.seen]
+            self.seen.update(r["bvid"] for r in fresh)
+            self._encode(fresh)
+            self._file.flush()
+            return len(fresh)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(_AppendSink):
+    def __init__(self, path, fields=FIELDS):
+        super().__init__(path, fields)
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, "r", newline="", encoding="utf-8-sig") as f:
+                self.seen = {row["bvid"] for row in csv.DictReader(f)}
+        # utf-8-sig 只在新文件开头写 BOM，追加时用 utf-8 以免文件中间出现 BOM
+        self._file = open(path, "a", newline="", encoding="utf-8" if exists else "utf-8-sig")
+        self._writer = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+        if not exists:
+            self._writer.writeheader()
+
+    def _encode(self, rows):
+        self._writer.writerows(rows)
+
+
+class JsonlSink(_AppendSink):
+    def __init__(self, path, fields=FIELDS):
+        super().__init__(path, fields)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.seen = {json.loads(line)["bvid"] for line in f if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _encode(self, rows):
+        for row in rows:
+            self._file.write(json.dumps({k: row.get(k) for k in self.fields}, ensure_ascii=False) + "\n")
+
+
+def open_sink(path, fields=FIELDS):
+    """按扩展名选择 .jsonl 或 .csv 输出"""
+    return JsonlSink(path, fields) if path.endswith((".jsonl", ".json")) else CsvSink(path, fields)
+
+
+class CrawlCheckpoint:
+    """
+    断点文件：每个 MID 的总页数、已完成页、是否完成 / 失败原因。
+    每写完一页就原子替换一次（先写输出再记断点，续跑时至多重抓在途的几页，重复行由 sink 去重）。
+    path 为 None 时只在内存中记录。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)["mids"]
+
+    def entry(self, mid):
+        return self.state.setdefault(str(mid), {"total_pages": None, "done_pages": [], "finished": False,
+                                                "error": None})
+
+    def finished(self, mid):
+        with self._lock:
+            return self.entry(mid)["finished"]
+
+    def pending_pages(self, mid):
+        """已知总页数时返回未完成的页；否则返回 None（需先抓第 1 页）"""
+        with self._lock:
+            e = self.entry(mid)
+            if e["total_pages"] is None:
+                return None
+            done = set(e["done_pages"])
+            return [p for p in range(1, e["total_pages"] + 1) if p not in done]
+
+    def mark_page(self, mid, page, total_pages):
+        with self._lock:
+            e = self.entry(mid)
+            e["total_pages"] = total_pages
+            if page not in e["done_pages"]:
+                e["done_pages"].append(page)
+            e["finished"] = len(e["done_pages"]) >= total_pages
+            e["error"] = None
+            finished = e["finished"]
+            self._save_locked()
+        return finished
+
+    def mark_failed(self, mid, error):
+        with self._lock:
+            self.entry(mid)["error"] = error
+            self._save_locked()
+
+    def _save_locked(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"mids": self.state, "updated_at": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+class PageError(Exception):
+    pass
+
+
+class CrawlerEngine:
+    """
+    多 UP 主投稿列表爬虫：
+    - 每个 MID 先抓第 1 页拿到总数，其余页并发抓取；多个 MID 同时进行
+    - 所有请求共用一个 AdaptiveRateLimiter，-412/-403 时降速并整体暂停，成功后逐步恢复
+    - WBI 密钥与 mixin key 由 WbiSigner 缓存，过期或 -352 时才重新请求 nav
+    - 每页结果立即写入 sink 并记断点，中断后用同一断点文件续跑
+    - sync() 为增量模式：写入 VideoStore，翻到已抓过的视频即停，并按计划刷新播放量
+
+    用法：
+        engine = CrawlerEngine(sessdata=get_settings().bilibili_sessdata)
+        with open_sink("videos.jsonl") as sink:
+            engine.crawl([349950942, 12345], sink, CrawlCheckpoint("videos.checkpoint.json"))
+    """
+
+    def __init__(self, api_base=API_BASE, sessdata=None, session=None, max_workers=4, rate=1.0, max_rate=4.0,
+                 page_size=30, max_retries=5, cooldown_s=5.0, wbi_ttl_s=3600, wbi_cache_path=None):
+        self.api_base = api_base.rstrip("/")
+        self.session = session or create_session(max_workers)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Referer": "https://www.bilibili.com/"})
+        if sessdata:
+            self.session.cookies.set("SESSDATA", sessdata, domain=".bilibili.com")
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.limiter = AdaptiveRateLimiter(rate, max_rate=max_rate, cooldown_s=cooldown_s)
+        self.signer = WbiSigner(self.session, f"{self.api_base}/x/web-interface/nav", wbi_ttl_s, wbi_cache_path)
+        self.stats = RunStats()
+        self.counters = {"requests": 0, "throttled": 0, "sign_errors": 0, "pages": 0, "videos": 0, "duplicates": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def _request(self, params):
+        signed, mixin = self.signer.sign(params)
+        self._count("requests")
+        with telemetry.span("spider.page", mid=params["mid"], page=params["pn"]):
+            resp = self.session.get(f"{self.api_base}/x/space/wbi/arc/search", params=signed, timeout=15)
+        if resp.status_code == 412:
+            return {"code": -412, "message": "HTTP 412"}, mixin
+        resp.raise_for_status()
+        return resp.json(), mixin
+
+    def fetch_page(self, mid, page):
+        """抓取一页，返回 (视频行列表, 总页数)；限流、签名失效与网络异常会重试，超过次数抛 PageError"""
+        rows, count = self._fetch(mid, page)
+        return rows, max(1, math.ceil(count / self.page_size))
+
+    def _fetch(self, mid, page):
+        """fetch_page 的实现，返回 (视频行列表, 投稿总数)"""
+        params = {"mid": mid, "ps": self.page_size, "tid": 0, "pn": page, "keyword": "", "order": "pubdate",
+                  "order_avoided": "true"}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                data, mixin = self._request(params)
+            except Exception as e:
+                last_error = f"网络请求异常: {e}"
+                telemetry.inc("spider_requests_total", code="network_error")
+                self.stats.add_retry()
+                time.sleep(backoff_delay(attempt))
+                continue
+            code = data.get("code")
+            telemetry.inc("spider_requests_total", code=code)
+            if code in THROTTLE_CODES:
+                self._count("throttled")
+                self.limiter.on_throttle()
+                self.stats.add_retry()
+                last_error = f"限流 {code}"
+                continue
+            if code in SIGN_ERROR_CODES:
+                self._count("sign_errors")
+                self.signer.invalidate(mixin)
+                self.stats.add_retry()
+                last_error = f"签名失效 {code}"
+                continue
+            if code != 0:
+                self.stats.record(time.perf_counter() - start, False)
+                raise PageError(f"API 报错 {code}: {data.get('message')}")
+            self.limiter.on_success()
+            self.stats.record(time.perf_counter() - start, True)
+            body = data["data"]
+            vlist = body["list"]["vlist"] or []
+            count = body.get("page", {}).get("count", len(vlist))
+            rows = [{"bvid": v["bvid"], "title": v["title"], "description": v["description"], "created": v["created"],
+                     "length": v["length"], "play": v["play"], "mid": mid} for v in vlist]
+            return rows, count
+        raise PageError(f"重试 {self.max_retries} 次后仍失败（{last_error}）")
+
+    def crawl(self, mids, sink, checkpoint=None, stop_event=None):
+        """
+        抓取全部 MID 写入 sink；stop_event 被设置时不再提交新页，等在途页写完后返回（可用断点续跑）。
+        返回汇总字典（请求数、限流次数、页数、视频数、失败的 MID 等）。
+        """
+        checkpoint = checkpoint or CrawlCheckpoint()
+        failed = {}
+        in_flight = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit(mid, page):
+                if stop_event is None or not stop_event.is_set():
+                    in_flight[pool.submit(self.fetch_page, mid, page)] = (mid, page)
+
+            for mid in mids:
+                if checkpoint.finished(mid):
+                    continue
+                pages = checkpoint.pending_pages(mid)
+                for page in (pages if pages is not None else [1]):
+                    submit(mid, page)
+
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    mid, page = in_flight.pop(future)
+                    try:
+                        rows, total_pages = future.result()
+                    except PageError as e:
+                        failed[mid] = str(e)
+                        checkpoint.mark_failed(mid, str(e))
+                        print(f"❌ MID {mid} 第 {page} 页失败: {e}")
+                        continue
+                    written = sink.write(rows)
+                    self._count("pages")
+                    self._count("videos", written)
+                    self._count("duplicates", len(rows) - written)
+                    telemetry.inc("spider_videos_total", written)
+                    first_visit = checkpoint.pending_pages(mid) is None
+                    if checkpoint.mark_page(mid, page, total_pages):
+                        print(f"✅ MID {mid} 抓取完成，共 {total_pages} 页")
+                    elif first_visit:
+                        print(f"📄 MID {mid} 共 {total_pages} 页，并发抓取剩余页...")
+                        for rest in checkpoint.pending_pages(mid):
+                            submit(mid, rest)
+
+        self.stats.finish()
+        summary = dict(self.counters, elapsed_s=round(time.perf_counter() - start, 3),
+                       wbi_refreshes=self.signer.refreshes, final_rate=round(self.limiter.rate, 3), failed=failed,
+                       unfinished=[m for m in mids if not checkpoint.finished(m)])
+        return summary
+
+    def sync(self, mids, store, refresh=True, stop_event=None, now=None):
+        """
+        增量抓取到 VideoStore（见 temp/spiders/store.py）：
+        - 新投稿：列表按发布时间倒序，翻到含已入库 bvid 的页即停止。第 1 页给出的总数减去库中已有数即新增数，
+          覆盖新增部分的页一次性并发提交；有删稿导致估计偏少时再从最后一页逐页往后翻
+        - 刷新：某个 MID 的新投稿抓完后，按 store.stale_pages() 重抓含过期视频的列表页，只更新可变字段
+        库中还没有该 MID 时等同于完整抓取。now 为刷新计划使用的当前时间（默认 time.time()）。
+        返回汇总字典（新增 / 刷新的页数与条数、请求数、耗时、失败的 MID）。
+        """
+        now = time.time() if now is None else now
+        summary = {"new_pages": 0, "refresh_pages": 0, "inserted": 0, "refreshed": 0}
+        failed = {}
+        in_flight = {}
+        pending_new = {mid: {1} for mid in mids}
+        frontier = dict.fromkeys(mids, 1)
+        stored = {mid: store.count(mid) for mid in mids}
+        requests_before = self.counters["requests"]
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit(mid, page, kind):
+                if stop_event is None or not stop_event.is_set():
+                    in_flight[pool.submit(self._fetch, mid, page)] = (mid, page, kind)
+                    if kind == "new":
+                        pending_new[mid].add(page)
+
+            for mid in mids:
+                submit(mid, 1, "new")
+
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    mid, page, kind = in_flight.pop(future)
+                    if kind == "new":
+                        pending_new[mid].discard(page)
+                    try:
+                        rows, count = future.result()
+                    except PageError as e:
+                        failed[mid] = str(e)
+                        print(f"❌ MID {mid} 第 {page} 页失败: {e}")
+                        continue
+                    reached_known = bool(store.known(r["bvid"] for r in rows))
+                    inserted, refreshed = store.upsert(rows, now)
+                    summary[f"{kind}_pages"] += 1
+                    summary["inserted"] += inserted
+                    self._count("pages")
+                    self._count("videos", inserted)
+                    telemetry.inc("spider_videos_total", inserted)
+                    if kind == "refresh":
+                        summary["refreshed"] += refreshed
+                        continue
+
+                    total_pages = max(1, math.ceil(count / self.page_size))
+                    if page == 1:
+                        # 第 expected_new 条（0 起）是第一个已入库视频，它所在的页即边界页
+                        expected_new = max(0, count - stored[mid])
+                        frontier[mid] = min(total_pages, expected_new // self.page_size + 1)
+                        for rest in range(2, frontier[mid] + 1):
+                            submit(mid, rest, "new")
+                    if page == frontier[mid] and not reached_known and page < total_pages and rows:
+                        frontier[mid] = page + 1
+                        submit(mid, page + 1, "new")
+                    if not pending_new[mid] and mid not in failed:
+                        print(f"✅ MID {mid} 新投稿检查完成，翻到第 {frontier[mid]} 页")
+                        if refresh:
+                            for stale in store.stale_pages(mid, self.page_size, now):
+                                submit(mid, stale, "refresh")
+
+        self.stats.finish()
+        return dict(summary, requests=self.counters["requests"] - requests_before,
+                    elapsed_s=round(time.perf_counter() - start, 3), failed=failed)
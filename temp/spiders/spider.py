@@ -1,143 +1,115 @@
-import requests
-import time
-import hashlib
-import urllib.parse
-import csv  # 新增：用于导出数据
-from functools import reduce
+"""
+B 站 UP 主投稿视频抓取：默认增量写入 SQLite 视频库，--full 完整重抓并导出 CSV。
+
+用法（在仓库根目录）：
+    python -m temp.spiders.spider
+    python -m temp.spiders.spider --full
+"""
+import argparse
+from functools import lru_cache
+
+from config.settings import get_settings
+from src.utils import telemetry
+from temp.spiders.engine import USER_AGENT, CrawlCheckpoint, CrawlerEngine, open_sink
+from temp.spiders.store import VideoStore
+from temp.spiders.wbi import MIXIN_KEY_ENC_TAB, keys_from_nav, mixin_key, sign_params
 
 # === 配置区域 ===
-TARGET_MID = 349950942
-SESSDATA = ("008cfcab%2C1781361922%2Ccbf33%2Ac2CjBcAse8isXJ8CyCQvasnznq3tLJ1F_9_VL70fKWbopYRBUL6JhIzc_WZVPkuf8"
-            "-kcISVnMyOU9wZ2FFM2RGRFhveldMZEU5dk1qeFlIYllmbHM1TE5GMVY1eHFzbmhiWlNnX0dKZVpQdUxHaEtGVTViYU5GWENjMmx6Sjh3bzZZaDBkQy16ZkdBIIEC")
+# UP 主 MID 与登录 Cookie 从环境变量或 .env 读取：BILIBILI_TARGET_MID / BILIBILI_SESSDATA（见 config/settings.py）
 SAVE_FILENAME = "bilibili_videos.csv"  # 结果保存的文件名
+STORE_DB = "bilibili_videos.sqlite3"  # 增量模式的本地投稿库
 # =================
 
-USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 "
-              "Safari/537.36")
-
-# --- WBI 签名算法 (保持不变，省略部分以节省篇幅，请保留原有的WBI函数) ---
-mixinKeyEncTab = [
-    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
-    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
-    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
-    36, 20, 34, 44, 52
-]
+# --- WBI 签名算法（实现见 temp/spiders/wbi.py，这里保留原函数名供旧代码调用） ---
+mixinKeyEncTab = MIXIN_KEY_ENC_TAB
 
 
+@lru_cache(maxsize=8)
 def getMixinKey(orig: str):
-    return reduce(lambda s, i: s + orig[i], mixinKeyEncTab, '')[:32]
+    return mixin_key(orig)
 
 
 def encWbi(params: dict, img_key: str, sub_key: str):
-    mixin_key = getMixinKey(img_key + sub_key)
-    curr_time = round(time.time())
-    params['wts'] = curr_time
-    params = dict(sorted(params.items()))
-    query = urllib.parse.urlencode(params)
-    wb_key = hashlib.md5((query + mixin_key).encode()).hexdigest()
-    return params | {'w_rid': wb_key}
+    return sign_params(params, getMixinKey(img_key + sub_key))
 
 
 def get_wbi_keys(sess):
     try:
-        resp = sess.get('https://api.bilibili.com/x/web-interface/nav', headers={'User-Agent': USER_AGENT})
+        with telemetry.span("spider.wbi_keys"):
+            resp = sess.get('https://api.bilibili.com/x/web-interface/nav', headers={'User-Agent': USER_AGENT})
         resp.raise_for_status()
-        json_content = resp.json()
-        wbi_img = json_content['data']['wbi_img']
-        img_url = wbi_img['img_url']
-        sub_url = wbi_img['sub_url']
-        return img_url.split('/')[-1].split('.')[0], sub_url.split('/')[-1].split('.')[0]
+        return keys_from_nav(resp.json())
     except Exception as e:
         print(f"获取 WBI Key 失败: {e}")
         return None, None
 
 
-# --- 主逻辑 (核心修改部分) ---
-def fetch_user_videos(mid):
-    if "这里填入" in SESSDATA:
-        print("错误：你还没有填写 SESSDATA！")
-        return
-
-    sess = requests.Session()
-    sess.cookies.set('SESSDATA', SESSDATA, domain='.bilibili.com')
-    sess.headers.update({'User-Agent': USER_AGENT, 'Referer': 'https://www.bilibili.com/'})
-
-    img_key, sub_key = get_wbi_keys(sess)
-    if not img_key or not sub_key:
-        return
-
-    page = 1
-    page_size = 30
-    all_videos = []  # 用于存储所有抓取到的视频
-
-    print(f"开始全量抓取 UP主 (MID: {mid})...\n")
-
-    while True:
-        print(f"正在抓取第 {page} 页...")
-
-        params = {
-            'mid': mid,
-            'ps': page_size,
-            'tid': 0,
-            'pn': page,  # 这里是控制翻页的核心参数
-            'keyword': '',
-            'order': 'pubdate',
-            'order_avoided': 'true'
-        }
-
-        signed_params = encWbi(params, img_key, sub_key)
-
-        try:
-            resp = sess.get('https://api.bilibili.com/x/space/wbi/arc/search', params=signed_params)
-            data = resp.json()
-        except Exception as e:
-            print(f"网络请求异常: {e}")
-            break
-
-        if data['code'] != 0:
-            print(f"API 报错: {data['message']}")
-            break
-
-        vlist = data['data']['list']['vlist']
-
-        # === 核心终止条件 ===
-        # 如果 vlist 是空的，说明上一页已经是最后一页了，这里没数据了
-        if not vlist:
-            print(f"第 {page} 页为空，抓取结束。")
-            break
-        # ==================
-
-        for video in vlist:
-            # 提取关键信息
-            item = {
-                'bvid': video['bvid'],
-                'title': video['title'],
-                'description': video['description'],
-                'created': video['created'],  # 发布时间戳
-                'length': video['length'],
-                'play': video['play']
-            }
-            all_videos.append(item)
-
-        print(f"  - 本页获取 {len(vlist)} 条，累计 {len(all_videos)} 条")
-
-        # === 翻页与延时 ===
-        page += 1
-        # 必须休眠！请求太快会触发 -412 或 -403 错误
-        time.sleep(2)
-
-        # --- 保存结果 ---
-    print(f"\n抓取完成，共 {len(all_videos)} 个视频。正在写入 CSV...")
-
+# --- 主逻辑 ---
+def _sessdata():
     try:
-        with open(SAVE_FILENAME, mode='w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=['bvid', 'title', 'description', 'created', 'length', 'play'])
-            writer.writeheader()
-            writer.writerows(all_videos)
-        print(f"成功！文件已保存为: {SAVE_FILENAME}")
-    except Exception as e:
-        print(f"保存文件失败: {e}")
+        return get_settings().require("bilibili_sessdata")
+    except ValueError as e:
+        print(f"错误：{e}（可写入 .env，参考 env.example）")
+        return None
+
+
+def fetch_users_videos(mids, save_path=SAVE_FILENAME, **engine_kwargs):
+    """
+    并发抓取多个 UP 主的全部投稿，逐页写入 save_path（.csv 或 .jsonl），
+    断点记在 save_path + ".checkpoint.json"，中断后重跑同一命令即可续抓。
+    """
+    sessdata = _sessdata()
+    if sessdata is None:
+        return None
+
+    engine = CrawlerEngine(sessdata=sessdata, **engine_kwargs)
+    checkpoint = CrawlCheckpoint(save_path + ".checkpoint.json")
+    print(f"开始抓取 {len(mids)} 位 UP 主: {', '.join(map(str, mids))}\n")
+    with open_sink(save_path) as sink:
+        summary = engine.crawl(mids, sink, checkpoint)
+    print(f"\n抓取完成：新增 {summary['videos']} 个视频，请求 {summary['requests']} 次，"
+          f"限流 {summary['throttled']} 次，耗时 {summary['elapsed_s']}s，结果: {save_path}")
+    if summary["unfinished"]:
+        print(f"⚠️ 未完成的 MID: {summary['unfinished']}，重跑即可从断点继续")
+    engine.stats.report("抓取统计")
+    telemetry.report("抓取埋点")
+    telemetry.flush()
+    return summary
+
+
+def fetch_user_videos(mid):
+    return fetch_users_videos([mid])
+
+
+def sync_users_videos(mids, db_path=STORE_DB, save_path=SAVE_FILENAME, refresh=True, **engine_kwargs):
+    """
+    增量抓取：只翻到上次已抓过的视频为止，并按刷新计划更新播放量等可变字段；
+    结果存于 db_path（以 bvid 为主键），每次运行后全量导出到 save_path。
+    """
+    sessdata = _sessdata()
+    if sessdata is None:
+        return None
+
+    engine = CrawlerEngine(sessdata=sessdata, **engine_kwargs)
+    with VideoStore(db_path) as store:
+        before = store.count()
+        print(f"增量抓取 {len(mids)} 位 UP 主，本地已有 {before} 个视频\n")
+        summary = engine.sync(mids, store, refresh=refresh)
+        exported = store.export_csv(save_path)
+    print(f"\n增量抓取完成：新增 {summary['inserted']} 个视频，刷新 {summary['refreshed']} 个，"
+          f"请求 {summary['requests']} 次，耗时 {summary['elapsed_s']}s，共 {exported} 个视频已导出到 {save_path}")
+    engine.stats.report("抓取统计")
+    telemetry.report("抓取埋点")
+    telemetry.flush()
+    return summary
 
 
 if __name__ == '__main__':
-    fetch_user_videos(TARGET_MID)
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="完整重抓（写 CSV + 断点），默认为增量模式")
+    parser.add_argument("--no-refresh", action="store_true", help="增量模式下只抓新投稿，不刷新播放量")
+    args = parser.parse_args()
+    if args.full:
+        fetch_user_videos(get_settings().bilibili_target_mid)
+    else:
+        sync_users_videos([get_settings().bilibili_target_mid], refresh=not args.no_refresh)
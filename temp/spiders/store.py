@@ -0,0 +1,136 @@
+import csv
+import sqlite3
+import threading
+import time
+
+from temp.spiders.engine import FIELDS
+
+# 会随时间变化、需要定期刷新的字段；其余字段（bvid/created/length/mid）抓到后不再改写
+MUTABLE_FIELDS = ("title", "description", "play")
+
+# 刷新计划：(视频年龄上限秒, 刷新间隔秒)。新视频播放量涨得快，刷新得勤；老视频很少变化
+REFRESH_SCHEDULE = (
+    (86400, 3600),           # 1 天内：每小时
+    (7 * 86400, 6 * 3600),   # 1 周内：每 6 小时
+    (30 * 86400, 86400),     # 1 月内：每天
+    (float("inf"), 7 * 86400),  # 更早：每周
+)
+
+
+def refresh_interval(age_s, schedule=REFRESH_SCHEDULE):
+    for max_age, interval in schedule:
+        if age_s <= max_age:
+            return interval
+    return schedule[-1][1]
+
+
+class VideoStore:
+    """
+    以 bvid 为主键的本地投稿库（SQLite），供增量抓取使用。
+    - upsert() 新视频插入，已有视频只更新 MUTABLE_FIELDS 与 updated_at
+    - known() / count() 判断哪些已抓过，stale_pages() 按 REFRESH_SCHEDULE 找出需要刷新的列表页
+    - 提供 write(rows) 接口，也可直接作为 CrawlerEngine.crawl() 的 sink
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " bvid TEXT PRIMARY KEY,"
+            " mid INTEGER NOT NULL,"
+            " title TEXT,"
+            " description TEXT,"
+            " created INTEGER NOT NULL,"
+            " length TEXT,"
+            " play INTEGER,"
+            " first_seen REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_mid_created ON videos (mid, created DESC)")
+        self._conn.commit()
+
+    def count(self, mid=None):
+        with self._lock:
+            if mid is None:
+                return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM videos WHERE mid=?", (mid,)).fetchone()[0]
+
+    def known(self, bvids):
+        """返回 bvids 中已入库的集合"""
+        bvids = list(bvids)
+        if not bvids:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT bvid FROM videos WHERE bvid IN ({','.join('?' * len(bvids))})", bvids
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def upsert(self, rows, now=None):
+        """写入一页结果，返回 (新增条数, 刷新条数)"""
+        if not rows:
+            return 0, 0
+        now = time.time() if now is None else now
+        known = self.known(r["bvid"] for r in rows)
+        updates = ", ".join(f"{f}=excluded.{f}" for f in MUTABLE_FIELDS)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO videos (bvid, mid, title, description, created, length, play, first_seen, updated_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(bvid) DO UPDATE SET {updates}, "
+                "updated_at=excluded.updated_at",
+                [(r["bvid"], r["mid"], r["title"], r["description"], r["created"], r["length"], r["play"], now, now)
+                 for r in rows],
+            )
+            self._conn.commit()
+        return len(rows) - len(known), len(known)
+
+    def write(self, rows):
+        """sink 接口：写入并返回新增条数"""
+        return self.upsert(rows)[0]
+
+    def stale_pages(self, mid, page_size, now=None, schedule=REFRESH_SCHEDULE):
+        """
+        按发布时间倒序给该 MID 的视频排名，找出超过刷新间隔的视频所在的列表页（从 1 开始）。
+        列表接口一页同时返回 page_size 个视频的播放量，按页刷新比逐个视频请求省得多。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT created, updated_at FROM videos WHERE mid=? ORDER BY created DESC, bvid", (mid,)
+            ).fetchall()
+        pages = set()
+        for rank, (created, updated_at) in enumerate(rows):
+            if now - updated_at >= refresh_interval(now - created, schedule):
+                pages.add(rank // page_size + 1)
+        return sorted(pages)
+
+    def videos(self, mid=None):
+        query = f"SELECT {', '.join(FIELDS)} FROM videos"
+        args = ()
+        if mid is not None:
+            query, args = query + " WHERE mid=?", (mid,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY mid, created DESC", args).fetchall()
+        return [dict(zip(FIELDS, r)) for r in rows]
+
+    def export_csv(self, path, mid=None):
+        """导出为与原 spider.py 相同列的 CSV（utf-8-sig，Excel 可直接打开）"""
+        rows = self.videos(mid)
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
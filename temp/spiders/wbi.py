@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+
+
+def mixin_key(orig):
+    """按固定置换表重排 img_key + sub_key，取前 32 位"""
+    return "".join(orig[i] for i in MIXIN_KEY_ENC_TAB)[:32]
+
+
+def sign_params(params, mixin, wts=None):
+    """WBI 签名：加入 wts 后按键排序、urlencode，w_rid = md5(query + mixin_key)"""
+    params = dict(params, wts=round(time.time()) if wts is None else wts)
+    params = dict(sorted(params.items()))
+    query = urllib.parse.urlencode(params)
+    return params | {"w_rid": hashlib.md5((query + mixin).encode()).hexdigest()}
+
+
+def keys_from_nav(payload):
+    """从 /x/web-interface/nav 的返回中取 img_key / sub_key（图片 URL 的文件名部分）"""
+    wbi_img = payload["data"]["wbi_img"]
+    return tuple(url.split("/")[-1].split(".")[0] for url in (wbi_img["img_url"], wbi_img["sub_url"]))
+
+
+class WbiSigner:
+    """
+    缓存 WBI 密钥与 mixin key 的签名器（线程安全）。
+    密钥每天轮换：超过 ttl_s 或调用 invalidate()（如接口返回 -352）后，下一次签名时重新请求 nav。
+    给定 cache_path 时把密钥与获取时间写盘，重启后在有效期内直接复用。
+    """
+
+    def __init__(self, session, nav_url, ttl_s=3600, cache_path=None):
+        self.session = session
+        self.nav_url = nav_url
+        self.ttl_s = ttl_s
+        self.cache_path = cache_path
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._mixin = None
+        self._fetched_at = 0.0
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            self._mixin, self._fetched_at = cached["mixin_key"], cached["fetched_at"]
+
+    def _expired(self):
+        return self._mixin is None or time.time() - self._fetched_at > self.ttl_s
+
+    def _refresh_locked(self):
+        resp = self.session.get(self.nav_url, timeout=10)
+        resp.raise_for_status()
+        img_key, sub_key = keys_from_nav(resp.json())
+        self._mixin = mixin_key(img_key + sub_key)
+        self._fetched_at = time.time()
+        self.refreshes += 1
+        if self.cache_path:
+            tmp = self.cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"mixin_key": self._mixin, "fetched_at": self._fetched_at}, f)
+            os.replace(tmp, self.cache_path)
+
+    def mixin_key(self):
+        with self._lock:
+            if self._expired():
+                self._refresh_locked()
+            return self._mixin
+
+    def invalidate(self, stale_mixin=None):
+        """标记密钥失效；传入 stale_mixin 时仅当它仍是当前密钥才失效，避免并发请求重复刷新"""
+        with self._lock:
+            if stale_mixin is None or stale_mixin == self._mixin:
+                self._mixin = None
+
+    def sign(self, params):
+        mixin = self.mixin_key()
+        return sign_params(params, mixin), mixin